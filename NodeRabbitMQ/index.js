@@ -4,14 +4,16 @@ const { ReadlineParser } = require('@serialport/parser-readline');
 
 // --- CONFIGURAÇÕES ---
 const RABBITMQ_HOST = process.env.RABBITMQ_HOST || 'localhost';
-const RABBIT_URL = `amqp://${RABBITMQ_HOST}`; 
-const QUEUE_NAME = 'fila_deteccao'; 
+const RABBIT_URL = `amqp://${RABBITMQ_HOST}`;
+// Mesma fila em que o inference_service publica (settings.RABBITMQ_QUEUE / CAMERA_QUEUES)
+const QUEUE_NAME = process.env.RABBITMQ_QUEUE || 'fila_decisoes_ia';
 const CAMINHO_PORTA = process.env.SERIAL_PORT || '/dev/ttyUSB0'; // CONFIRA SUA PORTA
 const BAUD_RATE = 9600;
 
-// Configuração de Persistência
-const MAX_TENTATIVAS = 40; 
-const INTERVALO_MS = 500;  
+// Configuração do Buffer de Decisões
+const PREFETCH = parseInt(process.env.RABBITMQ_PREFETCH || '20', 10);         // Máx. de decisões pendentes (sem ack)
+const DECISAO_TTL_MS = parseInt(process.env.DECISAO_TTL_MS || '15000', 10);   // Decisão mais velha que isso é descartada
+const ESPERA_MAX_MS = parseInt(process.env.ESPERA_MAX_MS || '2000', 10);      // Quanto o sensor espera por uma decisão atrasada
 
 // --- INICIALIZAÇÃO ---
 const port = new SerialPort({ path: CAMINHO_PORTA, baudRate: BAUD_RATE });
@@ -19,12 +21,33 @@ const parser = port.pipe(new ReadlineParser({ delimiter: '\r\n' }));
 
 let channel = null;
 
+// Decisões recebidas e ainda não usadas, por ordem de chegada.
+// Chave: camera_id:track_id (um objeto = uma decisão; republicações substituem a anterior)
+const pendentes = new Map();
+// Pedidos DETECTADO que chegaram antes da decisão (atendidos assim que ela chegar)
+const sensoresAguardando = [];
+
+// Latência sensor -> atuador (ms), para o log periódico
+const estatisticas = { atendidos: 0, liberados: 0, expirados: 0, somaSensorMs: 0, maxSensorMs: 0,
+                       previstos: 0, somaErroPrevisaoMs: 0, maxErroPrevisaoMs: 0 };
+
 async function setupRabbit() {
     try {
         const connection = await amqp.connect(RABBIT_URL);
+        connection.on('error', (err) => console.error('[RABBIT] Erro na conexão:', err.message));
+        connection.on('close', () => {
+            // Mensagens sem ack voltam para a fila sozinhas: só limpamos o buffer local
+            console.error('[RABBIT] Conexão perdida. Reconectando em 5s...');
+            channel = null;
+            pendentes.clear();
+            setTimeout(setupRabbit, 5000);
+        });
+
         channel = await connection.createChannel();
         await channel.assertQueue(QUEUE_NAME, { durable: true });
-        console.log(`[RABBIT] Conectado.`);
+        await channel.prefetch(PREFETCH);
+        await channel.consume(QUEUE_NAME, receberDecisao, { noAck: false });
+        console.log(`[RABBIT] Conectado. Consumindo '${QUEUE_NAME}' (prefetch=${PREFETCH}).`);
     } catch (error) {
         console.error('[RABBIT] Erro:', error.message);
         setTimeout(setupRabbit, 5000);
@@ -33,67 +56,133 @@ async function setupRabbit() {
 
 port.on('open', () => console.log(`[SERIAL] Arduino conectado na ${CAMINHO_PORTA}`));
 
-parser.on('data', async (data) => {
+parser.on('data', (data) => {
     const msg = data.trim();
     console.log(`[ARDUINO]: ${msg}`);
 
     if (msg === 'DETECTADO') {
-        console.log('[LOGICA] Solicitado. Iniciando busca...');
-        await tentarBuscarMensagem();
+        atenderSensor(Date.now());
     }
 });
 
-async function tentarBuscarMensagem() {
-    if (!channel) return console.log('[ERRO] RabbitMQ Offline.');
-    const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+// --- CONSUMIDOR (RabbitMQ -> buffer local) ---
+function receberDecisao(msg) {
+    if (!msg) return; // Consumer cancelado pelo broker
 
-    for (let i = 1; i <= MAX_TENTATIVAS; i++) {
-        const msg = await channel.get(QUEUE_NAME, { noAck: false });
+    let dados;
+    try {
+        dados = JSON.parse(msg.content.toString());
+    } catch (e) {
+        console.error('[ERRO] JSON Inválido:', e.message);
+        channel.ack(msg);
+        return;
+    }
 
-        if (msg) {
-            console.log(`[SUCESSO] Mensagem encontrada!`);
-            processarMensagem(msg);
-            return; 
-        } 
-        process.stdout.write(`.`); 
-        await esperar(INTERVALO_MS); 
+    const chave = `${dados.camera_id ?? '0'}:${dados.track_id ?? msg.fields.deliveryTag}`;
+    const anterior = pendentes.get(chave);
+    if (anterior) {
+        // Mesma decisão reenviada (ex.: outbox do Python após reconexão)
+        channel.ack(anterior.msg);
+        pendentes.delete(chave);
     }
 
-    // --- CORREÇÃO AQUI ---
-    console.log('\n[TIMEOUT] Nenhuma mensagem. Liberando esteira.');
-    port.write('C'); // Manda o Arduino continuar mesmo sem classificar
+    // Timestamp da decisão no Python (segundos) ou, na falta dele, a chegada aqui
+    const criadaEm = dados.timestamp ? dados.timestamp * 1000 : Date.now();
+    pendentes.set(chave, { msg, dados, criadaEm, recebidaEm: Date.now() });
+    console.log(`[RABBIT] Decisão recebida: ID ${dados.track_id} -> ${dados.decisao_direcao} (${pendentes.size} pendente(s))`);
+
+    // Algum sensor já está esperando? Atende agora.
+    if (sensoresAguardando.length > 0) {
+        const sensor = sensoresAguardando.shift();
+        clearTimeout(sensor.timer);
+        responderSensor(sensor.detectadoEm);
+    }
 }
 
-function processarMensagem(msg) {
-    try {
-        const conteudo = msg.content.toString();
-        const dados = JSON.parse(conteudo);
-        const objeto = dados.decisao_direcao ? dados.decisao_direcao.toLowerCase() : 'desc';
-        console.log(`\n[RABBIT] Objeto: ${objeto}`);
-
-        let comando = null;
-
-        if (objeto.includes('direita')) {
-            comando = 'D';
-        } else if (objeto.includes('esquerda')) {
-            comando = 'E';
-        } else {
-            // --- CORREÇÃO AQUI ---
-            console.log(`[IGNORADO] Sem regra para '${objeto}'. Liberando esteira.`);
-            comando = 'C'; // Manda continuar
-        }
-
-        if (comando) {
-            console.log(`[SERIAL] >>> Enviando '${comando}'`);
-            port.write(comando);
-        }
-        channel.ack(msg);
+// --- SENSOR (Arduino DETECTADO -> comando) ---
+function atenderSensor(detectadoEm) {
+    expirarDecisoes();
+    if (pendentes.size > 0) {
+        responderSensor(detectadoEm);
+        return;
+    }
 
-    } catch (e) {
-        console.error('[ERRO] JSON Inválido:', e);
-        channel.ack(msg);
-        port.write('C'); // Na dúvida, libera a esteira
+    if (!channel) console.log('[ERRO] RabbitMQ Offline.');
+    // Nenhuma decisão ainda: espera um pouco por ela (sem polling) e depois libera
+    const sensor = { detectadoEm, timer: null };
+    sensor.timer = setTimeout(() => {
+        const i = sensoresAguardando.indexOf(sensor);
+        if (i >= 0) sensoresAguardando.splice(i, 1);
+        console.log(`[TIMEOUT] Nenhuma decisão em ${ESPERA_MAX_MS}ms. Liberando esteira.`);
+        estatisticas.liberados++;
+        port.write('C'); // Manda o Arduino continuar mesmo sem classificar
+    }, ESPERA_MAX_MS);
+    sensoresAguardando.push(sensor);
+}
+
+function responderSensor(detectadoEm) {
+    // O objeto que chega primeiro ao sensor é o que cruzou a linha de decisão primeiro
+    const [chave, pendente] = pendentes.entries().next().value;
+    pendentes.delete(chave);
+
+    const comando = comandoPara(pendente.dados);
+    console.log(`[SERIAL] >>> Enviando '${comando}'`);
+    port.write(comando);
+    if (channel) channel.ack(pendente.msg);
+
+    const agora = Date.now();
+    const sensorMs = agora - detectadoEm;
+    estatisticas.atendidos++;
+    estatisticas.somaSensorMs += sensorMs;
+    estatisticas.maxSensorMs = Math.max(estatisticas.maxSensorMs, sensorMs);
+    // capture_ts: captura do frame na câmera; predicted_arrival_ts: chegada prevista ao atuador (segundos)
+    const { capture_ts: capturaTs, predicted_arrival_ts: chegadaPrevistaTs } = pendente.dados;
+    const captura = capturaTs ? ` | captura->atuador ${agora - Math.round(capturaTs * 1000)}ms` : '';
+    let previsao = '';
+    if (chegadaPrevistaTs) {
+        // Positivo: a peça chegou ao sensor depois do previsto
+        const erroMs = detectadoEm - Math.round(chegadaPrevistaTs * 1000);
+        estatisticas.previstos++;
+        estatisticas.somaErroPrevisaoMs += Math.abs(erroMs);
+        estatisticas.maxErroPrevisaoMs = Math.max(estatisticas.maxErroPrevisaoMs, Math.abs(erroMs));
+        previsao = ` | chegada real - prevista ${erroMs}ms`;
+    }
+    console.log(`[LATENCIA] ID ${pendente.dados.track_id}: sensor->atuador ${sensorMs}ms | ` +
+                `decisão->atuador ${agora - pendente.criadaEm}ms | no buffer ${agora - pendente.recebidaEm}ms` +
+                captura + previsao);
+}
+
+function comandoPara(dados) {
+    const objeto = dados.decisao_direcao ? dados.decisao_direcao.toLowerCase() : 'desc';
+    console.log(`\n[RABBIT] Objeto: ${objeto}`);
+
+    if (objeto.includes('direita')) return 'D';
+    if (objeto.includes('esquerda')) return 'E';
+
+    console.log(`[IGNORADO] Sem regra para '${objeto}'. Liberando esteira.`);
+    return 'C'; // Manda continuar
+}
+
+function expirarDecisoes() {
+    const agora = Date.now();
+    for (const [chave, pendente] of pendentes) {
+        if (agora - pendente.criadaEm <= DECISAO_TTL_MS) continue;
+        console.log(`[EXPIRADO] Decisão do ID ${pendente.dados.track_id} com ${agora - pendente.criadaEm}ms descartada.`);
+        pendentes.delete(chave);
+        if (channel) channel.ack(pendente.msg);
+        estatisticas.expirados++;
     }
 }
 
-setupRabbit();
\ No newline at end of file
+// Expira decisões velhas mesmo sem sensor (libera o prefetch) e resume a latência
+setInterval(expirarDecisoes, 1000);
+setInterval(() => {
+    if (estatisticas.atendidos === 0 && estatisticas.liberados === 0) return;
+    const media = estatisticas.atendidos ? (estatisticas.somaSensorMs / estatisticas.atendidos).toFixed(1) : '-';
+    const erroMedio = estatisticas.previstos ? (estatisticas.somaErroPrevisaoMs / estatisticas.previstos).toFixed(1) : '-';
+    console.log(`[STATS] ${estatisticas.atendidos} atendidos | sensor->atuador médio ${media}ms, máx ${estatisticas.maxSensorMs}ms | ` +
+                `erro da chegada prevista médio ${erroMedio}ms, máx ${estatisticas.maxErroPrevisaoMs}ms | ` +
+                `${estatisticas.liberados} liberados sem decisão | ${estatisticas.expirados} expirados | ${pendentes.size} pendente(s)`);
+}, 60000);
+
+setupRabbit();
@@ -1,29 +1,183 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
 import cv2
 
-def list_available_cameras(max_checks=10):
-    available_cameras = []
+# Modos testados pelo OpenCV quando o v4l2-ctl não está instalado
+FALLBACK_MODES = [("MJPG", 1920, 1080), ("MJPG", 1280, 720), ("MJPG", 640, 480),
+                  ("YUYV", 1280, 720), ("YUYV", 640, 480)]
 
-    for i in range (max_checks):
-        cap = cv2.VideoCapture(i)
 
-        if cap.isOpened():
-            ret, frame = cap.read()
+def list_video_devices(max_checks=10):
+    """IDs das câmeras a testar: os nós /dev/video* existentes (ou 0..max_checks-1 fora do Linux)."""
+    nodes = glob.glob('/dev/video*')
+    ids = sorted(int(m.group(1)) for m in (re.fullmatch(r'/dev/video(\d+)', n) for n in nodes) if m)
+    if ids or sys.platform.startswith('linux'):
+        return ids
+    return list(range(max_checks))
 
-            if ret:
-                print(f'Câmera encontrada no ID {i}')
-                available_cameras.append(i)
-            else:
-                print(f'Falha na captura na camera com ID {i}')
-        
-            cap.release()
 
-        else:
-            pass
+def device_name(cam_id):
+    try:
+        with open(f'/sys/class/video4linux/video{cam_id}/name') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def v4l2_formats(cam_id, timeout):
+    """Formatos/resoluções/FPS anunciados pelo driver (via v4l2-ctl). None se indisponível."""
+    if not shutil.which('v4l2-ctl'):
+        return None
+    try:
+        out = subprocess.run(['v4l2-ctl', '-d', f'/dev/video{cam_id}', '--list-formats-ext'],
+                             capture_output=True, text=True, timeout=timeout).stdout
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+
+    formats = []
+    for line in out.splitlines():
+        line = line.strip()
+        fmt = re.match(r"\[\d+\]: '(\w+)'", line)
+        size = re.match(r"Size: \w+ (\d+)x(\d+)", line)
+        fps = re.search(r"\(([\d.]+) fps\)", line)
+        if fmt:
+            formats.append({"fourcc": fmt.group(1), "sizes": []})
+        elif size and formats:
+            formats[-1]["sizes"].append({"width": int(size.group(1)), "height": int(size.group(2)), "fps": []})
+        elif fps and formats and formats[-1]["sizes"]:
+            formats[-1]["sizes"][-1]["fps"].append(float(fps.group(1)))
+    return formats
+
+
+def fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ") or None
+
+
+def opencv_modes(cap):
+    """Sem v4l2-ctl: pede alguns modos comuns e anota o que o driver realmente aceitou."""
+    accepted = {}
+    for fourcc, width, height in FALLBACK_MODES:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        got = (fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+               int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        accepted.setdefault(got[0], set()).add((got[1], got[2], round(fps, 1)))
+    return [{"fourcc": f, "sizes": [{"width": w, "height": h, "fps": [fps]} for w, h, fps in sorted(sizes)]}
+            for f, sizes in accepted.items()]
+
+
+def probe_camera(cam_id, frames, result_queue):
+    """Roda num processo próprio: se o driver travar, o processo é morto pelo timeout."""
+    info = {"id": cam_id, "device": f"/dev/video{cam_id}", "name": device_name(cam_id), "usable": False}
+    start = time.perf_counter()
+    api = cv2.CAP_V4L2 if os.path.exists(info["device"]) else cv2.CAP_ANY
+    cap = cv2.VideoCapture(cam_id, api)
+    info["open_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    if not cap.isOpened():
+        info["error"] = "não abriu"
+        result_queue.put(info)
+        return
+
+    try:
+        info["formats"] = v4l2_formats(cam_id, timeout=2) or opencv_modes(cap)
+
+        # Mesma configuração do capture_service: MJPG, 1 frame de buffer
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        ok, frame = cap.read()   # O primeiro read inclui o start do stream
+        if not ok:
+            info["error"] = "abriu, mas não entregou frames"
+            return
+
+        latencies = []
+        loop_start = time.perf_counter()
+        for _ in range(frames):
+            t0 = time.perf_counter()
+            ok, frame = cap.read()
+            if not ok:
+                break
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - loop_start
+
+        info.update({
+            "usable": bool(latencies),
+            "negotiated": {
+                "fourcc": fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+                "width": frame.shape[1] if frame is not None else int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": frame.shape[0] if frame is not None else int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "nominal_fps": cap.get(cv2.CAP_PROP_FPS),
+            },
+            "measured_fps": round(len(latencies) / elapsed, 1) if latencies else 0.0,
+            "read_latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 2),
+                "max": round(max(latencies), 2),
+            } if latencies else None,
+            "compose_device": f"{info['device']}:{info['device']}",
+        })
+    finally:
+        cap.release()
+        result_queue.put(info)
+
+
+def list_available_cameras(max_checks=10, timeout=5.0, frames=10):
+    """Testa todas as câmeras em paralelo, cada uma com seu timeout."""
+    ctx = multiprocessing.get_context("spawn")
+    probes = []
+    for cam_id in list_video_devices(max_checks):
+        result_queue = ctx.Queue()
+        process = ctx.Process(target=probe_camera, args=(cam_id, frames, result_queue), daemon=True)
+        process.start()
+        probes.append((cam_id, process, result_queue))
+
+    results = []
+    deadline = time.monotonic() + timeout
+    for cam_id, process, result_queue in probes:
+        try:
+            results.append(result_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+        except Exception:
+            results.append({"id": cam_id, "device": f"/dev/video{cam_id}", "name": device_name(cam_id),
+                            "usable": False, "error": f"timeout ({timeout:g}s)"})
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=1)
+    return results
 
-    if not available_cameras:
-        print('Nenhuma camera encontrada')
-    else:
-        print(f'Ids Disponiveis para uso: {available_cameras}')
 
 if __name__ == '__main__':
-    list_available_cameras()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Descobre as câmeras disponíveis e suas capacidades")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Tempo máximo de teste por câmera (s)")
+    parser.add_argument("--frames", type=int, default=10, help="Frames lidos para medir a latência")
+    parser.add_argument("--max-checks", type=int, default=10, help="IDs testados quando não há /dev/video*")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON (para scripts de deploy)")
+    args = parser.parse_args()
+
+    cameras = list_available_cameras(args.max_checks, args.timeout, args.frames)
+    usable = [c for c in cameras if c["usable"]]
+
+    if args.json:
+        print(json.dumps({"cameras": cameras, "usable_ids": [c["id"] for c in usable]}, indent=2))
+    else:
+        for c in cameras:
+            if c["usable"]:
+                n = c["negotiated"]
+                print(f'Câmera encontrada no ID {c["id"]} ({c["name"] or "sem nome"}): '
+                      f'{n["width"]}x{n["height"]} {n["fourcc"]}, {c["measured_fps"]} fps medidos, '
+                      f'leitura média {c["read_latency_ms"]["mean"]}ms')
+            else:
+                print(f'Falha na câmera com ID {c["id"]}: {c.get("error")}')
+        if not usable:
+            print('Nenhuma camera encontrada')
+        else:
+            print(f'Ids Disponiveis para uso: {[c["id"] for c in usable]}')
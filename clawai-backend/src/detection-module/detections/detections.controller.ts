@@ -20,4 +20,11 @@ export class DetectionsController {
     // Aqui você adicionaria validação de dados (DTOs)
     return this.detectionsService.create(createDetectionDto);
   }
+
+  // Rota de envio em lote do Script Python de IA
+  // POST /detections/batch
+  @Post('batch')
+  createBatch(@Body() createDetectionDtos: CreateDetectionDto[]) {
+    return this.detectionsService.createMany(createDetectionDtos);
+  }
 }
\ No newline at end of file
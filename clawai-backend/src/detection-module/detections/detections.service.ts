@@ -33,5 +33,11 @@ export class DetectionsService {
     return this.detectionsRepository.save(newDetection);
   }
 
+  // Lote de detecções (o script Python agrupa rajadas num único POST)
+  async createMany(createDetectionDtos: CreateDetectionDto[]): Promise<Detection[]> {
+    const newDetections = this.detectionsRepository.create(createDetectionDtos);
+    return this.detectionsRepository.save(newDetections);
+  }
+
   // (No futuro, adicionaremos aqui o StatsService)
 }
\ No newline at end of file
@@ -14,7 +14,11 @@ export interface AiStatus {
   service: 'ai';
   status: 'online' | 'offline';
   modelName: string;
-  processingTimeMs: number; // Velocidade de Processamento
+  processingTimeMs: number; // Velocidade de Processamento (p50 das últimas rodadas)
+  processingTimeP95Ms?: number;
+  processingTimeP99Ms?: number;
+  inferenceTimeP50Ms?: number;
+  inferenceTimeP95Ms?: number;
 }
 
 export type HeartbeatDto = CameraStatus | AiStatus;
@@ -4,19 +4,137 @@ import os
 MODEL_PATH = "models/best.pt"
 ZONA_DE_DECISAO_X = 320
 CONFIDENCE_THRESHOLD = 0.6
+# Backend de inferência: "torch" (models/best.pt), "onnxruntime" ou "openvino"
+# (artefatos gerados por training/export.py a partir do MODEL_PATH)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+INFERENCE_INT8 = os.getenv("INFERENCE_INT8", "0") == "1"
+# Tamanho de entrada do modelo (os artefatos exportados precisam usar o mesmo)
+INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", 640))
+# Modelo fundido (PyTorch) guardado entre reinícios para subir mais rápido
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "models/.cache")
+# Inferências de aquecimento num lote do tamanho das ROIs antes de aceitar frames
+WARMUP_ITERATIONS = 5
+# /ready fica verde quando um frame real passa em até FATOR x a latência do aquecimento
+# (ou dentro de READY_LATENCY_BUDGET_MS, se definido)
+READY_LATENCY_FACTOR = 2.0
+READY_LATENCY_BUDGET_MS = float(os.getenv("READY_LATENCY_BUDGET_MS", 0))
+# Falha ao carregar/aquecer o modelo: segundos com o erro no /ready antes de sair (código 1)
+STARTUP_FAILURE_EXIT_DELAY_S = 5.0
 CAMERA_ROIS = {
     '0': [172, 168, 455, 351]
 }
+# ROI e linha de decisão calibradas (escritas pelo roiSetup.py). Os valores do
+# arquivo têm prioridade sobre CAMERA_ROIS/ZONA_DE_DECISAO_X e são relidos a quente.
+CAMERA_CONFIG_PATH = os.getenv("CAMERA_CONFIG_PATH", "config/cameras.json")
+CAMERA_CONFIG_POLL_S = 1.0
+# Registro de tracks: esquece um track ausente por N frames ou ocioso por N segundos
+TRACK_IDLE_FRAMES = 60
+TRACK_IDLE_TTL_S = 10.0
+TRACK_REGISTRY_MAX = 1000
+# Velocidade de cada track na esteira (px/s no eixo X): média móvel entre frames,
+# calculada com o instante de CAPTURA de cada frame
+TRACK_VELOCITY_ALPHA = 0.5
+TRACK_VELOCITY_MIN_SAMPLES = 3
+# Decisão compensada pela latência: a posição do objeto é projetada pela velocidade
+# até "agora" (captura -> decodificação -> inferência) mais DECISION_LEAD_S segundos
+# e essa posição é comparada à linha de decisão. Sem velocidade, vale a posição vista.
+DECISION_COMPENSATE_LATENCY = os.getenv("DECISION_COMPENSATE_LATENCY", "1") == "1"
+DECISION_LEAD_S = float(os.getenv("DECISION_LEAD_S", 0.0))
+# Posição X do atuador na esteira, em px da tela cheia da câmera (pode passar da
+# largura da imagem), para prever a chegada da peça. 0 = desconhecida (sem previsão).
+ACTUATOR_X = int(os.getenv("ACTUATOR_X", 0))
+CAMERA_ACTUATOR_X = {}
+# Log por peça (JSON Lines): captura, decisão, velocidade e chegada prevista
+DECISION_LATENCY_LOG_PATH = os.getenv("DECISION_LATENCY_LOG_PATH", "data/decision_latency.jsonl")
+DECISION_LATENCY_LOG_MAX_MB = 50
+# Portão de movimento: só roda o modelo se algo mudou na ROI (ou há track ativo)
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "1") == "1"
+MOTION_DOWNSCALE_WIDTH = 160     # Largura da imagem usada na diferença (px)
+MOTION_PIXEL_THRESHOLD = 25      # Diferença de cinza (0-255) para um pixel contar como "mudou"
+MOTION_MIN_AREA = 0.002          # Fração mínima de pixels mudados para haver movimento
+MOTION_BG_ALPHA = 0.05           # Velocidade de adaptação do fundo (luz, vibração)
+MOTION_HOLD_FRAMES = 15          # Continua inferindo N frames após o último movimento
+MOTION_FORCE_EVERY = 30          # Roda o modelo pelo menos a cada N frames, mesmo parado
 
 # --- Configurações de Rede dos Serviços ---
 # Lê do 'os.getenv' primeiro, se não achar, usa o valor padrão 'localhost'
 CAPTURE_SERVICE_URL = os.getenv("CAPTURE_SERVICE_URL", "http://localhost:5001/video_feed")
 INFERENCE_API_HOST = os.getenv("INFERENCE_API_HOST", "0.0.0.0")
 INFERENCE_API_PORT = int(os.getenv("INFERENCE_API_PORT", 5002))
+# Servidor HTTP dos dois serviços: "flask" (uma thread por cliente de stream) ou
+# "asyncio" (aiohttp: um event loop para todos os clientes, ver shared/async_stream.py)
+HTTP_SERVER = os.getenv("HTTP_SERVER", "flask")
+
+# --- Múltiplas Câmeras (uma esteira por câmera) ---
+# Formato: "0=http://capture-0:5001/video_feed,1=http://capture-1:5001/video_feed"
+# Sem a variável, roda só a câmera '0' lendo de CAPTURE_SERVICE_URL.
+CAPTURE_SOURCES = dict(
+    item.split("=", 1) for item in os.getenv("CAPTURE_SOURCES", "").split(",") if "=" in item
+) or {'0': CAPTURE_SERVICE_URL}
+# Linha de decisão e fila RabbitMQ por câmera (padrão: ZONA_DE_DECISAO_X e RABBITMQ_QUEUE)
+CAMERA_DECISION_ZONES = {}
+CAMERA_QUEUES = {}
+# Configuração do tracker do ultralytics usada por câmera
+TRACKER_CONFIG = "botsort.yaml"
+
+# --- Captura (capture_service) ---
+# Backend do OpenCV: "auto", "v4l2" ou "gstreamer"
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "v4l2")
+# Formato pedido à câmera. MJPG costuma destravar FPS alto em webcams USB (YUYV é lento)
+CAPTURE_FOURCC = os.getenv("CAPTURE_FOURCC", "MJPG")
+# 0 = mantém o padrão do driver
+CAPTURE_WIDTH = int(os.getenv("CAPTURE_WIDTH", 1280))
+CAPTURE_HEIGHT = int(os.getenv("CAPTURE_HEIGHT", 720))
+CAPTURE_FPS = int(os.getenv("CAPTURE_FPS", 30))
+# 1 frame no buffer do driver: sempre o frame mais recente, sem atraso acumulado
+CAPTURE_BUFFERSIZE = int(os.getenv("CAPTURE_BUFFERSIZE", 1))
+# Com MJPG, entrega os bytes JPEG da câmera direto no /video_feed (sem decode/re-encode)
+CAPTURE_MJPEG_PASSTHROUGH = os.getenv("CAPTURE_MJPEG_PASSTHROUGH", "1") == "1"
+# GStreamer: pipeline completo (opcional) ou só o decodificador JPEG (ex.: "v4l2jpegdec", "nvjpegdec")
+CAPTURE_GST_PIPELINE = os.getenv("CAPTURE_GST_PIPELINE", "")
+CAPTURE_GST_DECODER = os.getenv("CAPTURE_GST_DECODER", "jpegdec")
+
+# --- Layout de Processos do inference_service ---
+# "threads": tudo num processo (padrão)
+# "processes": decodificação, inferência e streaming anotado em processos separados,
+# ligados por memória compartilhada, com reinício supervisionado (ver workers.py)
+INFERENCE_PROCESS_MODE = os.getenv("INFERENCE_PROCESS_MODE", "threads")
+# Porta local da API do processo de inferência (o processo web fica com INFERENCE_API_PORT)
+INFERENCE_INTERNAL_PORT = int(os.getenv("INFERENCE_INTERNAL_PORT", 5012))
+DECODED_RING_PREFIX = os.getenv("DECODED_RING_PREFIX", "clawai_decoded")
+# Folga para o processo web ainda achar o frame que a inferência acabou de processar
+DECODED_RING_SLOTS = 16
+ANNOTATION_QUEUE_MAX = 16
+WORKER_RESTART_MAX_BACKOFF_S = 30
+
+# --- Clipes pré/pós-evento (uma peça cruzou a linha de decisão) ---
+CLIP_RECORDER_ENABLED = os.getenv("CLIP_RECORDER_ENABLED", "1") == "1"
+CLIP_DIR = os.getenv("CLIP_DIR", "data/clips")
+CLIP_PRE_SECONDS = 3.0
+CLIP_POST_SECONDS = 1.0
+CLIP_MAX_FPS = 15
+# Espaço máximo em disco: acima disso os clipes mais antigos são apagados
+CLIP_MAX_DISK_MB = int(os.getenv("CLIP_MAX_DISK_MB", 512))
+
+# --- Transporte de Frames (capture_service -> inference_service) ---
+# "mjpeg": lê o stream HTTP de CAPTURE_SERVICE_URL (padrão, funciona entre hosts)
+# "shm": lê frames BGR crus de um ring buffer em memória compartilhada (mesmo host)
+FRAME_TRANSPORT = os.getenv("FRAME_TRANSPORT", "mjpeg")
+SHM_FRAME_RING_NAME = os.getenv("SHM_FRAME_RING_NAME", "clawai_frames")
+SHM_FRAME_RING_SLOTS = int(os.getenv("SHM_FRAME_RING_SLOTS", 4))
+
+# --- Envio de Detecções para o Backend (NestJS) ---
+DETECTION_QUEUE_MAX = int(os.getenv("DETECTION_QUEUE_MAX", 1000))
+DETECTION_BATCH_MAX = int(os.getenv("DETECTION_BATCH_MAX", 20))
+# Journal local usado enquanto o backend estiver inacessível
+DETECTION_JOURNAL_PATH = os.getenv("DETECTION_JOURNAL_PATH", "data/detections_journal.jsonl")
 
 # --- Configurações do RabbitMQ ---
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
 RABBITMQ_QUEUE = "fila_decisoes_ia"
+RABBITMQ_HEARTBEAT_S = int(os.getenv("RABBITMQ_HEARTBEAT_S", 30))
+# Outbox local das decisões enquanto o broker estiver inacessível
+RABBITMQ_OUTBOX_PATH = os.getenv("RABBITMQ_OUTBOX_PATH", "data/decisions_outbox.jsonl")
 # --- Mapeamento de Decisões ---
 DECISION_MAP = {
     "circulo": "esquerda",
@@ -0,0 +1,148 @@
+# shared/async_stream.py
+"""
+Modo de servidor HTTP em asyncio (HTTP_SERVER=asyncio), com aiohttp.
+
+No modo Flask cada cliente MJPEG ocupa uma thread do SO com o próprio
+gerador em loop; com uma parede de monitores (e o frontend reconectando)
+o número de threads e a disputa pelo GIL sobem junto. Aqui um único event
+loop atende todos os clientes:
+
+    fonte (thread) --> AsyncFanout --> fila de 1 frame por cliente --> socket
+
+O AsyncFanout espera o próximo frame numa thread própria (a fonte é
+bloqueante) e entrega o MESMO objeto de bytes a todos os clientes. Cada
+cliente tem uma fila de tamanho 1: se ele ainda não terminou de enviar o
+frame anterior (socket lento), o frame novo substitui o pendente em vez
+de acumular buffer, e o cliente simplesmente pula frames.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from shared.mjpeg_broadcaster import mjpeg_part
+
+MJPEG_CONTENT_TYPE = "multipart/x-mixed-replace; boundary=frame"
+
+
+class AsyncFanout:
+    """
+    Um produtor -> N clientes no event loop. 'source(last_seq, timeout)'
+    bloqueia até haver frame mais novo e devolve (seq, capture_ts, jpeg) ou None.
+    """
+
+    def __init__(self, source, name="stream", initial_seq=None):
+        self._source = source
+        self._initial_seq = initial_seq
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"fanout-{name}")
+        self._clients = set()
+        self._task = None
+        self.seq = 0
+        self.frames_skipped = 0
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def add(self, slot):
+        self._clients.add(slot)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+
+    def remove(self, slot):
+        self._clients.discard(slot)
+
+    def _offer(self, slot, item):
+        if slot.full():
+            # Cliente ainda enviando o anterior: troca pelo mais novo
+            slot.get_nowait()
+            self.frames_skipped += 1
+        slot.put_nowait(item)
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+        # Começa do seq atual: o último frame pode estar parado desde o último cliente
+        last_seq = self._initial_seq() if self._initial_seq else 0
+        # Sem clientes a tarefa termina (e a fonte não é mais consultada)
+        while self._clients:
+            latest = await loop.run_in_executor(self._executor, self._source, last_seq, 0.5)
+            if latest is None or latest[2] is None:
+                continue
+            last_seq = self.seq = latest[0]
+            for slot in list(self._clients):
+                self._offer(slot, latest)
+
+
+async def serve_mjpeg(request, fanout, max_fps=None, placeholder=None,
+                      on_connect=None, on_disconnect=None, on_sent=None):
+    """Handler de um cliente MJPEG: lê da própria fila e escreve no socket."""
+    response = web.StreamResponse(headers={"Content-Type": MJPEG_CONTENT_TYPE, "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    slot = asyncio.Queue(maxsize=1)
+    min_interval = 1.0 / max_fps if max_fps else 0.0
+    fanout.add(slot)
+    if on_connect:
+        on_connect()
+    try:
+        sent = 0
+        next_allowed = time.monotonic()
+        while True:
+            try:
+                seq, capture_ts, jpeg_bytes = await asyncio.wait_for(slot.get(), timeout=0.5)
+            except asyncio.TimeoutError:
+                # Ainda sem nenhum frame: mantém o cliente com o placeholder
+                if sent == 0 and placeholder:
+                    await response.write(mjpeg_part(placeholder))
+                continue
+            # write() espera o socket drenar: um cliente lento só segura a própria corrotina
+            await response.write(mjpeg_part(jpeg_bytes, capture_ts))
+            sent += 1
+            if on_sent:
+                on_sent(len(jpeg_bytes))
+            if min_interval:
+                next_allowed += min_interval
+                now = time.monotonic()
+                if next_allowed > now:
+                    await asyncio.sleep(next_allowed - now)
+                else:
+                    next_allowed = now
+    except ConnectionResetError:
+        pass
+    finally:
+        fanout.remove(slot)
+        if on_disconnect:
+            on_disconnect()
+    return response
+
+
+def query_arg(request, name, type_, default=None):
+    """Como request.args.get(name, type=...) do Flask: valor inválido vira o padrão."""
+    try:
+        return type_(request.query[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def view_handler(view):
+    """
+    Adapta uma view do Flask sem argumentos (dict, (dict, status) ou Response).
+    A view roda no executor padrão: uma view que bloqueia (ex.: o /health do
+    processo web, que consulta a inferência por HTTP) não trava os streams.
+    """
+    async def handler(request):
+        result = await asyncio.get_running_loop().run_in_executor(None, view)
+        status = 200
+        if isinstance(result, tuple):
+            result, status = result
+        if isinstance(result, dict):
+            return web.json_response(result, status=status)
+        return web.Response(body=result.get_data(), status=result.status_code,
+                            content_type=result.mimetype)
+    return handler
+
+
+def run_async_app(app, host, port):
+    """Sobe o aiohttp no thread principal (bloqueia)."""
+    print(f" [web] Servidor asyncio (aiohttp) em http://{host}:{port}")
+    web.run_app(app, host=host, port=port, print=None, access_log=None)
@@ -0,0 +1,114 @@
+# shared/camera_config.py
+"""
+Configuração de ROI e linha de decisão por câmera num arquivo JSON
+(config/cameras.json), escrito pelo roiSetup.py e relido a quente pelo
+inference_service, sem reiniciar o container nem recarregar o modelo.
+
+Formato:
+    {
+      "version": 1,              # versão do esquema
+      "revision": 3,             # incrementada a cada gravação
+      "updated_at": "2026-...",
+      "cameras": {
+        "0": {"roi": [x1, y1, x2, y2], "decision_x": 320, "actuator_x": 900}
+      }
+    }
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+SCHEMA_VERSION = 1
+
+
+def _validate(config):
+    if config.get("version") != SCHEMA_VERSION:
+        raise ValueError(f"versão {config.get('version')!r} não suportada (esperado {SCHEMA_VERSION})")
+    for camera_id, camera in config.get("cameras", {}).items():
+        roi = camera.get("roi")
+        if roi is not None:
+            if len(roi) != 4 or not all(isinstance(v, int) for v in roi):
+                raise ValueError(f"câmera {camera_id}: roi deve ser [x1, y1, x2, y2] inteiros")
+            if roi[2] <= roi[0] or roi[3] <= roi[1]:
+                raise ValueError(f"câmera {camera_id}: roi vazia {roi}")
+        for key in ("decision_x", "actuator_x"):
+            if camera.get(key) is not None and not isinstance(camera[key], int):
+                raise ValueError(f"câmera {camera_id}: {key} deve ser inteiro")
+    return config
+
+
+def load_camera_config(path):
+    """Lê e valida o arquivo. None se ele não existir."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return _validate(json.load(f))
+
+
+def save_camera_config(path, camera_id, roi=None, decision_x=None, actuator_x=None):
+    """Atualiza uma câmera no arquivo (gravação atômica) e devolve a configuração nova."""
+    config = load_camera_config(path) or {"version": SCHEMA_VERSION, "revision": 0, "cameras": {}}
+    camera = config["cameras"].setdefault(str(camera_id), {})
+    if roi is not None:
+        camera["roi"] = [int(v) for v in roi]
+    if decision_x is not None:
+        camera["decision_x"] = int(decision_x)
+    if actuator_x is not None:
+        camera["actuator_x"] = int(actuator_x)
+    config["revision"] = config.get("revision", 0) + 1
+    config["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    _validate(config)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
+    # Quem estiver lendo nunca vê um arquivo pela metade
+    os.replace(tmp_path, path)
+    return config
+
+
+class CameraConfigWatcher:
+    """Verifica (barato: um os.stat) se o arquivo mudou desde a última leitura."""
+
+    def __init__(self, path, interval_s=1.0):
+        self.path = path
+        self.interval_s = interval_s
+        self.revision = None
+        self.reloads = 0
+        self.last_error = None
+        self._last_check = 0.0
+        self._last_mtime = None
+
+    def poll(self):
+        """Configuração nova se o arquivo mudou (e é válido), senão None."""
+        now = time.monotonic()
+        if now - self._last_check < self.interval_s:
+            return None
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._last_mtime:
+            return None
+        self._last_mtime = mtime
+        try:
+            config = load_camera_config(self.path)
+        except (OSError, ValueError) as e:
+            # Arquivo inválido: mantém a configuração atual
+            self.last_error = str(e)
+            print(f" [config] Ignorando {self.path} inválido: {e}")
+            return None
+        self.last_error = None
+        if config is None or config.get("revision") == self.revision:
+            return None
+        self.revision = config.get("revision")
+        self.reloads += 1
+        return config
+
+    def stats(self):
+        return {"path": self.path, "revision": self.revision, "reloads": self.reloads,
+                "last_error": self.last_error}
@@ -0,0 +1,105 @@
+# shared/camera_lane.py
+"""
+Estado de uma esteira (uma câmera) dentro do inference_service.
+
+Cada câmera tem sua fonte de frames, ROI, linha de decisão, fila RabbitMQ,
+registro de tracks e stream anotado próprios. O loop de inferência junta
+os recortes de todas as câmeras num único lote por rodada.
+"""
+import threading
+import time
+
+from shared.latest_frame import LatestFrameChannel
+
+
+class CameraLane:
+    """Fonte + configuração + métricas de uma câmera."""
+
+    def __init__(self, camera_id, source_url, roi, decision_x, routing_key,
+                 shm_ring_name, track_registry, broadcaster, motion_gate=None, clip_recorder=None,
+                 actuator_x=None):
+        self.camera_id = camera_id
+        self.source_url = source_url
+        self.roi = roi
+        self.decision_x = decision_x
+        # Posição do atuador (px da tela cheia) para prever a chegada; None = desconhecida
+        self.actuator_x = actuator_x
+        self.routing_key = routing_key
+        self.shm_ring_name = shm_ring_name
+        self.track_registry = track_registry
+        self.broadcaster = broadcaster
+        # Portão de movimento (None = roda o modelo em todo frame)
+        self.motion_gate = motion_gate
+        # Anel de recortes para os clipes pré/pós-evento (None = sem gravação)
+        self.clip_recorder = clip_recorder
+
+        # Frame bruto mais recente desta câmera (frame_id monotônico + timestamp de captura)
+        self.frames = LatestFrameChannel()
+        self.last_frame_id = 0
+
+        # Métricas
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.latest_detections = []
+        self.avg_latency_ms = 0.0       # captura -> fim do processamento
+        self.fps = 0.0                  # frames processados por segundo (medido)
+        self._fps_window_start = time.monotonic()
+        self._fps_window_frames = 0
+        self._lock = threading.Lock()
+
+    def take_new_frame(self):
+        """(frame_id, capture_ts, frame) se houver frame ainda não processado, senão None."""
+        frame_id, capture_ts, frame = self.frames.latest()
+        if frame_id <= self.last_frame_id:
+            return None
+        if self.last_frame_id:
+            self.frames_dropped += frame_id - self.last_frame_id - 1
+        self.last_frame_id = frame_id
+        return frame_id, capture_ts, frame
+
+    def crop(self, frame):
+        """Aplica a ROI. Retorna (recorte, roi ajustada à imagem ou None, offset_x)."""
+        if not self.roi:
+            return frame, None, 0
+        x1, y1, x2, y2 = self.roi
+        # Garante que as coordenadas estão dentro da imagem
+        h, w = frame.shape[:2]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w, x2), min(h, y2)
+        return frame[y1:y2, x1:x2], (x1, y1, x2, y2), x1
+
+    def mark_processed(self, capture_ts, detections, now=None):
+        now = time.time() if now is None else now
+        latency_ms = (now - capture_ts) * 1000
+        self.avg_latency_ms = latency_ms if not self.avg_latency_ms else 0.9 * self.avg_latency_ms + 0.1 * latency_ms
+        self.frames_processed += 1
+        with self._lock:
+            self.latest_detections = detections
+
+        self._fps_window_frames += 1
+        elapsed = time.monotonic() - self._fps_window_start
+        if elapsed >= 2.0:
+            self.fps = self._fps_window_frames / elapsed
+            self._fps_window_start = time.monotonic()
+            self._fps_window_frames = 0
+
+    def stats(self):
+        with self._lock:
+            detections_count = len(self.latest_detections)
+        return {
+            "source": self.source_url,
+            "roi": self.roi,
+            "decision_x": self.decision_x,
+            "actuator_x": self.actuator_x,
+            "routing_key": self.routing_key,
+            "frames_read": self.frames.seq,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "fps": round(self.fps, 1),
+            "latency_ms": round(self.avg_latency_ms, 1),
+            "detections_count": detections_count,
+            "tracks": self.track_registry.stats(),
+            "annotated_stream": self.broadcaster.stats(),
+            "motion_gate": self.motion_gate.stats() if self.motion_gate is not None else None,
+            "clip_recorder": self.clip_recorder.stats() if self.clip_recorder is not None else None,
+        }
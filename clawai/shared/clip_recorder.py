@@ -0,0 +1,231 @@
+# shared/clip_recorder.py
+"""
+Gravação de clipes pré/pós-evento das peças classificadas.
+
+Cada câmera mantém um anel com os últimos segundos de recortes da ROI num
+array NumPy alocado uma única vez (ClipRecorder). No loop de inferência,
+record() só copia o recorte para o próximo slot (sem alocar nada) e
+trigger() só anota o evento. Quando passa o tempo pós-evento, a lista de
+slots do clipe vai para o ClipWriter, uma thread de fundo que copia os
+frames do anel, grava o vídeo + metadados (track, classe, confiança,
+decisão) e mantém o diretório abaixo do limite de disco, apagando os
+clipes mais antigos.
+
+Cada slot funciona como um seqlock (igual ao shared/frame_ring.py): se o
+loop de inferência sobrescrever um slot enquanto o writer copia, o frame
+é descartado do clipe em vez de sair rasgado.
+"""
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+
+class ClipRecorder:
+    """Anel pré-alocado de recortes de UMA câmera."""
+
+    def __init__(self, camera_id, writer, pre_s=3.0, post_s=1.0, max_fps=15.0):
+        self.camera_id = camera_id
+        self.writer = writer
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.min_interval = 1.0 / max_fps
+        # Folga de 1s para o writer copiar antes de o anel dar a volta
+        self.slots = int(np.ceil((pre_s + post_s + 1.0) * max_fps))
+        self._ring = None
+        self._seqs = np.zeros(self.slots, dtype=np.int64)
+        self._timestamps = np.zeros(self.slots, dtype=np.float64)
+        self._seq = 0
+        self._last_ts = 0.0
+        self._pending = []        # (dispara_em, primeiro_seq, metadados)
+        self.frames_recorded = 0
+        self.clips_triggered = 0
+        self.clips_dropped = 0
+
+    @property
+    def frame_shape(self):
+        return self._ring.shape[1:] if self._ring is not None else None
+
+    def record(self, crop, capture_ts):
+        """Chamado a cada frame no loop de inferência: uma cópia, nenhuma alocação."""
+        if capture_ts - self._last_ts < self.min_interval:
+            return
+        if self._ring is None or self._ring.shape[1:] != crop.shape:
+            # Só na primeira vez ou quando a ROI muda: os clipes pendentes deixam de valer
+            self._ring = np.empty((self.slots,) + crop.shape, dtype=np.uint8)
+            self._seqs[:] = 0
+            self._pending = []
+        self._last_ts = capture_ts
+        seq = self._seq + 1
+        slot = seq % self.slots
+        self._seqs[slot] = 0
+        np.copyto(self._ring[slot], crop)
+        self._timestamps[slot] = capture_ts
+        self._seqs[slot] = seq
+        self._seq = seq
+        self.frames_recorded += 1
+
+        if self._pending and capture_ts >= self._pending[0][0]:
+            self._flush(capture_ts)
+
+    def trigger(self, metadata, capture_ts):
+        """Um objeto cruzou a linha: o clipe sai quando o tempo pós-evento passar."""
+        if self._ring is None:
+            return
+        pre_frames = int(self.pre_s / self.min_interval)
+        first_seq = max(1, self._seq - pre_frames + 1, self._seq - self.slots + 1)
+        self._pending.append((capture_ts + self.post_s, first_seq, metadata))
+        self.clips_triggered += 1
+
+    def reset(self):
+        """ROI recalibrada: descarta o anel e os clipes pendentes (recortes de outra região)."""
+        self.clips_dropped += len(self._pending)
+        self._pending = []
+        self._seqs[:] = 0
+        self._ring = None
+
+    def _flush(self, now_ts):
+        ready = [p for p in self._pending if now_ts >= p[0]]
+        self._pending = [p for p in self._pending if now_ts < p[0]]
+        for _, first_seq, metadata in ready:
+            if not self.writer.submit(self, first_seq, self._seq, metadata):
+                self.clips_dropped += 1
+
+    def copy_frames(self, first_seq, last_seq):
+        """Na thread do writer: (timestamp, frame) dos seqs ainda presentes no anel."""
+        ring = self._ring
+        if ring is None:
+            return []
+        frames = []
+        for seq in range(first_seq, last_seq + 1):
+            slot = seq % self.slots
+            if self._seqs[slot] != seq:
+                continue
+            timestamp = self._timestamps[slot]
+            frame = ring[slot].copy()
+            # Sobrescrito durante a cópia: descarta
+            if self._seqs[slot] == seq and self._ring is ring:
+                frames.append((timestamp, frame))
+        return frames
+
+    def stats(self):
+        return {
+            "frames_recorded": self.frames_recorded,
+            "clips_triggered": self.clips_triggered,
+            "clips_pending": len(self._pending),
+            "clips_dropped": self.clips_dropped,
+            "buffer_frames": self.slots,
+            "buffer_mb": round(self._ring.nbytes / 1e6, 1) if self._ring is not None else 0.0,
+        }
+
+
+class ClipWriter:
+    """Thread de fundo que grava os clipes e limita o espaço em disco."""
+
+    def __init__(self, directory, max_bytes, max_queue=32, fourcc="mp4v", extension=".mp4"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fourcc = fourcc
+        self.extension = extension
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self.clips_written = 0
+        self.clips_evicted = 0
+        self.frames_lost = 0       # sobrescritos no anel antes da cópia
+        self.write_errors = 0
+        self.disk_bytes = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.disk_bytes = sum(size for _, _, size in self._clips_on_disk())
+        self._thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, recorder, first_seq, last_seq, metadata):
+        """Não bloqueia: com a fila cheia o clipe é descartado."""
+        try:
+            self._queue.put_nowait((recorder, first_seq, last_seq, metadata))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            recorder, first_seq, last_seq, metadata = self._queue.get()
+            try:
+                self._write(recorder, first_seq, last_seq, metadata)
+                self._evict()
+            except Exception as e:
+                self.write_errors += 1
+                print(f" [clips] ✗ Erro ao gravar clipe: {e}")
+
+    def _write(self, recorder, first_seq, last_seq, metadata):
+        frames = recorder.copy_frames(first_seq, last_seq)
+        self.frames_lost += (last_seq - first_seq + 1) - len(frames)
+        if not frames:
+            return
+        start_ts, end_ts = frames[0][0], frames[-1][0]
+        fps = (len(frames) - 1) / (end_ts - start_ts) if end_ts > start_ts else 1.0 / recorder.min_interval
+        stamp = datetime.fromtimestamp(metadata.get("capture_ts") or start_ts).strftime("%Y%m%d-%H%M%S-%f")[:-3]
+        name = f"{stamp}_cam{recorder.camera_id}_id{metadata.get('track_id')}_{metadata.get('decision')}"
+        video_path = os.path.join(self.directory, name + self.extension)
+
+        height, width = frames[0][1].shape[:2]
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*self.fourcc), fps, (width, height))
+        try:
+            for _, frame in frames:
+                writer.write(frame)
+        finally:
+            writer.release()
+
+        metadata = dict(metadata, camera_id=recorder.camera_id, video=os.path.basename(video_path),
+                        frames=len(frames), fps=round(fps, 2), start_ts=start_ts, end_ts=end_ts)
+        with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+        self.disk_bytes += sum(os.path.getsize(os.path.join(self.directory, name + ext))
+                               for ext in (self.extension, ".json"))
+        self.clips_written += 1
+
+    def _clips_on_disk(self):
+        """(mtime, nome base, bytes do vídeo + json) de cada clipe, do mais antigo ao mais novo."""
+        clips = {}
+        for entry in os.scandir(self.directory):
+            base, ext = os.path.splitext(entry.name)
+            if ext not in (self.extension, ".json"):
+                continue
+            stat = entry.stat()
+            mtime, size = clips.get(base, (stat.st_mtime, 0))
+            clips[base] = (min(mtime, stat.st_mtime), size + stat.st_size)
+        return sorted((mtime, base, size) for base, (mtime, size) in clips.items())
+
+    def _evict(self):
+        if self.disk_bytes <= self.max_bytes:
+            return
+        clips = self._clips_on_disk()
+        self.disk_bytes = sum(size for _, _, size in clips)
+        for _, base, size in clips:
+            if self.disk_bytes <= self.max_bytes:
+                break
+            for ext in (self.extension, ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, base + ext))
+                except FileNotFoundError:
+                    pass
+            self.disk_bytes -= size
+            self.clips_evicted += 1
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "queue_depth": self._queue.qsize(),
+            "clips_written": self.clips_written,
+            "clips_evicted": self.clips_evicted,
+            "frames_lost": self.frames_lost,
+            "write_errors": self.write_errors,
+            "disk_mb": round(self.disk_bytes / 1e6, 1),
+            "max_disk_mb": round(self.max_bytes / 1e6, 1),
+        }
@@ -0,0 +1,49 @@
+# shared/clip_source.py
+"""
+Leitura de clipes gravados (arquivo de vídeo ou diretório de imagens),
+usada pelas ferramentas offline de benchmark e replay.
+"""
+import os
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def iter_clip_frames(source, max_frames=None):
+    """Gera os frames BGR de um vídeo ou de um diretório de imagens (em ordem alfabética)."""
+    count = 0
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names:
+            if max_frames is not None and count >= max_frames:
+                return
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is None:
+                continue
+            count += 1
+            yield frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Não foi possível abrir o clipe '{source}'")
+    try:
+        while max_frames is None or count < max_frames:
+            success, frame = capture.read()
+            if not success:
+                return
+            count += 1
+            yield frame
+    finally:
+        capture.release()
+
+
+def clip_fps(source, default=30.0):
+    """FPS nominal do clipe (diretórios de imagens usam 'default')."""
+    if os.path.isdir(source):
+        return default
+    capture = cv2.VideoCapture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS) or default
+    capture.release()
+    return fps
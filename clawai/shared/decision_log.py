@@ -0,0 +1,79 @@
+# shared/decision_log.py
+"""
+Log por peça (JSON Lines) do tempo de cada etapa até a decisão.
+
+Cada decisão vira uma linha com o instante de captura do frame, o instante
+da decisão, a posição/velocidade do objeto e a chegada prevista ao
+atuador. Com isso a linha de decisão e a antecedência (DECISION_LEAD_S)
+podem ser ajustadas a partir dos dados.
+
+A escrita é uma linha curta num arquivo já aberto (cache de páginas do SO),
+feita só nos frames com decisão. Acima de max_bytes o arquivo é rotacionado
+para <arquivo>.1 (só uma geração).
+"""
+import json
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class DecisionLatencyLog:
+    """Arquivo JSONL + janela das últimas latências captura -> decisão (para o /health)."""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, window=500):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=window)
+        self._lead_ms = deque(maxlen=window)
+        self.entries = 0
+        self.write_errors = 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def write(self, entry):
+        """entry: dict com ao menos capture_ts e decided_ts (time.time())."""
+        if entry.get("capture_ts") is not None:
+            self._latencies_ms.append((entry["decided_ts"] - entry["capture_ts"]) * 1000)
+        if entry.get("predicted_arrival_ts") is not None:
+            # Folga entre a decisão e a chegada prevista ao atuador
+            self._lead_ms.append((entry["predicted_arrival_ts"] - entry["decided_ts"]) * 1000)
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                self._file.write(json.dumps(entry) + "\n")
+                if self._file.tell() > self.max_bytes:
+                    self._rotate()
+                self.entries += 1
+            except OSError as e:
+                self.write_errors += 1
+                print(f" [ia] ✗ Erro ao gravar log de latência: {e}")
+
+    @staticmethod
+    def _summary(values):
+        if not values:
+            return None
+        values = np.fromiter(values, dtype=np.float64)
+        return {"p50": round(float(np.percentile(values, 50)), 1),
+                "p95": round(float(np.percentile(values, 95)), 1),
+                "max": round(float(values.max()), 1)}
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "entries": self.entries,
+            "write_errors": self.write_errors,
+            "capture_to_decision_ms": self._summary(self._latencies_ms),
+            "decision_to_predicted_arrival_ms": self._summary(self._lead_ms),
+        }
@@ -0,0 +1,285 @@
+# shared/decision_publisher.py
+"""
+Publicador das decisões de hardware no RabbitMQ.
+
+A conexão pika pertence a uma thread dedicada: o loop de inferência só faz
+publish() (enfileira em memória e volta na hora). A thread publica com
+publisher confirms, atende os heartbeats do broker enquanto está ociosa,
+reconecta sozinha e, enquanto o broker estiver fora, guarda as mensagens
+num outbox em disco (JSON Lines) que é reenviado na reconexão.
+
+Cada decisão pode ir para uma fila diferente (uma por esteira/câmera);
+sem routing_key, vai para a fila padrão.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import pika
+from pika.exceptions import AMQPError
+
+
+class DecisionPublisher:
+    """Dono da conexão RabbitMQ: fila em memória + outbox em disco + confirms."""
+
+    def __init__(self, host, queue_name, outbox_path=None, max_queue=1000,
+                 heartbeat=30, reconnect_delay_s=5.0, extra_queues=(), on_published=None,
+                 nack_retries=3, nack_backoff_s=0.05):
+        self.host = host
+        self.queue_name = queue_name
+        self.queue_names = [queue_name] + [q for q in extra_queues if q != queue_name]
+        self.outbox_path = outbox_path
+        self.heartbeat = heartbeat
+        self.reconnect_delay_s = reconnect_delay_s
+        # Nack com a conexão saudável: tenta de novo na hora (com espera curta) antes do outbox
+        self.nack_retries = nack_retries
+        self.nack_backoff_s = nack_backoff_s
+        # on_published(routing_key, enfileirado->confirm em s, captura->confirm em s ou None)
+        self.on_published = on_published
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._connection = None
+        self._channel = None
+        self._thread = None
+        self._outbox_lock = threading.Lock()
+        self._last_outbox_retry = 0.0
+
+        # Métricas (expostas no /health)
+        self.published = 0
+        self.dropped = 0
+        self.outboxed = 0
+        self.reconnects = 0
+        self.nacks = 0
+        self.outbox_quarantined = 0
+        self.worker_errors = 0
+        self.connected = False
+        self.last_confirm_ms = 0.0
+        self.avg_confirm_ms = 0.0
+        self.max_confirm_ms = 0.0
+        self.last_enqueue_to_confirm_ms = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def publish(self, message, routing_key=None, origin_ts=None):
+        """
+        Enfileira uma decisão (dict ou str JSON) sem bloquear.
+        origin_ts: time.time() da captura do frame, para medir captura -> confirm.
+        """
+        body = message if isinstance(message, str) else json.dumps(message)
+        routing_key = routing_key or self.queue_name
+        try:
+            self._queue.put_nowait((time.perf_counter(), origin_ts, routing_key, body))
+            return True
+        except queue.Full:
+            # Sem espaço em memória: vai direto para o outbox em disco
+            self._spill([(routing_key, body)])
+            return False
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "queue_depth": self._queue.qsize(),
+            "published": self.published,
+            "dropped": self.dropped,
+            "outboxed": self.outboxed,
+            "outbox_pending": self._outbox_pending(),
+            "reconnects": self.reconnects,
+            "nacks": self.nacks,
+            "outbox_quarantined": self.outbox_quarantined,
+            "worker_errors": self.worker_errors,
+            "last_confirm_ms": round(self.last_confirm_ms, 2),
+            "avg_confirm_ms": round(self.avg_confirm_ms, 2),
+            "max_confirm_ms": round(self.max_confirm_ms, 2),
+            "last_enqueue_to_confirm_ms": round(self.last_enqueue_to_confirm_ms, 2),
+        }
+
+    # --- Worker ---
+    def _run(self):
+        while True:
+            try:
+                self._step()
+            except Exception as e:
+                # Erro inesperado: a thread não pode morrer (as decisões seriam perdidas em silêncio)
+                self.worker_errors += 1
+                print(f" [mq] ✗ Erro inesperado no publicador: {e!r}. Reconectando em {self.reconnect_delay_s:g}s")
+                self._on_connection_lost(e)
+                time.sleep(self.reconnect_delay_s)
+
+    def _step(self):
+        """Uma volta do worker: (re)conecta, reenvia o outbox ou publica uma decisão."""
+        if not self.connected:
+            if not self._connect():
+                # Broker fora: o que chegar na fila vai para o disco
+                self._drain_to_outbox()
+                time.sleep(self.reconnect_delay_s)
+                return
+            if not self._replay_outbox():
+                return
+
+        try:
+            enqueued_at, origin_ts, routing_key, body = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            # Ocioso: atende heartbeats para o broker não derrubar a conexão
+            try:
+                self._connection.process_data_events(time_limit=0)
+            except AMQPError as e:
+                self._on_connection_lost(e)
+                return
+            # Sobrou algo no outbox com a conexão no ar (ex.: nacks): tenta de novo de tempos em tempos
+            if self._outbox_pending() and time.monotonic() - self._last_outbox_retry >= self.reconnect_delay_s:
+                self._last_outbox_retry = time.monotonic()
+                self._replay_outbox()
+            return
+
+        if self._send(routing_key, body):
+            enqueue_to_confirm_s = time.perf_counter() - enqueued_at
+            self.last_enqueue_to_confirm_ms = enqueue_to_confirm_s * 1000
+            if self.on_published is not None:
+                capture_to_confirm_s = None if origin_ts is None else time.time() - origin_ts
+                self.on_published(routing_key, enqueue_to_confirm_s, capture_to_confirm_s)
+        else:
+            self._spill([(routing_key, body)])
+
+    def _connect(self):
+        try:
+            params = pika.ConnectionParameters(host=self.host, heartbeat=self.heartbeat,
+                                               blocked_connection_timeout=self.heartbeat)
+            self._connection = pika.BlockingConnection(params)
+            self._channel = self._connection.channel()
+            for queue_name in self.queue_names:
+                self._channel.queue_declare(queue=queue_name, durable=True)
+            self._channel.confirm_delivery()
+            self.connected = True
+            print(f" [mq] Conectado ao RabbitMQ em {self.host} (publisher confirms ativo)")
+            return True
+        except Exception as e:
+            print(f" [mq] Não foi possível conectar ao RabbitMQ: {e!r}. Nova tentativa em {self.reconnect_delay_s:g}s")
+            self.connected = False
+            return False
+
+    def _send(self, routing_key, body):
+        """Publica e espera o confirm do broker. False se a conexão caiu ou os nacks se esgotaram."""
+        start = time.perf_counter()
+        for attempt in range(self.nack_retries + 1):
+            try:
+                self._channel.basic_publish(
+                    exchange='',
+                    routing_key=routing_key,
+                    body=body,
+                    properties=pika.BasicProperties(delivery_mode=2),
+                    mandatory=True,
+                )
+                break
+            except pika.exceptions.UnroutableError:
+                print(f" [mq] Mensagem não roteável, descartada: {body}")
+                self.dropped += 1
+                return True
+            except pika.exceptions.NackError:
+                self.nacks += 1
+                if attempt == self.nack_retries:
+                    print(f" [mq] Broker recusou (nack) a mensagem {attempt + 1}x, indo para o outbox: {body}")
+                    return False
+                print(f" [mq] Broker recusou (nack) a mensagem, nova tentativa {attempt + 1}/{self.nack_retries}")
+                time.sleep(self.nack_backoff_s * (attempt + 1))
+            except AMQPError as e:
+                self._on_connection_lost(e)
+                return False
+
+        confirm_ms = (time.perf_counter() - start) * 1000
+        self.last_confirm_ms = confirm_ms
+        self.max_confirm_ms = max(self.max_confirm_ms, confirm_ms)
+        self.avg_confirm_ms = confirm_ms if not self.avg_confirm_ms else 0.9 * self.avg_confirm_ms + 0.1 * confirm_ms
+        self.published += 1
+        print(f" [mq] Publicado em '{routing_key}' ({confirm_ms:.1f}ms até o confirm): {body}")
+        return True
+
+    def _on_connection_lost(self, error):
+        print(f" [mq] Conexão com o RabbitMQ perdida: {error}. Reconectando...")
+        self.connected = False
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+        self.reconnects += 1
+
+    # --- Outbox em disco ---
+    def _drain_to_outbox(self):
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait()[2:])
+            except queue.Empty:
+                break
+        if pending:
+            self._spill(pending)
+
+    def _outbox_pending(self):
+        return bool(self.outbox_path) and os.path.exists(self.outbox_path) \
+            and os.path.getsize(self.outbox_path) > 0
+
+    def _spill(self, items):
+        """Grava [(routing_key, body), ...] no outbox."""
+        if not self.outbox_path:
+            self.dropped += len(items)
+            print(f" [mq] Sem outbox configurado: {len(items)} decisão(ões) perdida(s)")
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.outbox_path)), exist_ok=True)
+            with self._outbox_lock, open(self.outbox_path, 'a', encoding='utf-8') as f:
+                for routing_key, body in items:
+                    f.write(json.dumps({"routing_key": routing_key, "body": body}) + '\n')
+            self.outboxed += len(items)
+        except OSError as e:
+            print(f" [mq] Falha ao gravar outbox: {e}")
+            self.dropped += len(items)
+
+    def _replay_outbox(self):
+        """Reenvia o outbox após (re)conectar. False se a conexão cair no meio."""
+        if not self._outbox_pending():
+            return True
+        pending, bad_lines = [], []
+        with self._outbox_lock:
+            try:
+                with open(self.outbox_path, 'r', encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            item = json.loads(line)
+                            pending.append((item["routing_key"], item["body"]))
+                        except (ValueError, KeyError, TypeError):
+                            # Linha truncada (ex.: queda no meio do _spill): separa, não derruba a thread
+                            bad_lines.append(line)
+                os.remove(self.outbox_path)
+            except OSError as e:
+                print(f" [mq] Outbox ilegível: {e}")
+                return True
+        if bad_lines:
+            self._quarantine(bad_lines)
+
+        for i, (routing_key, body) in enumerate(pending):
+            if not self._send(routing_key, body):
+                self._spill(pending[i:])
+                self.outboxed -= len(pending) - i
+                return False
+
+        print(f" [mq] Outbox reenviado: {len(pending)} decisão(ões).")
+        return True
+
+    def _quarantine(self, lines):
+        """Guarda as linhas inválidas do outbox em <outbox>.bad para inspeção manual."""
+        self.outbox_quarantined += len(lines)
+        try:
+            with open(f"{self.outbox_path}.bad", 'a', encoding='utf-8') as f:
+                f.writelines(line if line.endswith('\n') else line + '\n' for line in lines)
+            print(f" [mq] {len(lines)} linha(s) inválida(s) do outbox movida(s) para {self.outbox_path}.bad")
+        except OSError as e:
+            print(f" [mq] Falha ao guardar linhas inválidas do outbox: {e}")
@@ -0,0 +1,234 @@
+# shared/detection_reporter.py
+"""
+Envio assíncrono das detecções para o backend NestJS.
+
+O loop de inferência só faz submit() (não bloqueia). Uma thread de fundo
+agrupa as detecções em lotes, envia por uma requests.Session com conexões
+reaproveitadas, tenta de novo com backoff exponencial e, se o backend
+continuar fora do ar, grava o lote num journal local (JSON Lines) que é
+reenviado assim que o backend voltar.
+
+Um lote recusado pelo backend (4xx) é reenviado detecção a detecção: uma
+detecção malformada não pode levar as válidas do mesmo lote junto. Só as
+recusadas individualmente são descartadas (contadas em rejected e dropped).
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+
+
+class DetectionReporter:
+    """Fila limitada + worker que publica detecções em lote no backend."""
+
+    def __init__(self, api_url, max_queue=1000, batch_size=20, batch_wait_s=0.05,
+                 max_retries=3, retry_backoff_s=0.5, offline_retry_s=10.0,
+                 journal_path=None, journal_max_bytes=50 * 1024 * 1024, timeout=2):
+        self.api_url = api_url.rstrip('/')
+        self.batch_url = f"{self.api_url}/batch"
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_s
+        self.max_retries = max_retries
+        self.retry_backoff_s = retry_backoff_s
+        self.offline_retry_s = offline_retry_s
+        self.journal_path = journal_path
+        self.journal_max_bytes = journal_max_bytes
+        self.timeout = timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._session = requests.Session()
+        self._thread = None
+
+        # Métricas (expostas no /health)
+        self.sent = 0
+        self.dropped = 0
+        self.journaled = 0
+        self.failed_posts = 0
+        self.rejected = 0
+        self.last_latency_ms = 0.0
+        self.avg_latency_ms = 0.0
+        self.backend_online = True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, dto):
+        """Enfileira uma detecção sem bloquear. Retorna False se a fila estiver cheia."""
+        try:
+            self._queue.put_nowait(dto)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "journaled": self.journaled,
+            "journal_pending": self._journal_pending(),
+            "failed_posts": self.failed_posts,
+            "rejected": self.rejected,
+            "backend_online": self.backend_online,
+            "last_send_latency_ms": round(self.last_latency_ms, 1),
+            "avg_send_latency_ms": round(self.avg_latency_ms, 1),
+        }
+
+    # --- Worker ---
+    def _run(self):
+        offline_until = 0.0
+        while True:
+            batch = self._next_batch()
+            now = time.monotonic()
+
+            # Backend fora do ar: não trava o worker, vai direto para o journal
+            if now < offline_until:
+                if batch:
+                    self._spill(batch)
+                continue
+
+            # Reenvia o que ficou no journal antes (mantém a ordem das detecções)
+            if self._journal_pending() and not self._replay_journal():
+                offline_until = time.monotonic() + self.offline_retry_s
+                if batch:
+                    self._spill(batch)
+                continue
+
+            undelivered = self._send_with_retry(batch) if batch else []
+            if undelivered:
+                self._spill(undelivered)
+                offline_until = time.monotonic() + self.offline_retry_s
+
+    def _next_batch(self):
+        """Espera a primeira detecção e junta as que chegarem logo em seguida (rajada)."""
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_with_retry(self, batch):
+        """Entrega o lote com backoff. Devolve as detecções que não foram entregues ([] = tudo certo)."""
+        delay = self.retry_backoff_s
+        for attempt in range(1, self.max_retries + 1):
+            batch = self._deliver(batch)
+            if not batch:
+                self.backend_online = True
+                return []
+            if attempt < self.max_retries:
+                time.sleep(delay)
+                delay *= 2
+        self.backend_online = False
+        return batch
+
+    def _deliver(self, batch):
+        """
+        Um envio do lote. Num 4xx reenvia detecção a detecção e descarta só as
+        recusadas. Devolve as que ficaram sem resposta (rede/5xx), na ordem.
+        """
+        result = self._post(batch)
+        if result is None:
+            return batch
+        if result:
+            self.sent += len(batch)
+            return []
+        if len(batch) == 1:
+            # Recusada pelo backend (4xx): reenviar não adianta
+            self.rejected += 1
+            self.dropped += 1
+            print(f" [web] Detecção recusada pelo NestJS, descartando: {batch[0]}")
+            return []
+        print(f" [web] Lote de {len(batch)} recusado pelo NestJS. Reenviando detecção a detecção...")
+        for i, dto in enumerate(batch):
+            if self._deliver([dto]):
+                return batch[i:]
+        return []
+
+    def _post(self, batch):
+        """True: aceito. False: recusado pelo backend (4xx). None: erro de rede/5xx."""
+        start = time.perf_counter()
+        try:
+            if len(batch) == 1:
+                response = self._session.post(self.api_url, json=batch[0], timeout=self.timeout)
+            else:
+                response = self._session.post(self.batch_url, json=batch, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self.failed_posts += 1
+            print(f" [web] ERRO DE REDE: Não foi possível conectar com a API NestJS: {e}")
+            return None
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.last_latency_ms = latency_ms
+        self.avg_latency_ms = latency_ms if not self.avg_latency_ms else 0.9 * self.avg_latency_ms + 0.1 * latency_ms
+
+        if response.status_code in (200, 201):
+            print(f" [web] SUCESSO: {len(batch)} detecção(ões) enviada(s) para NestJS ({latency_ms:.0f}ms)")
+            return True
+        self.failed_posts += 1
+        print(f" [web] FALHA: Erro ao enviar para NestJS: {response.status_code} {response.text}")
+        if 400 <= response.status_code < 500:
+            return False
+        return None
+
+    # --- Journal em disco ---
+    def _journal_pending(self):
+        return bool(self.journal_path) and os.path.exists(self.journal_path) \
+            and os.path.getsize(self.journal_path) > 0
+
+    def _spill(self, batch):
+        if not self.journal_path:
+            self.dropped += len(batch)
+            return
+        try:
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) >= self.journal_max_bytes:
+                print(f" [web] Journal cheio ({self.journal_path}). Descartando {len(batch)} detecção(ões).")
+                self.dropped += len(batch)
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                for dto in batch:
+                    f.write(json.dumps(dto) + '\n')
+            self.journaled += len(batch)
+        except OSError as e:
+            print(f" [web] Falha ao gravar journal de detecções: {e}")
+            self.dropped += len(batch)
+
+    def _replay_journal(self):
+        """Reenvia o journal inteiro em lotes. Retorna False se o backend continuar fora."""
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                pending = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            print(f" [web] Journal de detecções ilegível, descartando: {e}")
+            os.remove(self.journal_path)
+            return True
+
+        for i in range(0, len(pending), self.batch_size):
+            undelivered = self._deliver(pending[i:i + self.batch_size])
+            if undelivered:
+                # Regrava só o que ainda não foi entregue
+                with open(self.journal_path, 'w', encoding='utf-8') as f:
+                    for dto in undelivered + pending[i + self.batch_size:]:
+                        f.write(json.dumps(dto) + '\n')
+                self.backend_online = False
+                return False
+
+        os.remove(self.journal_path)
+        self.backend_online = True
+        print(f" [web] Journal reenviado: {len(pending)} detecção(ões).")
+        return True
@@ -0,0 +1,165 @@
+# shared/frame_ring.py
+"""
+Ring buffer de frames BGR crus em memória compartilhada (/dev/shm).
+
+O capture_service escreve cada frame da câmera num slot do anel junto com
+um número de sequência e o timestamp de captura; o inference_service se
+anexa ao mesmo segmento e lê o frame mais recente sem passar por
+JPEG encode/decode nem pela pilha HTTP.
+
+Layout do segmento:
+    [cabeçalho global][slot 0][slot 1]...[slot N-1]
+    cabeçalho global: magic, nº de slots, largura, altura, canais, seq mais recente
+    slot: seq do frame, timestamp de captura, bytes BGR (altura x largura x canais)
+
+Cada slot funciona como um seqlock: o escritor zera o seq do slot antes de
+copiar os pixels e só grava o seq definitivo depois. O leitor confere o seq
+antes e depois da cópia e descarta leituras rasgadas.
+"""
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = b"CLAWRING"
+_HEADER = struct.Struct("<8sIIIIQ")   # magic, slots, width, height, channels, head_seq
+_SLOT_HEADER = struct.Struct("<Qd")   # seq, capture_ts
+_HEAD_SEQ_OFFSET = 8 + 4 * 4
+_ALIGN = 64
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SharedFrameRing:
+    """Anel de frames em memória compartilhada (um escritor, N leitores)."""
+
+    def __init__(self, shm, slots, width, height, channels, owner):
+        self._shm = shm
+        self._owner = owner
+        self.name = shm.name
+        self.slots = slots
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.shape = (height, width, channels)
+        self.frame_size = width * height * channels
+        self._header_size = _align(_HEADER.size)
+        self._slot_stride = _align(_SLOT_HEADER.size) + _align(self.frame_size)
+        self._buf = shm.buf
+        # Views numpy fixas sobre os pixels de cada slot (sem alocação por frame)
+        self._views = [
+            np.ndarray(self.shape, dtype=np.uint8, buffer=self._buf,
+                       offset=self._slot_offset(i) + _align(_SLOT_HEADER.size))
+            for i in range(slots)
+        ]
+        self._seq = self.head_seq()
+
+    # --- Construção ---
+    @classmethod
+    def create(cls, name, width, height, channels=3, slots=4):
+        """Cria (ou recria) o segmento. Usado pelo capture_service."""
+        frame_size = width * height * channels
+        size = _align(_HEADER.size) + slots * (_align(_SLOT_HEADER.size) + _align(frame_size))
+        try:
+            # Segmento órfão de uma execução anterior (ou com outra resolução)
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, slots, width, height, channels, 0)
+        return cls(shm, slots, width, height, channels, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Anexa a um segmento existente. Usado pelo inference_service."""
+        shm = shared_memory.SharedMemory(name=name)
+        # O resource_tracker apagaria o segmento do produtor quando este
+        # processo terminasse; quem anexa não é dono do segmento.
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        magic, slots, width, height, channels, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f"Segmento '{name}' não é um ring de frames válido")
+        return cls(shm, slots, width, height, channels, owner=False)
+
+    # --- Escrita (produtor único) ---
+    def write(self, frame, capture_ts=None):
+        """Copia o frame para o próximo slot e publica. Retorna o seq gravado."""
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame {frame.shape} não corresponde ao ring {self.shape}")
+        seq = self._seq + 1
+        slot = seq % self.slots
+        offset = self._slot_offset(slot)
+        _SLOT_HEADER.pack_into(self._buf, offset, 0, 0.0)
+        np.copyto(self._views[slot], frame)
+        _SLOT_HEADER.pack_into(self._buf, offset, seq,
+                               capture_ts if capture_ts is not None else time.time())
+        struct.pack_into("<Q", self._buf, _HEAD_SEQ_OFFSET, seq)
+        self._seq = seq
+        return seq
+
+    # --- Leitura ---
+    def head_seq(self):
+        return struct.unpack_from("<Q", self._buf, _HEAD_SEQ_OFFSET)[0]
+
+    def read_latest(self, last_seq=0, out=None):
+        """
+        Lê o frame mais recente se ele for mais novo que 'last_seq'.
+        Retorna (seq, capture_ts, frame) ou None se não houver frame novo.
+        'out' permite reaproveitar um array já alocado.
+        """
+        for _ in range(3):
+            seq = self.head_seq()
+            if seq == 0 or seq <= last_seq:
+                return None
+            slot = seq % self.slots
+            offset = self._slot_offset(slot)
+            slot_seq, capture_ts = _SLOT_HEADER.unpack_from(self._buf, offset)
+            if slot_seq != seq:
+                continue
+            if out is None:
+                out = np.empty(self.shape, dtype=np.uint8)
+            np.copyto(out, self._views[slot])
+            # Se o escritor deu a volta no anel durante a cópia, tenta de novo
+            if _SLOT_HEADER.unpack_from(self._buf, offset)[0] == seq:
+                return seq, capture_ts, out
+        return None
+
+    def read_at(self, capture_ts, out=None):
+        """
+        Lê o frame com esse capture_ts, se ele ainda estiver no anel.
+        Retorna (seq, capture_ts, frame) ou None se já foi sobrescrito.
+        """
+        for slot in range(self.slots):
+            offset = self._slot_offset(slot)
+            seq, slot_ts = _SLOT_HEADER.unpack_from(self._buf, offset)
+            if seq == 0 or slot_ts != capture_ts:
+                continue
+            if out is None:
+                out = np.empty(self.shape, dtype=np.uint8)
+            np.copyto(out, self._views[slot])
+            if _SLOT_HEADER.unpack_from(self._buf, offset)[0] == seq:
+                return seq, slot_ts, out
+            return None
+        return None
+
+    def close(self):
+        self._views = []
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _slot_offset(self, slot):
+        return self._header_size + slot * self._slot_stride
@@ -0,0 +1,96 @@
+# shared/inference_backend.py
+"""
+Seleção do backend de inferência do modelo YOLO.
+
+O ultralytics já sabe rodar o mesmo modelo em vários runtimes a partir do
+artefato exportado (AutoBackend): basta apontar YOLO() para o arquivo
+certo. Aqui fica só o mapeamento backend -> artefato, para que o
+inference_service, o export e o benchmark concordem sobre os caminhos.
+
+    torch       -> models/best.pt                 (PyTorch, GPU ou CPU)
+    onnxruntime -> models/best.onnx               (ONNX Runtime, CPU)
+    openvino    -> models/best_openvino_model/    (OpenVINO, CPU Intel)
+
+Com int8=True, usa a variante quantizada gerada por training/export.py.
+
+Com cache_dir, o modelo PyTorch já fundido (Conv+BN, feito pelo ultralytics
+na primeira inferência) é guardado entre reinícios: a próxima subida carrega
+direto a versão fundida. Os artefatos ONNX/OpenVINO já chegam compilados
+pelo export.
+"""
+import copy
+import glob
+import os
+
+BACKENDS = ("torch", "onnxruntime", "openvino")
+
+
+def model_artifact(backend, model_path, int8=False):
+    """Caminho do artefato que o backend deve carregar, derivado de MODEL_PATH (.pt)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferência desconhecido '{backend}'. Opções: {', '.join(BACKENDS)}")
+    stem, _ = os.path.splitext(model_path)
+    if backend == "torch":
+        return model_path
+    if backend == "onnxruntime":
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+
+
+def fused_cache_path(model_path, cache_dir):
+    """
+    Arquivo do modelo fundido no cache. A chave inclui tamanho/mtime dos
+    pesos e as versões do torch/ultralytics: qualquer mudança invalida.
+    """
+    import torch
+    import ultralytics
+
+    stat = os.stat(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    key = f"{stat.st_size}-{stat.st_mtime_ns}-torch{torch.__version__}-ul{ultralytics.__version__}"
+    return os.path.join(cache_dir, f"{stem}.{key}.fused.pt")
+
+
+def load_model(backend, model_path, int8=False, cache_dir=None):
+    """Carrega o YOLO no backend escolhido. Falha cedo se o artefato não foi exportado."""
+    from ultralytics import YOLO
+
+    artifact = model_artifact(backend, model_path, int8)
+    if not os.path.exists(artifact):
+        raise FileNotFoundError(
+            f"Artefato '{artifact}' não encontrado para o backend '{backend}'. "
+            f"Rode: python training/export.py --formats {backend}" + (" --int8" if int8 else "")
+        )
+    if backend == "torch" and cache_dir:
+        cached = fused_cache_path(artifact, cache_dir)
+        if os.path.exists(cached):
+            print(f" [ia] Carregando modelo fundido do cache '{cached}'")
+            try:
+                return YOLO(cached, task="detect")
+            except Exception as e:
+                print(f" [ia] ⚠ Cache inválido ({e}), carregando os pesos originais")
+    print(f" [ia] Carregando modelo '{artifact}' (backend={backend}{', int8' if int8 else ''})")
+    # Artefatos exportados não carregam a tarefa: informamos explicitamente
+    return YOLO(artifact, task="detect")
+
+
+def save_fused_cache(model, model_path, cache_dir):
+    """
+    Depois do aquecimento (modelo já fundido), grava no cache. Retorna o
+    caminho gravado ou None se já existia. Entradas antigas são removidas.
+    """
+    import torch
+
+    target = fused_cache_path(model_path, cache_dir)
+    if os.path.exists(target):
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{stem}.*.fused.pt")):
+        os.remove(stale)
+    fused = copy.deepcopy(model.model).cpu().float()
+    tmp_path = f"{target}.tmp"
+    # Mesmo formato de checkpoint que o ultralytics sabe carregar
+    torch.save({"model": fused, "train_args": getattr(fused, "args", {}) or {}}, tmp_path)
+    os.replace(tmp_path, target)
+    return target
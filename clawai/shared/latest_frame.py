@@ -0,0 +1,50 @@
+# shared/latest_frame.py
+"""
+Canal "último valor" entre threads: um produtor publica, N consumidores
+esperam por algo mais novo que o que já viram.
+
+Cada publicação recebe um número de sequência monotônico e um timestamp de
+captura. Valores intermediários que o consumidor não chegou a ver são
+simplesmente sobrescritos (nunca acumula fila), e a diferença entre
+sequências diz quantos foram descartados.
+"""
+import threading
+import time
+
+
+class LatestFrameChannel:
+    """Slot do valor mais recente protegido por uma Condition."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._timestamp = 0.0
+        self._value = None
+
+    def publish(self, value, timestamp=None):
+        """Substitui o valor atual e acorda quem estiver esperando. Retorna o seq."""
+        with self._cond:
+            self._seq += 1
+            self._timestamp = timestamp if timestamp is not None else time.time()
+            self._value = value
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self):
+        """Retorna (seq, timestamp, valor) sem bloquear. seq == 0: nada publicado."""
+        with self._cond:
+            return self._seq, self._timestamp, self._value
+
+    def wait_newer(self, last_seq, timeout=None):
+        """
+        Bloqueia até existir um valor com seq > last_seq.
+        Retorna (seq, timestamp, valor) ou None se o timeout estourar.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return None
+            return self._seq, self._timestamp, self._value
+
+    @property
+    def seq(self):
+        return self._seq
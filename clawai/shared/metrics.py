@@ -0,0 +1,173 @@
+# shared/metrics.py
+"""
+Métricas no formato texto do Prometheus, sem dependências externas.
+
+Cada serviço cria um MetricsRegistry e expõe registry.render() em
+/metrics. Há três tipos "ativos" (Counter, Gauge, Histogram), alimentados
+pelo código no caminho quente, e coletores por callback, que leem na hora
+do scrape contadores que já existem nos objetos (stats() do publicador,
+do reporter, das câmeras...) sem contar a mesma coisa duas vezes.
+
+O Histogram também guarda uma janela das últimas observações para
+calcular percentis reais (usados no heartbeat para o NestJS).
+"""
+import math
+import threading
+from collections import deque
+
+# Latências em segundos: de 1ms (crop, publish) até 10s (reconexões)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1,
+                   0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, window=1024):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.window = window
+        self._series = {}   # labels -> [contagens por bucket, soma, total, janela recente]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0, deque(maxlen=self.window)]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    def percentile(self, q, **labels):
+        """Percentil q (0-100) das últimas 'window' observações (0.0 sem dados)."""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            recent = sorted(series[3]) if series else []
+        if not recent:
+            return 0.0
+        index = min(len(recent) - 1, max(0, math.ceil(q / 100 * len(recent)) - 1))
+        return recent[index]
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        for key, counts, total_sum, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class _Collector(_Metric):
+    """Métrica lida no scrape: fn() devolve [(labels_dict, valor), ...] ou um número."""
+
+    def __init__(self, name, help_text, type_name, fn):
+        super().__init__(name, help_text)
+        self.type_name = type_name
+        self.fn = fn
+
+    def render(self):
+        try:
+            samples = self.fn()
+        except Exception as e:
+            return [f"# {self.name}: falha ao coletar ({e!r})"]
+        if not isinstance(samples, (list, tuple)):
+            samples = [({}, samples)]
+        return self.header() + [f"{self.name}{_format_labels(_label_key(labels))} {_format_value(value)}"
+                                for labels, value in samples]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._add(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, window=1024):
+        return self._add(Histogram(name, help_text, buckets, window))
+
+    def collector(self, name, help_text, fn, type_name="gauge"):
+        return self._add(_Collector(name, help_text, type_name, fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,167 @@
+# shared/mjpeg_broadcaster.py
+"""
+Difusão MJPEG de um frame BGR para vários clientes HTTP.
+
+O produtor só publica o array (sem codificar nada na thread dele). Cada
+variante pedida pelos clientes (escala + qualidade JPEG) é codificada no
+máximo UMA vez por frame, pelo primeiro cliente que precisar dela; os
+demais reaproveitam os mesmos bytes. Clientes só acordam quando há frame
+novo e podem limitar a própria taxa com max_fps.
+
+Com 'render', o produtor publica apenas o material bruto (ex.: frame +
+resultado do modelo) e o desenho também é feito sob demanda, uma vez por
+frame e só se houver alguém assistindo, no ritmo de exibição dos clientes.
+"""
+import threading
+import time
+
+import cv2
+
+from shared.latest_frame import LatestFrameChannel
+
+DEFAULT_JPEG_QUALITY = 80
+
+
+def mjpeg_part(jpeg_bytes, timestamp=None):
+    # Content-Length deixa o cliente entregar o frame sem esperar a próxima fronteira;
+    # X-Timestamp: instante de captura do frame (usado para medir a latência no cliente)
+    headers = b'Content-Type: image/jpeg\r\nContent-Length: %d\r\n' % len(jpeg_bytes)
+    if timestamp:
+        headers += b'X-Timestamp: %.6f\r\n' % timestamp
+    return b'--frame\r\n' + headers + b'\r\n' + jpeg_bytes + b'\r\n'
+
+
+class MjpegBroadcaster:
+    """Último frame publicado + cache de JPEG por (frame, escala, qualidade)."""
+
+    def __init__(self, default_quality=DEFAULT_JPEG_QUALITY, render=None):
+        self.default_quality = default_quality
+        self._render = render
+        self._rendered = (0, None)  # (seq, frame BGR desenhado)
+        self._render_lock = threading.Lock()
+        self._channel = LatestFrameChannel()
+        self._cache = {}          # (escala, qualidade) -> (seq, bytes)
+        self._cache_locks = {}    # (escala, qualidade) -> Lock do encode
+        self._lock = threading.Lock()
+        self.subscribers = 0
+        self.frames_encoded = 0
+        self.bytes_sent = 0
+
+    @property
+    def seq(self):
+        return self._channel.seq
+
+    def publish(self, frame, timestamp=None):
+        """
+        Publica um frame BGR (ou o valor que 'render' sabe desenhar).
+        O objeto não deve ser alterado depois disso.
+        """
+        return self._channel.publish(frame, timestamp)
+
+    def rendered(self, seq, value):
+        """Frame BGR do seq, desenhado por 'render' uma vez só."""
+        if self._render is None:
+            return value
+        with self._render_lock:
+            if self._rendered[0] < seq:
+                self._rendered = (seq, self._render(value))
+            return self._rendered[1]
+
+    def encoded(self, seq, frame, scale=1.0, quality=None):
+        """JPEG do frame 'seq' na variante pedida, codificado uma vez só."""
+        key = (scale, quality or self.default_quality)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] >= seq:
+                return cached[1]
+            encode_lock = self._cache_locks.setdefault(key, threading.Lock())
+
+        with encode_lock:
+            # Outro cliente pode ter codificado enquanto esperávamos
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] >= seq:
+                return cached[1]
+
+            image = self.rendered(seq, frame)
+            if scale != 1.0:
+                image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, key[1]])
+            if not ret:
+                return None
+            jpeg_bytes = buffer.tobytes()
+            with self._lock:
+                self._cache[key] = (seq, jpeg_bytes)
+                self.frames_encoded += 1
+            return jpeg_bytes
+
+    def wait_encoded(self, last_seq, timeout=None, scale=1.0, quality=None):
+        """
+        Bloqueia até haver frame mais novo que last_seq e devolve
+        (seq, timestamp, jpeg) na variante pedida, ou None no timeout.
+        """
+        latest = self._channel.wait_newer(last_seq, timeout)
+        if latest is None:
+            return None
+        seq, timestamp, frame = latest
+        return seq, timestamp, self.encoded(seq, frame, scale, quality)
+
+    def attach(self):
+        """Conta um cliente (o produtor só publica se houver alguém assistindo)."""
+        with self._lock:
+            self.subscribers += 1
+
+    def detach(self):
+        with self._lock:
+            self.subscribers -= 1
+
+    @staticmethod
+    def normalize(scale=1.0, quality=None):
+        """Limita escala/qualidade pedidas pelo cliente (e reduz as variantes em cache)."""
+        scale = round(min(max(scale, 0.1), 1.0), 2)
+        if quality is not None:
+            quality = int(min(max(quality, 10), 95))
+        return scale, quality
+
+    def stream(self, max_fps=None, scale=1.0, quality=None, placeholder=None):
+        """Gerador MJPEG de um cliente. Só acorda quando há frame novo."""
+        scale, quality = self.normalize(scale, quality)
+        min_interval = 1.0 / max_fps if max_fps else 0.0
+
+        self.attach()
+        try:
+            last_seq = 0
+            next_allowed = time.monotonic()
+            while True:
+                latest = self._channel.wait_newer(last_seq, timeout=0.5)
+                if latest is None:
+                    # Ainda sem nenhum frame: mantém o cliente com o placeholder
+                    if last_seq == 0 and placeholder:
+                        yield mjpeg_part(placeholder)
+                    continue
+
+                last_seq, timestamp, frame = latest
+                jpeg_bytes = self.encoded(last_seq, frame, scale, quality)
+                if jpeg_bytes is None:
+                    continue
+                self.bytes_sent += len(jpeg_bytes)
+                yield mjpeg_part(jpeg_bytes, timestamp)
+
+                if min_interval:
+                    # Limita a taxa deste cliente sem afetar os demais
+                    next_allowed += min_interval
+                    now = time.monotonic()
+                    if next_allowed > now:
+                        time.sleep(next_allowed - now)
+                    else:
+                        next_allowed = now
+        finally:
+            # GeneratorExit quando o cliente desconecta
+            self.detach()
+
+    def stats(self):
+        return {
+            "subscribers": self.subscribers,
+            "frames_published": self._channel.seq,
+            "frames_encoded": self.frames_encoded,
+            "bytes_sent": self.bytes_sent,
+        }
@@ -0,0 +1,159 @@
+# shared/mjpeg_reader.py
+"""
+Leitura do /video_feed do capture_service mantendo o instante de captura.
+
+O cv2.VideoCapture lê o MJPEG por HTTP mas joga fora os cabeçalhos de
+cada parte, então o inference_service só sabia quando o frame CHEGOU, não
+quando foi capturado. O capture_service manda em cada parte o
+Content-Length e o X-Timestamp (time.time() da captura, ver
+shared/mjpeg_broadcaster.mjpeg_part). O MjpegStreamReader lê as partes
+direto do socket e devolve (capture_ts, jpeg); o TimestampedCapture tem a
+mesma cara do cv2.VideoCapture (isOpened/read/release), com read()
+devolvendo também o capture_ts.
+
+Fontes que não são HTTP (RTSP, arquivo, /dev/video) continuam no
+cv2.VideoCapture, com capture_ts = chegada.
+"""
+import http.client
+import time
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+# Fim de um JPEG: usado quando a parte não traz Content-Length
+JPEG_EOI = b"\xff\xd9"
+# Carimbo "no futuro" além disso = relógios dos hosts fora de sincronia
+MAX_CLOCK_AHEAD_S = 1.0
+
+
+class MjpegStreamReader:
+    """Partes de um stream multipart/x-mixed-replace: (capture_ts ou None, bytes do JPEG)."""
+
+    def __init__(self, url, timeout=5.0, chunk_size=65536):
+        self.url = url
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._connection = None
+        self._response = None
+        self._buffer = b""
+
+    def open(self):
+        url = urlsplit(self.url)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._connection = connection_class(url.hostname, url.port, timeout=self.timeout)
+        self._connection.request("GET", url.path + (f"?{url.query}" if url.query else "") or "/")
+        self._response = self._connection.getresponse()
+        if self._response.status != 200:
+            status = self._response.status
+            self.close()
+            raise ConnectionError(f"HTTP {status} em {self.url}")
+        self._buffer = b""
+        return self
+
+    def _fill(self):
+        # read1: devolve o que já chegou, sem esperar encher o chunk (esperar = latência)
+        chunk = self._response.read1(self.chunk_size)
+        if not chunk:
+            raise ConnectionError("stream encerrado pelo servidor")
+        self._buffer += chunk
+
+    def read(self):
+        """Próxima parte completa. Levanta ConnectionError se o stream acabar."""
+        while True:
+            start = self._buffer.find(b"--")
+            header_end = self._buffer.find(b"\r\n\r\n", start) if start >= 0 else -1
+            if header_end < 0:
+                self._fill()
+                continue
+            capture_ts = length = None
+            for line in self._buffer[start:header_end].split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                name = name.strip().lower()
+                if name == b"content-length":
+                    length = int(value)
+                elif name == b"x-timestamp":
+                    capture_ts = float(value)
+            body_start = header_end + 4
+            if length is not None:
+                while len(self._buffer) < body_start + length:
+                    self._fill()
+                body_end = body_start + length
+            else:
+                while (body_end := self._buffer.find(JPEG_EOI, body_start)) < 0:
+                    self._fill()
+                body_end += len(JPEG_EOI)
+            jpeg_bytes = self._buffer[body_start:body_end]
+            self._buffer = self._buffer[body_end:]
+            return capture_ts, jpeg_bytes
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self._response = None
+
+
+class TimestampedCapture:
+    """Substituto do cv2.VideoCapture que devolve (ok, frame, capture_ts)."""
+
+    def __init__(self, source_url):
+        self.source_url = source_url
+        self.http = source_url.startswith(("http://", "https://"))
+        self.frames_without_timestamp = 0
+        self.clock_skew_frames = 0
+        self._reader = None
+        self._capture = None
+        try:
+            if self.http:
+                self._reader = MjpegStreamReader(source_url).open()
+            else:
+                self._capture = cv2.VideoCapture(source_url)
+        except (http.client.HTTPException, OSError) as e:
+            print(f" [capture] ✗ Falha ao abrir {source_url}: {e}")
+            self._reader = None
+
+    def isOpened(self):
+        if self.http:
+            return self._reader is not None
+        return self._capture is not None and self._capture.isOpened()
+
+    def read(self):
+        if not self.http:
+            success, frame = self._capture.read()
+            return success, frame, time.time()
+        if self._reader is None:
+            return False, None, None
+        try:
+            capture_ts, jpeg_bytes = self._reader.read()
+        except (http.client.HTTPException, OSError, ValueError) as e:
+            print(f" [capture] ⚠ Stream interrompido: {e}")
+            return False, None, None
+        arrived = time.time()
+        frame = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return False, None, None
+        if capture_ts is None:
+            # Capture_service antigo (sem X-Timestamp): a chegada é o melhor que temos
+            self.frames_without_timestamp += 1
+            if self.frames_without_timestamp == 1:
+                print(f" [capture] ⚠ {self.source_url} não envia X-Timestamp: usando o instante de chegada")
+            capture_ts = arrived
+        elif capture_ts > arrived + MAX_CLOCK_AHEAD_S:
+            self.clock_skew_frames += 1
+            if self.clock_skew_frames == 1:
+                print(f" [capture] ⚠ X-Timestamp {capture_ts - arrived:.1f}s no futuro: relógios dos hosts "
+                      f"fora de sincronia (NTP?). Usando o instante de chegada")
+            capture_ts = arrived
+        return True, frame, capture_ts
+
+    def get(self, prop):
+        return self._capture.get(prop) if self._capture is not None else 0.0
+
+    def release(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
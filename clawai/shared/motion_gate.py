@@ -0,0 +1,81 @@
+# shared/motion_gate.py
+"""
+Portão de movimento antes do modelo.
+
+Na maior parte do tempo a esteira está vazia e rodar o YOLO em todo
+recorte da ROI só gasta CPU/GPU. O portão compara o recorte (reduzido e
+em cinza) com um fundo que se adapta devagar; o modelo só roda quando há
+movimento, quando o tracker ainda tem objetos ativos, por alguns frames
+depois do último movimento e, por segurança, a cada N frames.
+"""
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Diferença contra fundo adaptativo dentro da ROI de uma câmera."""
+
+    def __init__(self, downscale_width=160, pixel_threshold=25, min_area=0.002,
+                 bg_alpha=0.05, hold_frames=15, force_every=30):
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.bg_alpha = bg_alpha
+        self.hold_frames = hold_frames
+        self.force_every = force_every
+
+        self._background = None   # float32, mesma forma da imagem reduzida
+        self._hold = 0
+        self._since_inference = 0
+
+        # Métricas
+        self.frames_gated = 0
+        self.frames_inferred = 0
+        self.last_motion_area = 0.0
+
+    def _prepare(self, crop):
+        h, w = crop.shape[:2]
+        if w > self.downscale_width:
+            height = max(1, round(h * self.downscale_width / w))
+            crop = cv2.resize(crop, (self.downscale_width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_area(self, crop):
+        """Fração dos pixels da ROI que mudaram em relação ao fundo (e atualiza o fundo)."""
+        gray = self._prepare(crop)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            return 1.0   # Sem referência ainda: trata como movimento
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        area = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+        cv2.accumulateWeighted(gray, self._background, self.bg_alpha)
+        return area
+
+    def should_infer(self, crop, tracker_active=False):
+        """True se o modelo deve rodar neste recorte."""
+        self.last_motion_area = self.motion_area(crop)
+        if self.last_motion_area >= self.min_area:
+            self._hold = self.hold_frames
+
+        infer = (tracker_active or self._hold > 0
+                 or self._since_inference + 1 >= self.force_every)
+        if self._hold > 0:
+            self._hold -= 1
+
+        if infer:
+            self._since_inference = 0
+            self.frames_inferred += 1
+        else:
+            self._since_inference += 1
+            self.frames_gated += 1
+        return infer
+
+    def stats(self):
+        total = self.frames_gated + self.frames_inferred
+        return {
+            "frames_gated": self.frames_gated,
+            "frames_inferred": self.frames_inferred,
+            "gated_ratio": round(self.frames_gated / total, 3) if total else 0.0,
+            "last_motion_area": round(self.last_motion_area, 4),
+        }
@@ -0,0 +1,23 @@
+# shared/proc_stats.py
+"""
+CPU e threads de um processo lidos de /proc/<pid>/stat (só Linux).
+
+Usado pelo supervisor multiprocesso (CPU de cada worker no /health e no
+/metrics) e pelo teste de carga dos streams (CPU do servidor por etapa).
+"""
+import os
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def process_cpu_seconds(pid):
+    """
+    (CPU usuário + sistema em segundos, número de threads) do processo.
+    Levanta OSError se o processo não existir ou não houver /proc.
+    """
+    with open(f"/proc/{pid}/stat") as f:
+        # O nome do processo (2º campo) pode ter espaços: corta depois do ')'
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLK_TCK
+    threads = int(fields[17])
+    return cpu, threads
@@ -0,0 +1,82 @@
+# shared/startup.py
+"""
+Marcos da inicialização de um serviço e prontidão (readiness).
+
+Liveness (/health) só diz que o processo responde. Prontidão (/ready) diz
+que ele já entrega no ritmo normal: o modelo foi carregado e aquecido e um
+frame real passou pelo pipeline dentro do orçamento de latência (derivado
+da latência medida no aquecimento). O tempo até ficar pronto é medido a
+partir do início do processo, incluindo os imports pesados.
+"""
+import threading
+import time
+
+
+class StartupTracker:
+    """Registra quando cada etapa da subida terminou e decide a prontidão."""
+
+    def __init__(self, started_at=None, latency_factor=2.0, latency_budget_ms=None):
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.latency_factor = latency_factor
+        self.latency_budget_ms = latency_budget_ms or None
+        self.milestones = {}          # etapa -> segundos desde o início do processo
+        self.ready = False
+        self.reason = "modelo carregando"
+        self.slow_frames = 0          # frames reais acima do orçamento antes de ficar pronto
+        self.error = None             # falha fatal da subida (ex.: artefato do modelo ausente)
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def mark(self, name):
+        """Registra a etapa (só a primeira vez). Retorna True se era nova."""
+        with self._lock:
+            if name in self.milestones:
+                return False
+            self.milestones[name] = round(self.elapsed(), 3)
+        print(f" [startup] {name}: {self.milestones[name]:.2f}s")
+        return True
+
+    def warmed_up(self, steady_ms):
+        """Fim do aquecimento: a latência estável medida vira a base do orçamento."""
+        if self.latency_budget_ms is None:
+            self.latency_budget_ms = round(steady_ms * self.latency_factor, 1)
+        self.reason = "aguardando o primeiro frame real"
+        self.mark("warmup")
+
+    def failed(self, stage, error):
+        """A subida falhou de vez: /ready e /health passam a mostrar o motivo."""
+        self.ready = False
+        self.error = f"{stage}: {error!r}"
+        self.reason = f"falha em {stage}"
+        print(f" [startup] ✗ Falha em {stage} ({self.elapsed():.2f}s): {error!r}")
+
+    def observe_frame(self, processing_ms):
+        """Frame real processado. Fica pronto no primeiro dentro do orçamento."""
+        if self.ready or self.latency_budget_ms is None:
+            return self.ready
+        if processing_ms > self.latency_budget_ms:
+            self.slow_frames += 1
+            self.reason = (f"frame real em {processing_ms:.0f}ms, acima do orçamento "
+                           f"de {self.latency_budget_ms:.0f}ms")
+            return False
+        self.ready = True
+        self.reason = None
+        self.mark("ready")
+        print(f" [startup] ✓ Pronto em {self.milestones['ready']:.2f}s "
+              f"(frame real em {processing_ms:.0f}ms, orçamento {self.latency_budget_ms:.0f}ms, "
+              f"{self.slow_frames} frame(s) lento(s) antes)")
+        return True
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "reason": self.reason,
+            "error": self.error,
+            "uptime_s": round(self.elapsed(), 1),
+            "time_to_ready_s": self.milestones.get("ready"),
+            "latency_budget_ms": self.latency_budget_ms,
+            "slow_frames": self.slow_frames,
+            "milestones": dict(self.milestones),
+        }
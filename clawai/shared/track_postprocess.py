@@ -0,0 +1,66 @@
+# shared/track_postprocess.py
+"""
+Pós-processamento vetorizado das caixas rastreadas.
+
+Em vez de chamar .cpu()/.tolist() separadamente em xyxy, id, conf e cls e
+percorrer caixa a caixa em Python, o resultado do tracker é copiado para o
+host UMA vez, como um array (N, 7), e as contas por caixa (centro global,
+cruzamento da linha de decisão, projeção pela velocidade) viram operações
+NumPy. O loop em Python sobra só para os objetos que cruzaram a linha
+neste frame (poucos).
+"""
+import numpy as np
+
+# Colunas de boxes.data quando há tracking: x1, y1, x2, y2, track_id, conf, cls
+X1, Y1, X2, Y2, TRACK_ID, CONF, CLS = range(7)
+EMPTY_TRACKS = np.empty((0, 7), dtype=np.float32)
+
+
+def pack_tracks(result):
+    """Uma única transferência device -> host das caixas com track_id. (0, 7) se não houver."""
+    boxes = result.boxes
+    if boxes is None or boxes.id is None:
+        return EMPTY_TRACKS
+    data = boxes.data
+    return data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+
+
+def global_centers_x(packed, offset_x):
+    """Centro X de cada caixa na imagem CHEIA (as caixas são relativas ao recorte da ROI)."""
+    return (packed[:, X1] + packed[:, X2]) * 0.5 + offset_x
+
+
+def project_centers_x(centers_x, velocities, horizon_s):
+    """
+    Onde cada centro estará daqui a horizon_s segundos, andando na velocidade
+    do track. Sem velocidade confiável (NaN) ou andando para trás, fica onde está.
+    """
+    if horizon_s <= 0:
+        return centers_x
+    moving = np.isfinite(velocities) & (velocities > 0)
+    return np.where(moving, centers_x + np.where(moving, velocities, 0.0) * horizon_s, centers_x)
+
+
+def predict_arrival(capture_ts, center_x, velocity, target_x):
+    """Instante (time.time()) em que o centro chega a target_x, ou None sem velocidade/alvo."""
+    if target_x is None or capture_ts is None or not np.isfinite(velocity) or velocity <= 0:
+        return None
+    return capture_ts + max(0.0, target_x - center_x) / velocity
+
+
+def crossing_indices(centers_x, decision_x, decided_mask):
+    """Índices das caixas além da linha de decisão cujo track ainda não foi decidido."""
+    # trunc: mesmo arredondamento do int(center_x) usado antes da vetorização
+    return np.flatnonzero((np.trunc(centers_x) > decision_x) & ~decided_mask)
+
+
+class DecisionLookup:
+    """Tabelas cls_id -> nome e cls_id -> decisão de hardware, montadas uma vez por modelo."""
+
+    NO_ACTION = "nenhuma"
+
+    def __init__(self, names, decision_map):
+        size = max(names) + 1 if names else 0
+        self.names = np.array([names.get(i, str(i)) for i in range(size)], dtype=object)
+        self.actions = np.array([decision_map.get(name, self.NO_ACTION) for name in self.names], dtype=object)
+        self.has_action = self.actions != self.NO_ACTION
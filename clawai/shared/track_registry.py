@@ -0,0 +1,274 @@
+# shared/track_registry.py
+"""
+Registro do estado de cada track do tracker (ByteTrack/BoT-SORT).
+
+Substitui o antigo set 'ids_ja_processados', que crescia para sempre.
+Cada track guarda primeiro/último frame em que apareceu, os votos de
+classe ao longo da vida (ponderados pela confiança), a melhor confiança,
+a decisão já emitida e a velocidade do objeto na esteira (px/s no eixo X,
+média móvel das posições do centro entre frames, usando o instante de
+CAPTURA de cada frame). Tracks que somem por mais de N frames (saíram da
+ROI) ou ficam ociosas além do TTL são removidas, então o tamanho do
+registro acompanha o número de objetos na esteira, não o uptime.
+
+O estado fica em arrays NumPy indexados por slot, e os track_ids vivos
+num array ordenado (slot de cada um achado por np.searchsorted). Assim
+as operações por frame (update_many, decided_mask, velocities, evict) são
+operações vetorizadas sobre todas as caixas de uma vez, sem loop em
+Python por caixa. get() monta uma visão (TrackView) só para os poucos
+tracks que cruzaram a linha.
+"""
+import time
+
+import numpy as np
+
+# Arrays de estado por slot e o valor de um slot vazio
+_FIELDS = {
+    "_active": (bool, False),
+    "_track_id": (np.int64, -1),
+    "_first_frame": (np.int64, 0),
+    "_last_frame": (np.int64, 0),
+    "_first_seen": (np.float64, 0.0),
+    "_last_seen": (np.float64, 0.0),
+    "_best_conf": (np.float64, 0.0),
+    "_decided": (bool, False),
+    "_decision": (object, None),
+    "_decided_at": (np.float64, np.nan),
+    "_last_x": (np.float64, np.nan),       # centro X (tela cheia) na última observação
+    "_last_ts": (np.float64, np.nan),      # instante de captura da última observação
+    "_velocity_x": (np.float64, 0.0),      # px/s (positivo = sentido da linha de decisão)
+    "_velocity_samples": (np.int64, 0),
+}
+
+
+class TrackView:
+    """Visão de leitura de um track (mesmos campos do antigo TrackState)."""
+
+    __slots__ = ("_registry", "_slot")
+
+    def __init__(self, registry, slot):
+        self._registry = registry
+        self._slot = slot
+
+    def __getattr__(self, name):
+        # track_id, first_frame, last_frame, first_seen, last_seen, best_conf,
+        # decision, decided_at, last_x, last_ts, velocity_x, velocity_samples
+        if name.startswith("_") or "_" + name not in _FIELDS:
+            raise AttributeError(name)
+        value = getattr(self._registry, "_" + name)[self._slot]
+        return value.item() if isinstance(value, np.generic) else value
+
+    @property
+    def decided(self):
+        return bool(self._registry._decided[self._slot])
+
+    @property
+    def class_votes(self):
+        """cls_id -> [soma das confianças, melhor confiança] (só classes votadas)."""
+        sums = self._registry._vote_sum[self._slot]
+        maxes = self._registry._vote_max[self._slot]
+        return {int(c): [float(sums[c]), float(maxes[c])] for c in np.flatnonzero(sums > 0)}
+
+    def majority_class(self):
+        """Classe mais votada ao longo da vida do track (votos ponderados pela confiança)."""
+        sums = self._registry._vote_sum[self._slot]
+        if not sums.any():
+            return None
+        return int(np.argmax(sums))
+
+    def class_confidence(self, cls_id):
+        maxes = self._registry._vote_max[self._slot]
+        return float(maxes[cls_id]) if cls_id is not None and cls_id < len(maxes) else 0.0
+
+
+class TrackRegistry:
+    """Estado por track_id em arrays, com expiração por frames ausentes e por TTL."""
+
+    def __init__(self, idle_ttl_s=10.0, idle_frames=60, max_tracks=1000,
+                 velocity_alpha=0.5, velocity_min_samples=3, initial_capacity=64, num_classes=8):
+        self.idle_ttl_s = idle_ttl_s
+        self.idle_frames = idle_frames
+        self.max_tracks = max_tracks
+        self.velocity_alpha = velocity_alpha
+        # Menos amostras que isso: velocidade ainda não confiável (NaN em velocities())
+        self.velocity_min_samples = velocity_min_samples
+        self.evicted = 0
+        self.decisions = 0
+
+        self._capacity = 0
+        for name, (dtype, fill) in _FIELDS.items():
+            setattr(self, name, np.full(0, fill, dtype=dtype))
+        self._vote_sum = np.zeros((0, num_classes))
+        self._vote_max = np.zeros((0, num_classes))
+        self._grow(initial_capacity)
+        # track_ids vivos em ordem crescente e o slot de cada um (busca por searchsorted)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._slot_of = np.empty(0, dtype=np.int64)
+
+    # --- Armazenamento ---
+    def _grow(self, capacity):
+        """Aumenta o número de slots (dobrando) preservando o estado."""
+        capacity = max(capacity, 2 * self._capacity)
+        extra = capacity - self._capacity
+        for name, (dtype, fill) in _FIELDS.items():
+            setattr(self, name, np.concatenate([getattr(self, name), np.full(extra, fill, dtype=dtype)]))
+        classes = self._vote_sum.shape[1]
+        self._vote_sum = np.vstack([self._vote_sum, np.zeros((extra, classes))])
+        self._vote_max = np.vstack([self._vote_max, np.zeros((extra, classes))])
+        self._capacity = capacity
+
+    def _grow_classes(self, num_classes):
+        extra = num_classes - self._vote_sum.shape[1]
+        self._vote_sum = np.hstack([self._vote_sum, np.zeros((self._capacity, extra))])
+        self._vote_max = np.hstack([self._vote_max, np.zeros((self._capacity, extra))])
+
+    def _lookup(self, track_ids):
+        """Slot de cada track_id (-1 se não estiver no registro)."""
+        if not len(self._ids):
+            return np.full(len(track_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._ids, track_ids), len(self._ids) - 1)
+        return np.where(self._ids[pos] == track_ids, self._slot_of[pos], -1)
+
+    def _insert(self, new_ids, frame_id, now):
+        """Cria os tracks novos (ids únicos) em slots livres."""
+        free = np.flatnonzero(~self._active)
+        if len(free) < len(new_ids):
+            self._grow(self._capacity + len(new_ids))
+            free = np.flatnonzero(~self._active)
+        slots = free[:len(new_ids)]
+        for name, (dtype, fill) in _FIELDS.items():
+            getattr(self, name)[slots] = fill
+        self._vote_sum[slots] = 0.0
+        self._vote_max[slots] = 0.0
+        self._active[slots] = True
+        self._track_id[slots] = new_ids
+        self._first_frame[slots] = frame_id
+        self._first_seen[slots] = now
+
+        ids = np.concatenate([self._ids, new_ids])
+        order = np.argsort(ids, kind="stable")
+        self._ids = ids[order]
+        self._slot_of = np.concatenate([self._slot_of, slots])[order]
+
+    def _remove(self, slots):
+        if not len(slots):
+            return
+        self._active[slots] = False
+        self._decision[slots] = None
+        keep = self._active[self._slot_of]
+        self._ids = self._ids[keep]
+        self._slot_of = self._slot_of[keep]
+        self.evicted += len(slots)
+
+    # --- API ---
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, track_id):
+        return bool(self._lookup(np.array([track_id], dtype=np.int64))[0] >= 0)
+
+    def get(self, track_id):
+        slot = self._lookup(np.array([track_id], dtype=np.int64))[0]
+        return TrackView(self, int(slot)) if slot >= 0 else None
+
+    def update(self, track_id, frame_id, cls_id, conf, now=None):
+        """Registra uma observação do track neste frame e devolve o estado."""
+        self.update_many([track_id], frame_id, [cls_id], [conf], now)
+        return self.get(track_id)
+
+    def update_many(self, track_ids, frame_id, cls_ids, confs, now=None, centers_x=None, capture_ts=None):
+        """
+        Registra todas as caixas de um frame de uma vez. Com centers_x e
+        capture_ts, atualiza também a velocidade de cada track.
+        """
+        now = time.time() if now is None else now
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        if not len(track_ids):
+            return
+        cls_ids = np.asarray(cls_ids, dtype=np.int64)
+        confs = np.asarray(confs, dtype=np.float64)
+
+        slots = self._lookup(track_ids)
+        missing = slots < 0
+        if missing.any():
+            self._insert(np.unique(track_ids[missing]), frame_id, now)
+            slots = self._lookup(track_ids)
+
+        self._last_frame[slots] = frame_id
+        self._last_seen[slots] = now
+        if cls_ids.max() >= self._vote_sum.shape[1]:
+            self._grow_classes(int(cls_ids.max()) + 1)
+        np.add.at(self._vote_sum, (slots, cls_ids), confs)
+        np.maximum.at(self._vote_max, (slots, cls_ids), confs)
+        np.maximum.at(self._best_conf, slots, confs)
+
+        if centers_x is not None and capture_ts is not None:
+            centers_x = np.asarray(centers_x, dtype=np.float64)
+            dt = capture_ts - self._last_ts[slots]
+            has_previous = dt > 0          # NaN (primeira observação) dá False
+            instant = (centers_x - self._last_x[slots]) / np.where(has_previous, dt, 1.0)
+            old = self._velocity_x[slots]
+            samples = self._velocity_samples[slots]
+            ema = np.where(samples == 0, instant, old + self.velocity_alpha * (instant - old))
+            self._velocity_x[slots] = np.where(has_previous, ema, old)
+            self._velocity_samples[slots] = samples + has_previous
+            self._last_x[slots] = centers_x
+            self._last_ts[slots] = capture_ts
+
+        # Acima do limite: descarta os vistos há mais tempo
+        overflow = len(self._ids) - self.max_tracks
+        if overflow > 0:
+            live = self._slot_of
+            self._remove(live[np.argsort(self._last_seen[live], kind="stable")[:overflow]])
+
+    def decided_mask(self, track_ids):
+        """Array booleano: True para os tracks que já tiveram decisão emitida."""
+        slots = self._lookup(np.asarray(track_ids, dtype=np.int64))
+        return (slots >= 0) & self._decided[slots]
+
+    def velocities(self, track_ids):
+        """Velocidade X (px/s) de cada track; NaN enquanto houver poucas amostras."""
+        slots = self._lookup(np.asarray(track_ids, dtype=np.int64))
+        reliable = (slots >= 0) & (self._velocity_samples[slots] >= self.velocity_min_samples)
+        return np.where(reliable, self._velocity_x[slots], np.nan)
+
+    def mark_decided(self, track_id, decision, now=None):
+        slot = self._lookup(np.array([track_id], dtype=np.int64))[0]
+        if slot < 0:
+            return None
+        if not self._decided[slot]:
+            self.decisions += 1
+        self._decided[slot] = True
+        self._decision[slot] = decision
+        self._decided_at[slot] = time.time() if now is None else now
+        return TrackView(self, int(slot))
+
+    def evict(self, frame_id, now=None):
+        """Remove tracks ausentes há mais de idle_frames frames ou idle_ttl_s segundos."""
+        now = time.time() if now is None else now
+        live = self._slot_of
+        stale = (frame_id - self._last_frame[live] > self.idle_frames) | (now - self._last_seen[live] > self.idle_ttl_s)
+        removed = live[stale]
+        self._remove(removed)
+        return len(removed)
+
+    def reset(self):
+        """
+        Esquece todos os tracks (ROI nova = tracker novo, que recomeça os IDs
+        em 1): sem isso um ID reaproveitado herdaria a decisão do objeto antigo.
+        """
+        self._remove(self._slot_of.copy())
+
+    def reset_velocity(self):
+        """Zera as velocidades (ex.: linha de decisão recalibrada); os votos de classe ficam."""
+        self._last_x[:] = np.nan
+        self._last_ts[:] = np.nan
+        self._velocity_x[:] = 0.0
+        self._velocity_samples[:] = 0
+
+    def stats(self):
+        return {
+            "active_tracks": len(self._ids),
+            "decisions_emitted": self.decisions,
+            "evicted_tracks": self.evicted,
+        }
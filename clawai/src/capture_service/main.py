@@ -5,33 +5,202 @@ import threading
 import requests
 import os
 
+# Adiciona o diretório raiz ao path para encontrar 'config' e 'shared'
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+from config import settings
+from shared.frame_ring import SharedFrameRing
+from shared.latest_frame import LatestFrameChannel
+from shared.metrics import MetricsRegistry
+from shared.mjpeg_broadcaster import mjpeg_part
+
 app = Flask(__name__)
 
 VIDEOCAPTUREID = int(os.getenv("VIDEOCAPTUREID"))
 
-video_capture = cv2.VideoCapture(VIDEOCAPTUREID) 
+def fourcc_to_str(value):
+    """Converte o inteiro de CAP_PROP_FOURCC em texto (ex.: 'MJPG', 'YUYV')."""
+    value = int(value)
+    text = "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ")
+    return text or "desconhecido"
+
+def gstreamer_pipeline():
+    """Pipeline v4l2src -> (decodificador JPEG) -> BGR -> appsink, sempre com o frame mais novo."""
+    if settings.CAPTURE_GST_PIPELINE:
+        return settings.CAPTURE_GST_PIPELINE
+    caps = "image/jpeg" if settings.CAPTURE_FOURCC == "MJPG" else "video/x-raw"
+    if settings.CAPTURE_WIDTH and settings.CAPTURE_HEIGHT:
+        caps += f",width={settings.CAPTURE_WIDTH},height={settings.CAPTURE_HEIGHT}"
+    if settings.CAPTURE_FPS:
+        caps += f",framerate={settings.CAPTURE_FPS}/1"
+    decoder = f" ! {settings.CAPTURE_GST_DECODER}" if settings.CAPTURE_FOURCC == "MJPG" else ""
+    return (f"v4l2src device=/dev/video{VIDEOCAPTUREID} ! {caps}{decoder} ! videoconvert ! "
+            f"video/x-raw,format=BGR ! appsink drop=true max-buffers={settings.CAPTURE_BUFFERSIZE} sync=false")
+
+def open_camera():
+    """Abre a câmera com formato, resolução, FPS e buffer explícitos (nada de padrão do driver)."""
+    if settings.CAPTURE_BACKEND == "gstreamer":
+        pipeline = gstreamer_pipeline()
+        print(f" [camera] Abrindo via GStreamer: {pipeline}")
+        return cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+
+    api = cv2.CAP_V4L2 if settings.CAPTURE_BACKEND == "v4l2" else cv2.CAP_ANY
+    capture = cv2.VideoCapture(VIDEOCAPTUREID, api)
+    if not capture.isOpened() and api != cv2.CAP_ANY:
+        print(f" [camera] Backend '{settings.CAPTURE_BACKEND}' indisponível, usando o padrão do OpenCV")
+        capture = cv2.VideoCapture(VIDEOCAPTUREID)
+
+    # No V4L2 a ordem importa: formato antes de resolução e FPS
+    if settings.CAPTURE_FOURCC:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings.CAPTURE_FOURCC))
+    if settings.CAPTURE_WIDTH and settings.CAPTURE_HEIGHT:
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings.CAPTURE_WIDTH)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.CAPTURE_HEIGHT)
+    if settings.CAPTURE_FPS:
+        capture.set(cv2.CAP_PROP_FPS, settings.CAPTURE_FPS)
+    capture.set(cv2.CAP_PROP_BUFFERSIZE, settings.CAPTURE_BUFFERSIZE)
+
+    # Passthrough: com CONVERT_RGB=0 o read() devolve o JPEG cru da câmera
+    if settings.CAPTURE_MJPEG_PASSTHROUGH and fourcc_to_str(capture.get(cv2.CAP_PROP_FOURCC)) == "MJPG":
+        capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    return capture
+
+video_capture = open_camera()
 
 CAMERA_NAME = "Camera 01"
 CAMERA_WIDTH = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
 CAMERA_HEIGHT = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-CAMERA_FPS = int(video_capture.get(cv2.CAP_PROP_FPS))
+CAMERA_FPS = int(video_capture.get(cv2.CAP_PROP_FPS))   # Nominal (o que o driver aceitou)
 CAMERA_RESOLUTION_STR = f"{CAMERA_WIDTH}x{CAMERA_HEIGHT}"
+CAMERA_FOURCC = fourcc_to_str(video_capture.get(cv2.CAP_PROP_FOURCC))
+try:
+    CAPTURE_BACKEND_NAME = video_capture.getBackendName()
+except cv2.error:
+    CAPTURE_BACKEND_NAME = settings.CAPTURE_BACKEND
+
+# Medidos pelo grab_loop (não o FPS nominal do driver)
+measured_fps = 0.0
+mjpeg_passthrough = False   # True quando a câmera entrega JPEG e ele vai direto ao /video_feed
 NESTJS_HEARTBEAT_URL = os.getenv("NESTJS_HEARTBEAT_URL", "http://localhost:3001/stats/heartbeat")
 
-def generate_frames():
-    """Lê frames da câmera e os converte para o formato MJPEG."""
+# Ring buffer de memória compartilhada (apenas com FRAME_TRANSPORT=shm)
+USE_SHM = settings.FRAME_TRANSPORT == "shm"
+frame_ring = None
+
+# Último frame JPEG, codificado uma única vez e compartilhado por todos os clientes
+jpeg_channel = LatestFrameChannel()
+clients_lock = threading.Lock()
+stream_clients = 0
+
+# --- Métricas (/metrics, formato Prometheus) ---
+metrics = MetricsRegistry()
+frames_grabbed_total = metrics.counter("clawai_capture_frames_grabbed_total", "Frames lidos da câmera")
+read_failures_total = metrics.counter("clawai_capture_read_failures_total", "Falhas de video_capture.read()")
+frames_streamed_total = metrics.counter("clawai_capture_frames_streamed_total", "Frames enviados aos clientes do /video_feed")
+bytes_streamed_total = metrics.counter("clawai_capture_bytes_streamed_total", "Bytes enviados aos clientes do /video_feed")
+grab_interval_seconds = metrics.histogram("clawai_capture_grab_interval_seconds", "Intervalo entre frames lidos da câmera")
+encode_seconds = metrics.histogram("clawai_capture_jpeg_encode_seconds", "Tempo de cv2.imencode por frame")
+shm_write_seconds = metrics.histogram("clawai_capture_shm_write_seconds", "Tempo de escrita no ring de memória compartilhada")
+metrics.collector("clawai_capture_fps", "FPS medido na leitura da câmera", lambda: round(measured_fps, 2))
+metrics.collector("clawai_capture_stream_clients", "Clientes conectados ao /video_feed", lambda: stream_clients)
+metrics.collector("clawai_capture_shm_seq", "Último seq publicado no ring de memória compartilhada",
+                  lambda: frame_ring.head_seq() if frame_ring is not None else 0, "counter")
+
+def grab_loop():
+    """
+    Thread produtora única: é a ÚNICA que chama video_capture.read().
+    Cada frame é publicado no ring (modo shm) e codificado em JPEG uma vez
+    só, independente de quantos clientes estejam assistindo /video_feed.
+    """
+    global frame_ring, measured_fps, mjpeg_passthrough
+    frames_grabbed = 0
+    last_grab = None
+    fps_window_start = time.monotonic()
+    fps_window_frames = 0
     while True:
         success, frame = video_capture.read()
+        capture_ts = time.time()
         if not success:
+            read_failures_total.inc()
             print("Erro ao capturar frame da câmera. Tentando novamente...")
+            time.sleep(0.01)
+            continue
+        frames_grabbed += 1
+        frames_grabbed_total.inc()
+        if last_grab is not None:
+            grab_interval_seconds.observe(capture_ts - last_grab)
+        last_grab = capture_ts
+
+        fps_window_frames += 1
+        elapsed = time.monotonic() - fps_window_start
+        if elapsed >= 2.0:
+            measured_fps = fps_window_frames / elapsed
+            fps_window_start = time.monotonic()
+            fps_window_frames = 0
+
+        # Passthrough MJPEG: o read() devolveu o JPEG cru (1 linha de bytes), não uma imagem
+        jpeg_bytes = None
+        if frame.ndim == 1 or (frame.ndim == 2 and frame.shape[0] == 1):
+            mjpeg_passthrough = True
+            jpeg_bytes = frame.tobytes()
+            # Só decodifica se alguém precisa da imagem crua (ring de memória compartilhada)
+            frame = cv2.imdecode(frame, cv2.IMREAD_COLOR) if USE_SHM else None
+            if USE_SHM and frame is None:
+                read_failures_total.inc()
+                continue
+
+        if USE_SHM:
+            if frame_ring is None or frame_ring.shape != frame.shape:
+                if frame_ring is not None:
+                    frame_ring.close()
+                h, w = frame.shape[:2]
+                channels = frame.shape[2] if frame.ndim == 3 else 1
+                frame_ring = SharedFrameRing.create(settings.SHM_FRAME_RING_NAME, w, h,
+                                                    channels, settings.SHM_FRAME_RING_SLOTS)
+                print(f" [shm] Ring '{frame_ring.name}' criado: {w}x{h}x{channels}, "
+                      f"{frame_ring.slots} slots")
+            write_start = time.perf_counter()
+            frame_ring.write(frame, capture_ts)
+            shm_write_seconds.observe(time.perf_counter() - write_start)
+
+        # Sem ninguém no /video_feed não há por que gastar CPU com JPEG
+        if stream_clients == 0:
             continue
-        else:
+
+        if jpeg_bytes is None:
+            encode_start = time.perf_counter()
             ret, buffer = cv2.imencode('.jpg', frame)
+            encode_seconds.observe(time.perf_counter() - encode_start)
             if not ret:
                 continue
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            jpeg_bytes = buffer.tobytes()
+        jpeg_channel.publish(jpeg_bytes, capture_ts)
+
+        if frames_grabbed % 300 == 0:
+            print(f" [camera] ✓ {frames_grabbed} frames capturados | {stream_clients} cliente(s)")
+
+def generate_frames():
+    """Entrega a cada cliente os frames JPEG já codificados pelo grab_loop."""
+    global stream_clients
+    with clients_lock:
+        stream_clients += 1
+    print(f" [web] Cliente conectado ao /video_feed ({stream_clients} ativos)")
+    try:
+        last_seq = jpeg_channel.seq
+        while True:
+            latest = jpeg_channel.wait_newer(last_seq, timeout=1.0)
+            if latest is None:
+                continue
+            last_seq, capture_ts, frame_bytes = latest
+            frames_streamed_total.inc()
+            bytes_streamed_total.inc(len(frame_bytes))
+            yield mjpeg_part(frame_bytes, capture_ts)
+    finally:
+        # GeneratorExit quando o cliente desconecta
+        with clients_lock:
+            stream_clients -= 1
+        print(f" [web] Cliente desconectado do /video_feed ({stream_clients} ativos)")
 
 def send_heartbeat():
     """Envia um pulso de vida para o backend NestJS a cada 10 segundos."""
@@ -42,7 +211,7 @@ def send_heartbeat():
                 "status": "online",
                 "cameraName": CAMERA_NAME,
                 "resolution": CAMERA_RESOLUTION_STR,
-                "fps": CAMERA_FPS
+                "fps": round(measured_fps) or CAMERA_FPS
             }
             requests.post(NESTJS_HEARTBEAT_URL, json=payload, timeout=2)
             print(f" [web] Pulso de vida da Câmera enviado para NestJS.")
@@ -66,15 +235,72 @@ def health():
         "camera_open": is_camera_open,
         "camera_name": CAMERA_NAME,
         "resolution": CAMERA_RESOLUTION_STR,
-        "fps": CAMERA_FPS
+        "fps": round(measured_fps, 1),
+        "nominal_fps": CAMERA_FPS,
+        "fourcc": CAMERA_FOURCC,
+        "capture_backend": CAPTURE_BACKEND_NAME,
+        "buffer_size": int(video_capture.get(cv2.CAP_PROP_BUFFERSIZE)),
+        "mjpeg_passthrough": mjpeg_passthrough,
+        "frame_transport": settings.FRAME_TRANSPORT,
+        "stream_clients": stream_clients,
+        "frame_seq": jpeg_channel.seq
     }
+    if frame_ring is not None:
+        status["shm_ring"] = frame_ring.name
+        status["shm_seq"] = frame_ring.head_seq()
     return status, 200
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Contadores e histogramas no formato texto do Prometheus."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def run_async_http(host, port):
+    """/video_feed, /health e /metrics num único event loop (HTTP_SERVER=asyncio)."""
+    from aiohttp import web
+    from shared.async_stream import AsyncFanout, run_async_app, serve_mjpeg, view_handler
+
+    fanout = AsyncFanout(jpeg_channel.wait_newer, name="video_feed", initial_seq=lambda: jpeg_channel.seq)
+
+    def on_connect():
+        global stream_clients
+        with clients_lock:
+            stream_clients += 1
+
+    def on_disconnect():
+        global stream_clients
+        with clients_lock:
+            stream_clients -= 1
+
+    def on_sent(size):
+        frames_streamed_total.inc()
+        bytes_streamed_total.inc(size)
+
+    async def video_feed_async(request):
+        return await serve_mjpeg(request, fanout, on_connect=on_connect, on_disconnect=on_disconnect,
+                                 on_sent=on_sent)
+
+    async_app = web.Application()
+    async_app.router.add_get('/video_feed', video_feed_async)
+    async_app.router.add_get('/health', view_handler(health))
+    async_app.router.add_get('/metrics', view_handler(metrics_endpoint))
+    run_async_app(async_app, host, port)
+
 if __name__ == '__main__':
     heartbeat_thread = threading.Thread(target=send_heartbeat, daemon=True)
     heartbeat_thread.start()
     print(f" [web] Thread de pulso de vida da Câmera ATIVADO.")
+
+    grab_thread = threading.Thread(target=grab_loop, daemon=True)
+    grab_thread.start()
+    print(f" [camera] Thread de captura ATIVADO.")
+    if USE_SHM:
+        print(f" [shm] Publicando frames no ring '{settings.SHM_FRAME_RING_NAME}'.")
     
     print(f" [web] Iniciando API da Câmera em http://0.0.0.0:5001")
-    print(f" [info] Câmera detectada: {CAMERA_RESOLUTION_STR} @ {CAMERA_FPS}fps")
-    app.run(host='0.0.0.0', port=5001, threaded=True)
\ No newline at end of file
+    print(f" [info] Câmera detectada: {CAMERA_RESOLUTION_STR} @ {CAMERA_FPS}fps nominais, "
+          f"formato {CAMERA_FOURCC}, backend {CAPTURE_BACKEND_NAME}")
+    if settings.HTTP_SERVER == "asyncio":
+        run_async_http('0.0.0.0', 5001)
+    else:
+        app.run(host='0.0.0.0', port=5001, threaded=True)
\ No newline at end of file
@@ -0,0 +1,90 @@
+# src/inference_service/bench_clip_recorder.py
+"""
+Benchmark do custo do gravador de clipes no loop de inferência: mede o
+tempo de record() (+ trigger() nos frames com decisão) por frame, com
+recortes do tamanho da ROI, enquanto o ClipWriter grava os clipes de
+verdade em segundo plano. O orçamento é < 1 ms por frame.
+
+Exemplo (rodar a partir da pasta clawai/):
+    python src/inference_service/bench_clip_recorder.py --frames 900 --fps 30 --decision-every 45
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+from config import settings
+from shared.clip_recorder import ClipRecorder, ClipWriter
+
+BUDGET_US = 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por frame do gravador de clipes (record + trigger)")
+    parser.add_argument("--frames", type=int, default=900)
+    parser.add_argument("--fps", type=float, default=30.0, help="Taxa simulada da câmera")
+    parser.add_argument("--decision-every", type=int, default=45, help="Uma decisão a cada N frames")
+    parser.add_argument("--camera", default="0", help="ROI de qual câmera usar para o tamanho do recorte")
+    parser.add_argument("--no-sleep", action="store_true",
+                        help="Não dorme entre frames: mede só o record(), mas o writer fica para trás e perde frames")
+    parser.add_argument("--max-disk-mb", type=int, default=50)
+    args = parser.parse_args()
+
+    roi = settings.CAMERA_ROIS.get(args.camera) or [0, 0, 640, 480]
+    full = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    x1, y1, x2, y2 = roi
+    # O recorte do loop real é uma view (não contígua) do frame inteiro
+    crop = full[y1:y2, x1:x2]
+
+    directory = tempfile.mkdtemp(prefix="clawai_clips_")
+    writer = ClipWriter(directory, args.max_disk_mb * 1024 * 1024)
+    writer.start()
+    recorder = ClipRecorder(args.camera, writer, pre_s=settings.CLIP_PRE_SECONDS,
+                            post_s=settings.CLIP_POST_SECONDS, max_fps=settings.CLIP_MAX_FPS)
+
+    timings = np.empty(args.frames)
+    trigger_timings = []
+    interval = 1.0 / args.fps
+    capture_ts = time.time()
+    for i in range(args.frames):
+        capture_ts += interval
+        start = time.perf_counter()
+        recorder.record(crop, capture_ts)
+        if i and i % args.decision_every == 0:
+            recorder.trigger({"track_id": i, "class": "bench", "confidence": 0.9, "decision": "E",
+                              "capture_ts": capture_ts}, capture_ts)
+            trigger_timings.append(time.perf_counter() - start)
+        timings[i] = time.perf_counter() - start
+        if not args.no_sleep:
+            time.sleep(interval)
+
+    # Espera o writer esvaziar a fila
+    deadline = time.time() + 30
+    while writer.stats()["queue_depth"] and time.time() < deadline:
+        time.sleep(0.1)
+    time.sleep(0.5)
+
+    us = timings[1:] * 1e6   # o primeiro frame aloca o anel
+    print(f" [bench] recorte {crop.shape[1]}x{crop.shape[0]}, {args.frames} frames a {args.fps:g} fps, "
+          f"anel de {recorder.slots} frames ({recorder.stats()['buffer_mb']} MB)")
+    print(f" [bench] por frame: p50 {np.percentile(us, 50):.1f}µs | p99 {np.percentile(us, 99):.1f}µs | "
+          f"máx {us.max():.1f}µs | média {us.mean():.1f}µs")
+    if trigger_timings:
+        trig = np.array(trigger_timings) * 1e6
+        print(f" [bench] frames com decisão: p50 {np.percentile(trig, 50):.1f}µs | máx {trig.max():.1f}µs")
+    print(f" [bench] clipes: {recorder.clips_triggered} disparados, {writer.clips_written} gravados, "
+          f"{writer.clips_evicted} apagados pelo limite de disco, {recorder.clips_dropped} descartados, "
+          f"{writer.frames_lost} frames perdidos | disco {writer.stats()['disk_mb']} MB")
+    verdict = "OK" if np.percentile(us, 99) < BUDGET_US else "ACIMA DO ORÇAMENTO"
+    print(f" [bench] p99 vs orçamento de {BUDGET_US:.0f}µs: {verdict}")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# src/inference_service/bench_postprocess.py
+"""
+Micro-benchmark do pós-processamento das caixas rastreadas: o loop antigo
+(caixa a caixa, um .cpu()/.tolist() por campo) contra a versão vetorizada
+(shared/track_postprocess.py), com 1 a 500 caixas sintéticas por frame.
+
+Exemplo (rodar a partir da pasta clawai/):
+    python src/inference_service/bench_postprocess.py --device cuda --sizes 1 10 50 100 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Boxes
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+from config import settings
+from shared.track_postprocess import (CLS, CONF, TRACK_ID, DecisionLookup, crossing_indices,
+                                      global_centers_x, pack_tracks, project_centers_x)
+from shared.track_registry import TrackRegistry
+
+NAMES = {0: "circulo", 1: "hexagono", 2: "quadrado", 3: "triangulo"}
+
+
+class SyntheticResult:
+    """Só o que o pós-processamento lê de um Results do ultralytics: .boxes."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def synthetic_result(n_boxes, crop_w, crop_h, device, rng):
+    x1 = rng.uniform(0, crop_w - 20, n_boxes)
+    y1 = rng.uniform(0, crop_h - 20, n_boxes)
+    data = np.stack([
+        x1, y1, x1 + 20, y1 + 20,
+        np.arange(1, n_boxes + 1),            # track_id
+        rng.uniform(0.6, 1.0, n_boxes),       # conf
+        rng.integers(0, len(NAMES), n_boxes),  # cls
+    ], axis=1).astype(np.float32)
+    return SyntheticResult(Boxes(torch.as_tensor(data, device=device), (crop_h, crop_w)))
+
+
+class LegacyTrack:
+    __slots__ = ("class_votes", "decided")
+
+    def __init__(self):
+        self.class_votes = {}
+        self.decided = False
+
+    def majority_class(self):
+        return max(self.class_votes.items(), key=lambda item: item[1])[0]
+
+
+class LegacyTrackRegistry:
+    """Cópia do essencial do registro antigo (dict track_id -> estado, uma chamada por caixa)."""
+
+    def __init__(self, **_):
+        self._tracks = {}
+
+    def update(self, track_id, frame_id, cls_id, conf, now):
+        track = self._tracks.get(track_id)
+        if track is None:
+            track = self._tracks[track_id] = LegacyTrack()
+        track.class_votes[cls_id] = track.class_votes.get(cls_id, 0.0) + conf
+        return track
+
+    def mark_decided(self, track_id, decision, now):
+        self._tracks[track_id].decided = True
+
+
+def legacy_postprocess(result, registry, frame_index, offset_x, decision_x, now):
+    """Cópia do loop antigo de process_lane_result (sem o envio das mensagens)."""
+    emitted = 0
+    detections = []
+    boxes = result.boxes.xyxy.cpu()
+    track_ids = result.boxes.id.int().cpu().tolist()
+    confs = result.boxes.conf.cpu().tolist()
+    clss = result.boxes.cls.int().cpu().tolist()
+    for box, track_id, conf, cls_id in zip(boxes, track_ids, confs, clss):
+        center_x_global = int((box[0] + box[2]) / 2 + offset_x)
+        class_name = NAMES[cls_id]
+        detections.append(f"ID {track_id}: {class_name}")
+        track = registry.update(track_id, frame_index, cls_id, conf, now)
+        if center_x_global > decision_x and not track.decided:
+            voted = NAMES[track.majority_class()]
+            decision = settings.DECISION_MAP.get(voted, "nenhuma")
+            registry.mark_decided(track_id, decision, now)
+            emitted += 1
+    return emitted
+
+
+def vectorized_postprocess(result, registry, frame_index, offset_x, decision_x, now, lookup):
+    """Mesmo caminho do process_lane_result atual (sem o envio das mensagens)."""
+    emitted = 0
+    packed = pack_tracks(result)
+    if len(packed):
+        track_ids = packed[:, TRACK_ID].astype(np.int64)
+        centers_x = global_centers_x(packed, offset_x)
+        registry.update_many(track_ids, frame_index, packed[:, CLS].astype(np.int64), packed[:, CONF],
+                             now, centers_x, now)
+        decided = registry.decided_mask(track_ids)
+        projected_x = project_centers_x(centers_x, registry.velocities(track_ids), settings.DECISION_LEAD_S)
+        for i in crossing_indices(projected_x, decision_x, decided):
+            track_id = int(track_ids[i])
+            voted = registry.get(track_id).majority_class()
+            registry.mark_decided(track_id, lookup.actions[voted], now)
+            emitted += 1
+    return emitted
+
+
+def bench(fn, registry_class, result, repeats, *args):
+    registry = registry_class(idle_frames=10 ** 9, idle_ttl_s=10 ** 9, max_tracks=10 ** 6)
+    timings = []
+    emitted = 0
+    for frame_index in range(repeats):
+        start = time.perf_counter()
+        emitted += fn(result, registry, frame_index, *args)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings = np.array(timings[1:])   # o primeiro frame cria os tracks
+    return float(np.median(timings)), float(np.percentile(timings, 95)), emitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark do pós-processamento (loop x vetorizado)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500])
+    parser.add_argument("--repeats", type=int, default=200, help="Frames por tamanho")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--camera", default="0", help="ROI/linha de decisão de qual câmera usar")
+    args = parser.parse_args()
+
+    roi = settings.CAMERA_ROIS.get(args.camera) or [0, 0, 640, 480]
+    crop_w, crop_h = roi[2] - roi[0], roi[3] - roi[1]
+    offset_x = roi[0]
+    decision_x = settings.CAMERA_DECISION_ZONES.get(args.camera, settings.ZONA_DE_DECISAO_X)
+    lookup = DecisionLookup(NAMES, settings.DECISION_MAP)
+    rng = np.random.default_rng(0)
+
+    print(f" [bench] device={args.device}, recorte {crop_w}x{crop_h}, linha X={decision_x}, "
+          f"{args.repeats} frames por tamanho (tempo por frame, µs)")
+    print(f"\n{'caixas':>7} {'loop p50':>10} {'loop p95':>10} {'vet. p50':>10} {'vet. p95':>10} {'ganho':>7}")
+    for n_boxes in args.sizes:
+        result = synthetic_result(n_boxes, crop_w, crop_h, args.device, rng)
+        legacy_p50, legacy_p95, legacy_emitted = bench(legacy_postprocess, LegacyTrackRegistry, result, args.repeats,
+                                                       offset_x, decision_x, 0.0)
+        vector_p50, vector_p95, vector_emitted = bench(vectorized_postprocess, TrackRegistry, result, args.repeats,
+                                                       offset_x, decision_x, 0.0, lookup)
+        # Os dois caminhos precisam decidir exatamente os mesmos objetos
+        assert legacy_emitted == vector_emitted, (legacy_emitted, vector_emitted)
+        print(f"{n_boxes:>7} {legacy_p50:>10.1f} {legacy_p95:>10.1f} {vector_p50:>10.1f} {vector_p95:>10.1f} "
+              f"{legacy_p50 / vector_p50:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# src/inference_service/loadtest_stream.py
+"""
+Teste de carga dos streams MJPEG (/video_feed e /video_feed_annotated):
+abre N clientes simultâneos, para N crescente, e mede por etapa o FPS
+recebido por cliente, a latência captura -> chegada (cabeçalho X-Timestamp
+de cada frame) e a CPU/threads do processo servidor.
+
+Só usa a biblioteca padrão (asyncio + sockets), então o cliente não vira
+o gargalo nem depende do modo do servidor. Para medir a CPU, informe o PID
+do servidor (no host: docker inspect -f '{{.State.Pid}}' ino-inference).
+
+Exemplos (rodar a partir da pasta clawai/):
+    python src/inference_service/loadtest_stream.py --url "http://localhost:5002/video_feed_annotated?fps=10" \
+        --clients 1 10 50 100 200 --duration 20 --pid 12345
+    python src/inference_service/loadtest_stream.py --url http://localhost:5001/video_feed --clients 1 25 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(project_root)
+from shared.proc_stats import process_cpu_seconds
+
+BOUNDARY = b"\r\n--frame"
+
+
+class ClientStats:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.latencies_ms = []
+        self.error = None
+
+
+async def run_client(host, port, path, stats, stop):
+    """Um cliente MJPEG: lê os frames até 'stop' e anota latência e volume."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        stats.error = str(e)
+        return
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    buffer = b""
+    try:
+        # Cabeçalhos HTTP da resposta
+        while b"\r\n\r\n" not in buffer:
+            chunk = await reader.read(65536)
+            if not chunk:
+                stats.error = "conexão fechada antes da resposta"
+                return
+            buffer += chunk
+        status_line = buffer.split(b"\r\n", 1)[0]
+        if b" 200 " not in status_line:
+            stats.error = status_line.decode(errors="replace")
+            return
+        buffer = buffer.split(b"\r\n\r\n", 1)[1]
+
+        while not stop.is_set():
+            chunk = await reader.read(262144)
+            if not chunk:
+                break
+            buffer += chunk
+            # Cada parte: --frame\r\n<cabeçalhos>\r\n\r\n<jpeg>\r\n
+            while True:
+                start = buffer.find(b"--frame\r\n")
+                if start < 0:
+                    break
+                header_end = buffer.find(b"\r\n\r\n", start)
+                if header_end < 0:
+                    break
+                headers = buffer[start:header_end].split(b"\r\n")
+                length = next((int(h.split(b":", 1)[1]) for h in headers
+                               if h.lower().startswith(b"content-length:")), None)
+                if length is not None:
+                    body_end = header_end + 4 + length
+                    if len(buffer) < body_end:
+                        break
+                else:
+                    # Sem Content-Length: o frame só termina na próxima fronteira
+                    body_end = buffer.find(BOUNDARY, header_end + 4)
+                    if body_end < 0:
+                        break
+                arrived = time.time()
+                stats.frames += 1
+                stats.bytes += body_end - header_end - 4
+                for header in headers:
+                    if header.lower().startswith(b"x-timestamp:"):
+                        stats.latencies_ms.append((arrived - float(header.split(b":", 1)[1])) * 1000)
+                buffer = buffer[body_end + 2:]
+    except (OSError, asyncio.IncompleteReadError) as e:
+        stats.error = str(e)
+    finally:
+        writer.close()
+
+
+async def run_step(host, port, path, n_clients, duration, ramp_s, pid):
+    stop = asyncio.Event()
+    clients = [ClientStats() for _ in range(n_clients)]
+    tasks = []
+    for stats in clients:
+        tasks.append(asyncio.create_task(run_client(host, port, path, stats, stop)))
+        if ramp_s:
+            await asyncio.sleep(ramp_s / n_clients)
+    # Descarta o começo (conexão e primeiro frame) e mede a janela estável
+    await asyncio.sleep(1.0)
+    for stats in clients:
+        stats.frames, stats.bytes, stats.latencies_ms = 0, 0, []
+    cpu_start = process_cpu_seconds(pid) if pid else None
+    window_start = time.monotonic()
+    await asyncio.sleep(duration)
+    window = time.monotonic() - window_start
+    cpu_end = process_cpu_seconds(pid) if pid else None
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    fps = np.array([c.frames / window for c in clients])
+    latencies = np.array([v for c in clients for v in c.latencies_ms])
+    errors = [c.error for c in clients if c.error]
+    return {
+        "clients": n_clients,
+        "connected": n_clients - len(errors),
+        "errors": errors[:5],
+        "fps_per_client_p50": round(float(np.median(fps)), 2),
+        "fps_per_client_min": round(float(fps.min()), 2),
+        "mbps_total": round(sum(c.bytes for c in clients) * 8 / window / 1e6, 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None,
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None,
+        "server_cpu_pct": round((cpu_end[0] - cpu_start[0]) / window * 100, 1) if pid else None,
+        "server_threads": cpu_end[1] if pid else None,
+    }
+
+
+async def main_async(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    path = url.path + (f"?{url.query}" if url.query else "")
+    print(f" [load] {args.url} | etapas {args.clients} clientes | {args.duration}s por etapa"
+          f"{f' | PID {args.pid}' if args.pid else ' | sem --pid: CPU do servidor não medida'}")
+    print(f"\n{'clientes':>8} {'ok':>5} {'fps p50':>8} {'fps min':>8} {'Mbps':>8} {'lat p50':>8} "
+          f"{'lat p95':>8} {'lat p99':>8} {'CPU %':>7} {'threads':>8}")
+    steps = []
+    for n_clients in args.clients:
+        step = await run_step(host, port, path, n_clients, args.duration, args.ramp, args.pid)
+        steps.append(step)
+        print(f"{step['clients']:>8} {step['connected']:>5} {step['fps_per_client_p50']:>8} "
+              f"{step['fps_per_client_min']:>8} {step['mbps_total']:>8} {str(step['latency_ms_p50']):>8} "
+              f"{str(step['latency_ms_p95']):>8} {str(step['latency_ms_p99']):>8} "
+              f"{str(step['server_cpu_pct']):>7} {str(step['server_threads']):>8}")
+        if step["errors"]:
+            print(f"          erros (amostra): {step['errors']}")
+        await asyncio.sleep(args.pause)
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga dos streams MJPEG")
+    parser.add_argument("--url", default="http://localhost:5002/video_feed_annotated")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=15.0, help="Segundos medidos por etapa")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Segundos para abrir todos os clientes da etapa")
+    parser.add_argument("--pause", type=float, default=2.0, help="Pausa entre etapas")
+    parser.add_argument("--pid", type=int, default=None, help="PID do servidor para medir CPU/threads")
+    parser.add_argument("--output", default=None, help="Salva o resultado em JSON")
+    args = parser.parse_args()
+
+    steps = asyncio.run(main_async(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "duration_s": args.duration, "steps": steps}, f, indent=2)
+        print(f"\n [load] Resultado salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 # src/inference_service/main.py
-import cv2
 import time
+# Antes de qualquer import: entra no tempo até ficar pronto. torch/ultralytics
+# só são importados na thread do modelo (e nas funções que os usam), então o
+# /health responde e o broker/stream conectam enquanto eles carregam.
+STARTED_AT = time.monotonic()
+import cv2
 import os
-import json
 import threading
-import pika
 import requests
 import numpy as np
-from flask import Flask, Response
-from ultralytics import YOLO
+from flask import Flask, Response, request
 from flask_cors import CORS
 
 # Adiciona o diretório raiz ao path para encontrar o 'config'
@@ -16,16 +17,33 @@ import sys
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.append(project_root)
 from config import settings
+from shared.frame_ring import SharedFrameRing
+from shared.detection_reporter import DetectionReporter
+from shared.decision_publisher import DecisionPublisher
+from shared.mjpeg_broadcaster import MjpegBroadcaster
+from shared.track_registry import TrackRegistry
+from shared.camera_lane import CameraLane
+from shared.inference_backend import load_model, save_fused_cache
+from shared.metrics import MetricsRegistry
+from shared.motion_gate import MotionGate
+from shared.camera_config import CameraConfigWatcher
+from shared.startup import StartupTracker
+from shared.clip_recorder import ClipRecorder, ClipWriter
+from shared.mjpeg_reader import TimestampedCapture
+from shared.decision_log import DecisionLatencyLog
+from shared.track_postprocess import (CLS, CONF, TRACK_ID, DecisionLookup, crossing_indices,
+                                      global_centers_x, pack_tracks, predict_arrival, project_centers_x)
+
+# --- Inicialização / Prontidão (/ready) ---
+startup = StartupTracker(STARTED_AT, settings.READY_LATENCY_FACTOR, settings.READY_LATENCY_BUDGET_MS)
+startup.mark("imports")
 
 # --- Variáveis Globais de Threads ---
-# Lock para o frame anotado (para o stream Flask)
-data_lock = threading.Lock()
-latest_annotated_frame = None
-
-# Lock para o frame bruto (lido do capture_service)
-frame_lock = threading.Lock()
-latest_raw_frame = None       # O frame mais recente do capture_service
-video_capture_client = None   # O objeto cv2.VideoCapture
+# Modelo carregado e aquecido em paralelo com a conexão ao stream e ao broker
+model_ready = threading.Event()
+loaded_model = None
+# Sinaliza ao loop de inferência que alguma câmera publicou frame novo
+new_frame_event = threading.Event()
 
 # --- Variáveis de Configuração ---
 MODEL_PATH = settings.MODEL_PATH
@@ -35,13 +53,66 @@ QUEUE_NAME = settings.RABBITMQ_QUEUE
 ZONA_DE_DECISAO_X = settings.ZONA_DE_DECISAO_X
 
 # --- Variáveis de Estado da IA ---
-latest_detections = []
-ids_ja_processados = set()
 avg_processing_time_ms = 0
+avg_inference_time_ms = 0   # Só a chamada do modelo (lote com todas as câmeras)
+avg_render_time_ms = 0      # Só o desenho do frame anotado (sob demanda)
+
+# --- Métricas (/metrics, formato Prometheus) ---
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "clawai_inference_stage_seconds",
+    "Tempo por etapa do loop de inferência (crop, record, inference, tracking, decision, render, total)")
+frame_latency_seconds = metrics.histogram(
+    "clawai_inference_frame_latency_seconds",
+    "Da captura do frame ao fim do processamento, por câmera")
+batch_size_frames = metrics.histogram(
+    "clawai_inference_batch_size", "Frames por chamada ao modelo", buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+decision_capture_to_confirm_seconds = metrics.histogram(
+    "clawai_decision_capture_to_confirm_seconds",
+    "Da captura do frame ao confirm do RabbitMQ para cada decisão, por fila")
+decision_enqueue_to_confirm_seconds = metrics.histogram(
+    "clawai_decision_enqueue_to_confirm_seconds",
+    "Do publish() no loop de inferência ao confirm do RabbitMQ, por fila")
+decision_latency_seconds = metrics.histogram(
+    "clawai_decision_capture_to_decision_seconds",
+    "Da captura do frame (X-Timestamp do capture_service) à decisão de cada peça, por câmera")
+decision_lead_seconds = metrics.histogram(
+    "clawai_decision_lead_seconds",
+    "Da decisão à chegada prevista da peça ao atuador, por câmera",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0))
+
+def on_decision_published(routing_key, enqueue_to_confirm_s, capture_to_confirm_s):
+    decision_enqueue_to_confirm_seconds.observe(enqueue_to_confirm_s, queue=routing_key)
+    if capture_to_confirm_s is not None:
+        decision_capture_to_confirm_seconds.observe(capture_to_confirm_s, queue=routing_key)
 
 NESTJS_HEARTBEAT_URL = os.getenv("NESTJS_HEARTBEAT_URL", "http://localhost:3001/stats/heartbeat")
 NESTJS_API_URL = os.getenv("NESTJS_API_URL", "http://localhost:3001/detections") # Se você usar essa var em enviar_deteccao_para_backend
-# --- Funções de Comunicação (Sem alteração) ---
+
+# Envio assíncrono/em lote das detecções (nunca bloqueia o loop de inferência)
+detection_reporter = DetectionReporter(
+    NESTJS_API_URL,
+    max_queue=settings.DETECTION_QUEUE_MAX,
+    batch_size=settings.DETECTION_BATCH_MAX,
+    journal_path=settings.DETECTION_JOURNAL_PATH,
+)
+
+# Publicador RabbitMQ com confirms, reconexão e outbox (dono da conexão pika)
+decision_publisher = DecisionPublisher(
+    RABBITMQ_HOST,
+    QUEUE_NAME,
+    outbox_path=settings.RABBITMQ_OUTBOX_PATH,
+    heartbeat=settings.RABBITMQ_HEARTBEAT_S,
+    extra_queues=settings.CAMERA_QUEUES.values(),
+    on_published=on_decision_published,
+)
+# Clipes pré/pós-evento das peças decididas (gravados fora do loop de inferência)
+clip_writer = ClipWriter(settings.CLIP_DIR, settings.CLIP_MAX_DISK_MB * 1024 * 1024) \
+    if settings.CLIP_RECORDER_ENABLED else None
+# Uma linha por peça decidida: captura, decisão, velocidade e chegada prevista ao atuador
+decision_log = DecisionLatencyLog(settings.DECISION_LATENCY_LOG_PATH,
+                                  max_bytes=settings.DECISION_LATENCY_LOG_MAX_MB * 1024 * 1024)
+# --- Funções de Comunicação ---
 
 def enviar_deteccao_para_backend(dados_deteccao):
     try:
@@ -72,40 +143,250 @@ def enviar_deteccao_para_backend(dados_deteccao):
         print(f" [web] DEBUG PAYLOAD: Type='{class_name}' -> Cat='{categoria_detectada}'")
         # ------------------------------
 
-        print(f" [web] Enviando para NestJS: {dto_para_nest}")
-        response = requests.post(NESTJS_API_URL, json=dto_para_nest, timeout=2)
-        
-        if response.status_code == 201:
-            print(f" [web] SUCESSO: Detecção enviada para NestJS: {dto_para_nest['type']}")
-        else:
-            print(f" [web] FALHA: Erro ao enviar para NestJS: {response.status_code} {response.text}")
+        print(f" [web] Enfileirando para NestJS: {dto_para_nest}")
+        if not detection_reporter.submit(dto_para_nest):
+            print(f" [web] FALHA: Fila de detecções cheia, descartando: {dto_para_nest['type']}")
 
-    except requests.exceptions.RequestException as e:
-        print(f" [web] ERRO DE REDE: Não foi possível conectar com a API NestJS: {e}")
     except Exception as e:
         print(f" [web] ERRO INESPERADO: Falha ao enviar detecção: {e}")
 
-def publicar_decisao(channel, mensagem_json):
+def publicar_decisao(mensagem_hardware, routing_key=None, capture_ts=None):
+    """Só enfileira: a confirmação do broker acontece na thread do publicador."""
+    if not decision_publisher.publish(mensagem_hardware, routing_key, origin_ts=capture_ts):
+        print(f" [mq] Fila do publicador cheia, decisão enviada ao outbox: {mensagem_hardware}")
+
+# --- Visualização (sob demanda) ---
+def render_annotated_frame(job):
+    """
+    Desenha o frame anotado a partir de (frame, resultado, roi).
+    Roda na thread de quem assiste ao stream, uma vez por frame exibido,
+    nunca no loop de inferência.
+    """
+    global avg_render_time_ms
+    start = time.perf_counter()
+    frame, result, roi = job
+
+    # O plot() desenha as caixas na imagem que foi processada (o recorte).
+    # Frames barrados pelo portão de movimento não têm resultado: vai o recorte cru.
+    annotated_crop = result.plot() if result is not None else None
+
+    # Se usamos ROI, precisamos "colar" o recorte desenhado de volta na imagem original
+    if roi:
+        x1, y1, x2, y2 = roi
+        annotated_final_frame = frame.copy()
+        if annotated_crop is not None:
+            annotated_final_frame[y1:y2, x1:x2] = annotated_crop
+        # (Opcional) Desenha um retângulo branco para mostrar onde é a ROI
+        cv2.rectangle(annotated_final_frame, (x1, y1), (x2, y2), (255, 255, 255), 1)
+    else:
+        annotated_final_frame = annotated_crop if annotated_crop is not None else frame
+
+    render_s = time.perf_counter() - start
+    stage_seconds.observe(render_s, stage="render")
+    render_ms = render_s * 1000
+    avg_render_time_ms = render_ms if not avg_render_time_ms else 0.9 * avg_render_time_ms + 0.1 * render_ms
+    return annotated_final_frame
+
+# --- Câmeras (esteiras) ---
+# ROI/linha de decisão calibradas pelo roiSetup.py (config/cameras.json), relidas a quente
+camera_config_watcher = CameraConfigWatcher(settings.CAMERA_CONFIG_PATH, settings.CAMERA_CONFIG_POLL_S)
+camera_config = camera_config_watcher.poll() or {}
+
+def create_lane(camera_id, source_url):
+    """Monta o estado de uma câmera a partir do config/settings.py (e do config/cameras.json)."""
+    ring_name = settings.SHM_FRAME_RING_NAME if camera_id == '0' else f"{settings.SHM_FRAME_RING_NAME}_{camera_id}"
+    calibrated = camera_config.get("cameras", {}).get(camera_id, {})
+    return CameraLane(
+        camera_id,
+        source_url,
+        roi=calibrated.get("roi", settings.CAMERA_ROIS.get(camera_id)),
+        decision_x=calibrated.get("decision_x", settings.CAMERA_DECISION_ZONES.get(camera_id, ZONA_DE_DECISAO_X)),
+        actuator_x=calibrated.get("actuator_x", settings.CAMERA_ACTUATOR_X.get(camera_id, settings.ACTUATOR_X)) or None,
+        routing_key=settings.CAMERA_QUEUES.get(camera_id, QUEUE_NAME),
+        shm_ring_name=ring_name,
+        # Estado por track_id (votos de classe, decisão emitida), com expiração
+        track_registry=TrackRegistry(
+            idle_ttl_s=settings.TRACK_IDLE_TTL_S,
+            idle_frames=settings.TRACK_IDLE_FRAMES,
+            max_tracks=settings.TRACK_REGISTRY_MAX,
+            velocity_alpha=settings.TRACK_VELOCITY_ALPHA,
+            velocity_min_samples=settings.TRACK_VELOCITY_MIN_SAMPLES,
+        ),
+        # Frame anotado: desenhado e codificado em JPEG só quando alguém está assistindo
+        broadcaster=MjpegBroadcaster(render=render_annotated_frame),
+        # Esteira vazia: pula o modelo enquanto nada se mexe na ROI
+        motion_gate=MotionGate(
+            downscale_width=settings.MOTION_DOWNSCALE_WIDTH,
+            pixel_threshold=settings.MOTION_PIXEL_THRESHOLD,
+            min_area=settings.MOTION_MIN_AREA,
+            bg_alpha=settings.MOTION_BG_ALPHA,
+            hold_frames=settings.MOTION_HOLD_FRAMES,
+            force_every=settings.MOTION_FORCE_EVERY,
+        ) if settings.MOTION_GATE_ENABLED else None,
+        # Últimos segundos de recortes da ROI, para o clipe de cada decisão
+        clip_recorder=ClipRecorder(
+            camera_id,
+            clip_writer,
+            pre_s=settings.CLIP_PRE_SECONDS,
+            post_s=settings.CLIP_POST_SECONDS,
+            max_fps=settings.CLIP_MAX_FPS,
+        ) if clip_writer is not None else None,
+    )
+
+lanes = [create_lane(camera_id, url) for camera_id, url in settings.CAPTURE_SOURCES.items()]
+lanes_by_id = {lane.camera_id: lane for lane in lanes}
+
+# Contadores que já existem nos objetos são lidos na hora do scrape
+def per_lane(fn):
+    return lambda: [({"camera": lane.camera_id}, fn(lane)) for lane in lanes]
+
+metrics.collector("clawai_inference_frames_read_total", "Frames recebidos da captura",
+                  per_lane(lambda lane: lane.frames.seq), "counter")
+metrics.collector("clawai_inference_frames_processed_total", "Frames que passaram pelo modelo",
+                  per_lane(lambda lane: lane.frames_processed), "counter")
+metrics.collector("clawai_inference_frames_dropped_total", "Frames substituídos antes de serem processados",
+                  per_lane(lambda lane: lane.frames_dropped), "counter")
+metrics.collector("clawai_inference_fps", "Frames processados por segundo (medido)",
+                  per_lane(lambda lane: round(lane.fps, 2)))
+metrics.collector("clawai_inference_frames_gated_total", "Frames em que o portão de movimento pulou o modelo",
+                  per_lane(lambda lane: lane.motion_gate.frames_gated if lane.motion_gate else 0), "counter")
+metrics.collector("clawai_inference_frames_inferred_total", "Frames liberados pelo portão de movimento para o modelo",
+                  per_lane(lambda lane: lane.motion_gate.frames_inferred if lane.motion_gate else lane.frames_processed),
+                  "counter")
+metrics.collector("clawai_tracks_active", "Tracks no registro",
+                  per_lane(lambda lane: len(lane.track_registry)))
+metrics.collector("clawai_tracks_evicted_total", "Tracks removidas do registro",
+                  per_lane(lambda lane: lane.track_registry.evicted), "counter")
+metrics.collector("clawai_decisions_total", "Objetos que cruzaram a linha de decisão",
+                  per_lane(lambda lane: lane.track_registry.decisions), "counter")
+metrics.collector("clawai_annotated_stream_clients", "Clientes assistindo ao stream anotado",
+                  per_lane(lambda lane: lane.broadcaster.subscribers))
+metrics.collector("clawai_annotated_stream_frames_encoded_total", "Frames anotados codificados em JPEG",
+                  per_lane(lambda lane: lane.broadcaster.frames_encoded), "counter")
+metrics.collector("clawai_annotated_stream_bytes_total", "Bytes enviados no stream anotado",
+                  per_lane(lambda lane: lane.broadcaster.bytes_sent), "counter")
+
+metrics.collector("clawai_clips_triggered_total", "Clipes pré/pós-evento disparados por decisões",
+                  per_lane(lambda lane: lane.clip_recorder.clips_triggered if lane.clip_recorder else 0), "counter")
+metrics.collector("clawai_clips_written_total", "Clipes gravados em disco",
+                  lambda: clip_writer.clips_written if clip_writer else 0, "counter")
+metrics.collector("clawai_clips_disk_bytes", "Espaço ocupado pelos clipes",
+                  lambda: clip_writer.disk_bytes if clip_writer else 0)
+
+metrics.collector("clawai_rabbitmq_connected", "1 se o publicador está conectado ao RabbitMQ",
+                  lambda: int(decision_publisher.connected))
+metrics.collector("clawai_rabbitmq_queue_depth", "Decisões aguardando publicação em memória",
+                  lambda: decision_publisher.stats()["queue_depth"])
+metrics.collector("clawai_rabbitmq_published_total", "Decisões confirmadas pelo broker",
+                  lambda: decision_publisher.published, "counter")
+metrics.collector("clawai_rabbitmq_outboxed_total", "Decisões gravadas no outbox em disco",
+                  lambda: decision_publisher.outboxed, "counter")
+metrics.collector("clawai_rabbitmq_dropped_total", "Decisões perdidas",
+                  lambda: decision_publisher.dropped, "counter")
+metrics.collector("clawai_rabbitmq_reconnects_total", "Reconexões ao RabbitMQ",
+                  lambda: decision_publisher.reconnects, "counter")
+
+metrics.collector("clawai_backend_queue_depth", "Detecções aguardando envio ao NestJS",
+                  lambda: detection_reporter.stats()["queue_depth"])
+metrics.collector("clawai_backend_sent_total", "Detecções entregues ao NestJS",
+                  lambda: detection_reporter.sent, "counter")
+metrics.collector("clawai_backend_dropped_total", "Detecções descartadas (fila cheia, journal cheio ou recusadas)",
+                  lambda: detection_reporter.dropped, "counter")
+metrics.collector("clawai_backend_journaled_total", "Detecções gravadas no journal em disco",
+                  lambda: detection_reporter.journaled, "counter")
+metrics.collector("clawai_backend_failed_posts_total", "POSTs ao NestJS que falharam",
+                  lambda: detection_reporter.failed_posts, "counter")
+metrics.collector("clawai_backend_rejected_total", "Detecções recusadas pelo NestJS (4xx) e descartadas",
+                  lambda: detection_reporter.rejected, "counter")
+
+def create_tracker():
+    """Um tracker independente por câmera (mesma config que o model.track usaria)."""
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
     try:
-        channel.basic_publish(
-            exchange='',
-            routing_key=QUEUE_NAME,
-            body=mensagem_json,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
-        print(f" [mq] Publicado: {mensagem_json}")
-    except Exception as e:
-        print(f" [mq] Erro ao publicar: {e}")
+        from ultralytics.utils import YAML
+        yaml_load = YAML.load
+    except ImportError:  # versões antigas do ultralytics
+        from ultralytics.utils import yaml_load
+
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(settings.TRACKER_CONFIG)))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg)
+
+def update_tracker(tracker, result):
+    """Associa as detecções do lote ao tracker da câmera (equivale ao persist=True do model.track)."""
+    import torch
+
+    det = result.boxes.cpu().numpy()
+    tracks = tracker.update(det, result.orig_img)
+    if len(tracks) == 0:
+        return result
+    idx = tracks[:, -1].astype(int)
+    result = result[idx]
+    result.update(boxes=torch.as_tensor(tracks[:, :-1], device=result.boxes.data.device))
+    return result
+
+def apply_camera_config(config, trackers):
+    """Aplica ROI/linha de decisão novas entre dois frames (sem reiniciar nem recarregar o modelo)."""
+    for camera_id, calibrated in config.get("cameras", {}).items():
+        lane = lanes_by_id.get(camera_id)
+        if lane is None:
+            continue
+        roi = calibrated.get("roi", lane.roi)
+        decision_x = calibrated.get("decision_x", lane.decision_x)
+        actuator_x = calibrated.get("actuator_x", lane.actuator_x)
+        if actuator_x != lane.actuator_x:
+            print(f" [config] Câmera {camera_id}: atuador X {lane.actuator_x} -> {actuator_x}")
+            lane.actuator_x = actuator_x
+        if roi == lane.roi and decision_x == lane.decision_x:
+            continue
+        print(f" [config] Câmera {camera_id}: ROI {lane.roi} -> {roi}, linha de decisão {lane.decision_x} -> {decision_x} "
+              f"(revisão {config.get('revision')})")
+        if roi != lane.roi:
+            # As coordenadas do recorte mudaram: os tracks antigos não valem mais. O tracker
+            # novo recomeça os IDs em 1, então o registro (decisões, votos, velocidades)
+            # e os clipes pendentes da câmera também recomeçam.
+            trackers[camera_id] = create_tracker()
+            lane.track_registry.reset()
+            if lane.clip_recorder is not None:
+                lane.clip_recorder.reset()
+        elif decision_x != lane.decision_x:
+            lane.track_registry.reset_velocity()
+        lane.roi = roi
+        lane.decision_x = decision_x
+
+def tracker_is_active(tracker):
+    """True enquanto o tracker acompanha algum objeto (não perdido) na ROI."""
+    return len(getattr(tracker, "tracked_stracks", ())) > 0
+
+def skip_lane_frame(lane, tracker, frame, capture_ts, crop, roi_clamped, now=None):
+    """
+    Frame barrado pelo portão de movimento: o tracker recebe uma atualização
+    vazia (os tracks perdidos continuam envelhecendo) e o registro expira
+    o que saiu, sem chamar o modelo.
+    """
+    from ultralytics.engine.results import Boxes
+
+    now = time.time() if now is None else now
+    tracker.update(Boxes(np.empty((0, 6), dtype=np.float32), crop.shape[:2]), crop)
+    lane.track_registry.evict(lane.frames_processed, now)
+    if lane.broadcaster.subscribers > 0:
+        lane.broadcaster.publish((frame, None, roi_clamped), capture_ts)
+    lane.mark_processed(capture_ts, [])
 
 def send_heartbeat():
-    global avg_processing_time_ms
     while True:
         try:
             payload = {
                 "service": "ai",
                 "status": "online",
-                "modelName": os.path.basename(MODEL_PATH),
-                "processingTimeMs": int(avg_processing_time_ms)
+                "modelName": f"{os.path.basename(MODEL_PATH)} ({settings.INFERENCE_BACKEND})",
+                # Percentis reais das últimas rodadas (não mais média móvel)
+                "processingTimeMs": int(stage_seconds.percentile(50, stage="total") * 1000),
+                "processingTimeP95Ms": int(stage_seconds.percentile(95, stage="total") * 1000),
+                "processingTimeP99Ms": int(stage_seconds.percentile(99, stage="total") * 1000),
+                "inferenceTimeP50Ms": int(stage_seconds.percentile(50, stage="inference") * 1000),
+                "inferenceTimeP95Ms": int(stage_seconds.percentile(95, stage="inference") * 1000),
             }
             requests.post(NESTJS_HEARTBEAT_URL, json=payload, timeout=2)
             print(" [web] Pulso de vida da IA enviado para NestJS.")
@@ -115,199 +396,395 @@ def send_heartbeat():
         time.sleep(10)
 
 # --- THREAD 1: O LEITOR DE FRAMES (MELHORADO!) ---
-def frame_reader_loop():
+def shm_reader_loop(lane):
+    """
+    Variante do leitor para FRAME_TRANSPORT=shm: anexa ao ring buffer
+    publicado pelo capture_service e copia o frame BGR cru mais recente,
+    sem JPEG nem HTTP no caminho.
+    """
+    ring_name = lane.shm_ring_name
+    tag = f" [capture:{lane.camera_id}]"
+    print(f"{tag} Anexando ao ring de memória compartilhada: {ring_name}")
+
+    ring = None
+    last_seq = 0
+    last_frame_time = time.time()
+    frames_read = 0
+    while True:
+        try:
+            if ring is None:
+                ring = SharedFrameRing.attach(ring_name)
+                last_seq = 0
+                last_frame_time = time.time()
+                print(f"{tag} ✓ Ring anexado: {ring.width}x{ring.height}, {ring.slots} slots")
+
+            latest = ring.read_latest(last_seq)
+            if latest is None:
+                # Se o produtor reiniciar, ele recria o segmento e o nosso
+                # mapeamento antigo para de avançar: reanexa.
+                if time.time() - last_frame_time > 3:
+                    raise TimeoutError("nenhum frame novo há 3s")
+                time.sleep(0.002)
+                continue
+
+            last_seq, capture_ts, frame = latest
+            last_frame_time = time.time()
+            frames_read += 1
+            # read_latest() já devolve uma cópia própria do slot
+            lane.frames.publish(frame, capture_ts)
+            new_frame_event.set()
+
+            if frames_read % 100 == 0:  # Log a cada 100 frames
+                print(f"{tag} ✓ {frames_read} frames lidos do ring (seq={last_seq})")
+
+        except FileNotFoundError:
+            print(f"{tag} ✗ Ring '{ring_name}' ainda não existe. Tentando novamente em 2s...")
+            time.sleep(2)
+        except Exception as e:
+            print(f"{tag} ⚠ Reanexando ao ring: {e}")
+            if ring is not None:
+                ring.close()
+                ring = None
+            time.sleep(1)
+
+def frame_reader_loop(lane):
     """
-    Thread dedicado a ler o stream de vídeo.
-    Sua única função é ler da rede e atualizar 'latest_raw_frame'.
+    Thread dedicado a ler o stream de vídeo de UMA câmera.
+    Sua única função é ler da rede e publicar em 'lane.frames'.
     Isso evita o erro 'Expected boundary' por ler rápido o suficiente.
     """
-    global latest_raw_frame, video_capture_client
-    print(f" [capture] Conectando ao stream de vídeo: {VIDEO_STREAM_URL}")
+    if settings.FRAME_TRANSPORT == "shm":
+        return shm_reader_loop(lane)
+
+    stream_url = lane.source_url
+    tag = f" [capture:{lane.camera_id}]"
+    print(f"{tag} Conectando ao stream de vídeo: {stream_url}")
     
     # Tenta conectar
     retry_count = 0
     while True:
         try:
-            video_capture_client = cv2.VideoCapture(VIDEO_STREAM_URL)
+            video_capture_client = TimestampedCapture(stream_url)
             if video_capture_client.isOpened():
-                print(f" [capture] ✓ Conexão de vídeo estabelecida com sucesso!")
-                print(f" [capture] Propriedades: Width={video_capture_client.get(cv2.CAP_PROP_FRAME_WIDTH)}, "
-                      f"Height={video_capture_client.get(cv2.CAP_PROP_FRAME_HEIGHT)}")
+                print(f"{tag} ✓ Conexão de vídeo estabelecida com sucesso!")
+                if not video_capture_client.http:
+                    print(f"{tag} Propriedades: Width={video_capture_client.get(cv2.CAP_PROP_FRAME_WIDTH)}, "
+                          f"Height={video_capture_client.get(cv2.CAP_PROP_FRAME_HEIGHT)}")
                 retry_count = 0
                 break
             else:
                 retry_count += 1
-                print(f" [capture] ✗ Falha ao conectar (tentativa {retry_count}). Verificando URL: {VIDEO_STREAM_URL}")
+                print(f"{tag} ✗ Falha ao conectar (tentativa {retry_count}). Verificando URL: {stream_url}")
         except Exception as e:
             retry_count += 1
-            print(f" [capture] ✗ Erro ao conectar: {e} (tentativa {retry_count})")
+            print(f"{tag} ✗ Erro ao conectar: {e} (tentativa {retry_count})")
         
-        print(f" [capture] Tentando novamente em 5s...")
+        print(f"{tag} Tentando novamente em 5s...")
         time.sleep(5)
 
     frames_read = 0
     while True:
         try:
-            success, frame = video_capture_client.read()
+            # capture_ts: instante da captura no capture_service (X-Timestamp), não da chegada
+            success, frame, capture_ts = video_capture_client.read()
             if not success:
-                print(" [capture] ⚠ Perda de stream. Tentando reconectar...")
+                print(f"{tag} ⚠ Perda de stream. Tentando reconectar...")
                 video_capture_client.release()
                 time.sleep(2) # Espera um pouco
                 
                 # Tenta reabrir a conexão
-                video_capture_client = cv2.VideoCapture(VIDEO_STREAM_URL)
+                video_capture_client = TimestampedCapture(stream_url)
                 if not video_capture_client.isOpened():
-                    print(" [capture] ✗ Reconexão falhou. Tentando novamente em 5s...")
+                    print(f"{tag} ✗ Reconexão falhou. Tentando novamente em 5s...")
                     time.sleep(5)
                 else:
-                    print(" [capture] ✓ Reconexão bem-sucedida!")
+                    print(f"{tag} ✓ Reconexão bem-sucedida!")
                 continue
             
             # Se teve sucesso, armazena o frame mais recente
             frames_read += 1
-            with frame_lock:
-                latest_raw_frame = frame.copy()
+            # read() aloca um array novo a cada chamada: não é preciso copiar
+            lane.frames.publish(frame, capture_ts)
+            new_frame_event.set()
             
             if frames_read % 100 == 0:  # Log a cada 100 frames
-                print(f" [capture] ✓ {frames_read} frames lidos com sucesso")
+                print(f"{tag} ✓ {frames_read} frames lidos com sucesso")
                 
         except Exception as e:
-            print(f" [capture] ✗ Erro ao ler frame: {e}")
+            print(f"{tag} ✗ Erro ao ler frame: {e}")
             time.sleep(1)
 
 # --- THREAD 2: O LOOP DE INFERÊNCIA (MODIFICADO) ---
+def process_lane_result(lane, result, offset_x, lookup, now, capture_ts=None):
+    """
+    Zona de decisão de uma câmera: atualiza o registro de tracks e publica
+    a decisão de cada objeto que cruzou a linha pela primeira vez.
+    As contas por caixa são vetorizadas (uma cópia device -> host por frame);
+    só os objetos que cruzaram a linha agora passam pelo loop em Python.
+
+    Com a velocidade de cada track, a posição comparada à linha é a
+    projetada para "agora" (o frame foi capturado há now - capture_ts)
+    mais DECISION_LEAD_S, e a decisão leva o instante de captura e a
+    chegada prevista ao atuador.
+    Retorna o array (N, 7) das caixas rastreadas do frame (para o /health).
+    """
+    track_registry = lane.track_registry
+    frame_index = lane.frames_processed
+    frame_ts = capture_ts if capture_ts is not None else now
+
+    packed = pack_tracks(result)
+    if len(packed):
+        track_ids = packed[:, TRACK_ID].astype(np.int64)
+        # As caixas são relativas ao RECORTE: o centro é levado para a tela CHEIA (offset da ROI)
+        centers_x = global_centers_x(packed, offset_x)
+        track_registry.update_many(track_ids, frame_index, packed[:, CLS].astype(np.int64), packed[:, CONF],
+                                   now, centers_x, frame_ts)
+
+        # Posição projetada comparada à linha de decisão, tudo de uma vez
+        decided = track_registry.decided_mask(track_ids)
+        velocities = track_registry.velocities(track_ids)
+        horizon_s = settings.DECISION_LEAD_S + (now - frame_ts if settings.DECISION_COMPENSATE_LATENCY else 0.0)
+        projected_x = project_centers_x(centers_x, velocities, horizon_s)
+        for i in crossing_indices(projected_x, lane.decision_x, decided):
+            track_id = int(track_ids[i])
+            track = track_registry.get(track_id)
+            # Decide pela classe mais votada durante toda a vida do track,
+            # não só pelo frame em que ele cruzou a linha
+            voted_cls = track.majority_class()
+            class_name = lookup.names[voted_cls]
+            velocity = float(velocities[i])
+            decided_ts = now
+            latency_ms = (decided_ts - frame_ts) * 1000
+            predicted_arrival_ts = predict_arrival(frame_ts, float(centers_x[i]), velocity, lane.actuator_x)
+            print(f" [ia:{lane.camera_id}] Objeto ID {track_id} ({class_name}) cruzou zona (X={int(centers_x[i])}"
+                  f"{f' -> {int(projected_x[i])} projetado' if projected_x[i] != centers_x[i] else ''}, "
+                  f"{frame_index - track.first_frame + 1} frames observados, captura -> decisão {latency_ms:.0f}ms).")
+
+            mensagem_web = {
+                "track_id": track_id,
+                "objeto_detectado": class_name,
+                "confidence": track.class_confidence(voted_cls)
+            }
+            enviar_deteccao_para_backend(mensagem_web)
+
+            decisao_hardware = lookup.actions[voted_cls]
+            if lookup.has_action[voted_cls]:
+                mensagem_hardware = {
+                    "track_id": track_id,
+                    "camera_id": lane.camera_id,
+                    "objeto_detectado": class_name,
+                    "decisao_direcao": decisao_hardware,
+                    "timestamp": decided_ts,
+                    # Instante de captura do frame no capture_service (não o da publicação)
+                    "capture_ts": frame_ts,
+                    "velocity_px_s": round(velocity, 1) if np.isfinite(velocity) else None,
+                    # Chegada prevista ao atuador (time.time()); None sem velocidade ou sem ACTUATOR_X
+                    "predicted_arrival_ts": predicted_arrival_ts,
+                }
+                publicar_decisao(mensagem_hardware, lane.routing_key, capture_ts)
+
+            decision_latency_seconds.observe(decided_ts - frame_ts, camera=lane.camera_id)
+            if predicted_arrival_ts is not None:
+                decision_lead_seconds.observe(max(0.0, predicted_arrival_ts - decided_ts), camera=lane.camera_id)
+            decision_log.write({
+                "camera_id": lane.camera_id,
+                "track_id": track_id,
+                "class": class_name,
+                "decision": decisao_hardware,
+                "capture_ts": frame_ts,
+                "decided_ts": decided_ts,
+                "capture_to_decision_ms": round(latency_ms, 1),
+                "center_x": round(float(centers_x[i]), 1),
+                "projected_x": round(float(projected_x[i]), 1),
+                "decision_x": lane.decision_x,
+                "actuator_x": lane.actuator_x,
+                "velocity_px_s": round(velocity, 1) if np.isfinite(velocity) else None,
+                "predicted_arrival_ts": predicted_arrival_ts,
+                "frames_observed": frame_index - track.first_frame + 1,
+            })
+
+            if lane.clip_recorder is not None:
+                # Só anota o evento: o clipe é montado e gravado pela thread do ClipWriter
+                lane.clip_recorder.trigger({
+                    "track_id": track_id,
+                    "class": class_name,
+                    "confidence": mensagem_web["confidence"],
+                    "decision": decisao_hardware,
+                    "capture_ts": frame_ts,
+                    "box": [round(float(v), 1) for v in packed[i, :4]],
+                    "frames_observed": frame_index - track.first_frame + 1,
+                }, frame_ts)
+
+            track_registry.mark_decided(track_id, decisao_hardware, now)
+
+    # Esquece tracks que saíram da ROI ou ficaram ociosas além do TTL
+    track_registry.evict(frame_index, now)
+    return packed
+
+def warm_up_model(model, iterations=settings.WARMUP_ITERATIONS):
+    """
+    Roda o modelo num lote falso com o formato real (um recorte do tamanho
+    da ROI por câmera): a inicialização preguiçosa (fusão Conv+BN, CUDA,
+    alocações do runtime) acontece aqui e não no primeiro frame real.
+    Retorna a latência estável medida (ms).
+    """
+    rng = np.random.default_rng(0)
+    crops = []
+    for lane in lanes:
+        x1, y1, x2, y2 = lane.roi or (0, 0, 640, 480)
+        crops.append(rng.integers(0, 256, (y2 - y1, x2 - x1, 3), dtype=np.uint8))
+    timings = []
+    for _ in range(max(iterations, 2)):
+        start = time.perf_counter()
+        model.predict(crops, conf=settings.CONFIDENCE_THRESHOLD, imgsz=settings.INFERENCE_IMGSZ, verbose=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    # A primeira rodada paga a inicialização; a latência estável vem das últimas
+    steady_ms = float(np.median(timings[len(timings) // 2:]))
+    print(f" [ia] Aquecimento: 1ª inferência {timings[0]:.0f}ms, estável {steady_ms:.1f}ms "
+          f"({len(crops)} recorte(s), imgsz={settings.INFERENCE_IMGSZ})")
+    return steady_ms
+
+def load_and_warm_model():
+    """
+    Thread de inicialização: carrega, aquece e guarda o modelo fundido no cache.
+    Se o carregamento ou o aquecimento falhar, o erro vai para o /ready e o
+    /health e o processo sai (código 1) para o orquestrador reiniciá-lo, em
+    vez de o loop de inferência esperar o modelo para sempre.
+    """
+    global loaded_model
+    stage = "ml_imports"
+    try:
+        # Os imports pesados rodam aqui, em paralelo com a conexão ao stream e ao broker
+        import torch
+        import ultralytics
+        startup.mark("ml_imports")
+        stage = "model_load"
+        model = load_model(settings.INFERENCE_BACKEND, MODEL_PATH, settings.INFERENCE_INT8,
+                           cache_dir=settings.MODEL_CACHE_DIR)
+        startup.mark("model_loaded")
+        stage = "warmup"
+        steady_ms = warm_up_model(model)
+    except Exception as e:
+        startup.failed(stage, e)
+        # Tempo para um scrape do /ready ou /health ver o erro antes de sair
+        time.sleep(settings.STARTUP_FAILURE_EXIT_DELAY_S)
+        os._exit(1)
+    startup.warmed_up(steady_ms)
+    loaded_model = model
+    model_ready.set()
+    if settings.INFERENCE_BACKEND == "torch" and settings.MODEL_CACHE_DIR:
+        try:
+            cached = save_fused_cache(model, MODEL_PATH, settings.MODEL_CACHE_DIR)
+            if cached:
+                print(f" [ia] Modelo fundido salvo no cache: {cached}")
+        except Exception as e:
+            print(f" [ia] ⚠ Não foi possível gravar o cache do modelo: {e}")
+
 def inference_tracking_loop():
     """
     Thread dedicado a rodar a IA com suporte a ROI (Região de Interesse).
+    A cada rodada, os recortes de todas as câmeras com frame novo passam
+    pelo modelo numa única chamada em lote; o tracking é por câmera.
     """
-    global latest_annotated_frame, latest_detections, ids_ja_processados, avg_processing_time_ms
+    global avg_processing_time_ms, avg_inference_time_ms
 
-    try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
-        channel = connection.channel()
-        channel.queue_declare(queue=QUEUE_NAME, durable=True)
-        print(f" [mq] Conectado ao RabbitMQ em {RABBITMQ_HOST}")
-    except Exception as e:
-        print(f" [mq] Erro fatal: Não foi possível conectar ao RabbitMQ: {e}")
-        return
+    model_ready.wait()
+    model = loaded_model
+    trackers = {lane.camera_id: create_tracker() for lane in lanes}
+    # cls_id -> nome / decisão de hardware, calculado uma vez
+    lookup = DecisionLookup(model.names, settings.DECISION_MAP)
 
-    model = YOLO(MODEL_PATH)
-    
-    # Tenta carregar o ROI da configuração (assumindo câmera '0' por padrão)
-    # Se quiser dinâmico, pode vir de uma var de ambiente
-    roi_coords = settings.CAMERA_ROIS.get('0') 
-    
-    print(" [ia] Loop de inferência aguardando o primeiro frame...")
-    
-    processing_times = []
-    frames_processed = 0
+    print(f" [ia] Loop de inferência aguardando o primeiro frame ({len(lanes)} câmera(s))...")
+
+    ticks = 0
 
     while True:
-        # 1. Pega o frame mais recente
-        with frame_lock:
-            if latest_raw_frame is None:
-                if frames_processed == 0:
-                    time.sleep(0.5)
-                continue
-            frame = latest_raw_frame.copy()
+        if not startup.ready and decision_publisher.connected:
+            startup.mark("broker_connected")
+
+        # 0. ROI/linha de decisão recalibradas? Aplica antes do próximo frame.
+        new_config = camera_config_watcher.poll()
+        if new_config:
+            apply_camera_config(new_config, trackers)
+
+        # 1. Espera algum frame MAIS NOVO que o último processado.
+        # Nunca roda o modelo duas vezes no mesmo frame (o tracker se
+        # confunde com frames duplicados).
+        if not new_frame_event.wait(timeout=1.0):
+            continue
+        new_frame_event.clear()
 
         start_time = time.time()
-        
-        # 2. APLICAR ROI (Corte)
-        # Se tiver ROI configurado, cortamos a imagem. Se não, usa a imagem cheia.
-        if roi_coords:
-            x1, y1, x2, y2 = roi_coords
-            # Garante que as coordenadas estão dentro da imagem
-            h, w = frame.shape[:2]
-            x1, y1 = max(0, x1), max(0, y1)
-            x2, y2 = min(w, x2), min(h, y2)
-            
-            # O "crop" é a imagem pequena que a IA vai ver
-            frame_para_ia = frame[y1:y2, x1:x2]
-            offset_x, offset_y = x1, y1
-        else:
-            frame_para_ia = frame
-            offset_x, offset_y = 0, 0
-
-        # 3. Inferência na imagem (pode ser a cortada ou a cheia)
-        # persist=True é importante para manter o ID do tracking mesmo se o objeto mover
-        results = model.track(frame_para_ia, persist=True, conf=settings.CONFIDENCE_THRESHOLD, verbose=False)
-        
-        # 4. VISUALIZAÇÃO INTELIGENTE
-        # O plot() desenha as caixas na imagem que foi processada (o recorte)
-        annotated_crop = results[0].plot()
-        
-        # Criamos o frame final copiando o original
-        annotated_final_frame = frame.copy()
-        
-        # Se usamos ROI, precisamos "colar" o recorte desenhado de volta na imagem original
-        if roi_coords:
-            # Sobrepõe a área recortada (agora desenhada) na posição original
-            annotated_final_frame[y1:y2, x1:x2] = annotated_crop
-            # (Opcional) Desenha um retângulo branco para mostrar onde é a ROI
-            cv2.rectangle(annotated_final_frame, (x1, y1), (x2, y2), (255, 255, 255), 1)
-        else:
-            annotated_final_frame = annotated_crop
 
-        detections_this_frame = []
-        
-        if results[0].boxes.id is not None:
-            boxes = results[0].boxes.xyxy.cpu()
-            track_ids = results[0].boxes.id.int().cpu().tolist()
-            confs = results[0].boxes.conf.cpu().tolist()
-            clss = results[0].boxes.cls.int().cpu().tolist()
-
-            for box, track_id, conf, cls_id in zip(boxes, track_ids, confs, clss):
-                # As coordenadas 'box' são relativas ao RECORTE.
-                # Precisamos somar o offset para saber onde elas estão na tela CHEIA (1280x720)
-                box_x1_local = box[0]
-                box_x2_local = box[2]
-                
-                # Calculando centro Global
-                center_x_local = (box_x1_local + box_x2_local) / 2
-                center_x_global = int(center_x_local + offset_x) # Mapeamento crucial!
-                
-                class_name = model.names[cls_id]
-                detections_this_frame.append(f"ID {track_id}: {class_name}")
-
-                # Lógica de Zona de Decisão usando coordenada GLOBAL
-                if center_x_global > ZONA_DE_DECISAO_X and track_id not in ids_ja_processados:
-                    print(f" [ia] Objeto ID {track_id} ({class_name}) cruzou zona (X={center_x_global}).")
-
-                    mensagem_web = {
-                        "track_id": track_id,
-                        "objeto_detectado": class_name,
-                        "confidence": conf 
-                    }
-                    enviar_deteccao_para_backend(mensagem_web)
-                    
-                    decisao_hardware = settings.DECISION_MAP.get(class_name, "nenhuma")
-                    if decisao_hardware != "nenhuma":
-                        mensagem_hardware = {
-                            "track_id": track_id,
-                            "objeto_detectado": class_name,
-                            "decisao_direcao": decisao_hardware,
-                            "timestamp": time.time()
-                        }
-                        publicar_decisao(channel, json.dumps(mensagem_hardware))
-
-                    ids_ja_processados.add(track_id)
-
-        # Atualiza métricas e frame final
+        # 2. APLICAR ROI (Corte) de cada câmera com frame novo
+        crop_start = time.perf_counter()
+        batch = []
+        for lane in lanes:
+            latest = lane.take_new_frame()
+            if latest is None:
+                continue
+            frame_id, capture_ts, frame = latest
+            if not startup.ready:
+                startup.mark(f"first_frame:{lane.camera_id}")
+            crop, roi_clamped, offset_x = lane.crop(frame)
+            if lane.clip_recorder is not None:
+                record_start = time.perf_counter()
+                lane.clip_recorder.record(crop, capture_ts)
+                stage_seconds.observe(time.perf_counter() - record_start, stage="record")
+
+            # Portão de movimento: esteira parada e sem track ativo -> não roda o modelo
+            tracker = trackers[lane.camera_id]
+            if lane.motion_gate is not None and not lane.motion_gate.should_infer(crop, tracker_is_active(tracker)):
+                skip_lane_frame(lane, tracker, frame, capture_ts, crop, roi_clamped)
+                continue
+            batch.append((lane, frame, capture_ts, crop, roi_clamped, offset_x))
+        if not batch:
+            continue
+        stage_seconds.observe(time.perf_counter() - crop_start, stage="crop")
+        batch_size_frames.observe(len(batch))
+
+        # 3. Inferência em lote: uma chamada ao modelo para todas as câmeras
+        inference_start = time.perf_counter()
+        results = model.predict([item[3] for item in batch], conf=settings.CONFIDENCE_THRESHOLD,
+                                imgsz=settings.INFERENCE_IMGSZ, verbose=False)
+        inference_s = time.perf_counter() - inference_start
+        stage_seconds.observe(inference_s, stage="inference")
+        inference_ms = inference_s * 1000
+        avg_inference_time_ms = inference_ms if not avg_inference_time_ms else 0.9 * avg_inference_time_ms + 0.1 * inference_ms
+
+        now = time.time()
+        for (lane, frame, capture_ts, crop, roi_clamped, offset_x), result in zip(batch, results):
+            # Tracking por câmera (IDs independentes em cada esteira)
+            tracking_start = time.perf_counter()
+            result = update_tracker(trackers[lane.camera_id], result)
+            stage_seconds.observe(time.perf_counter() - tracking_start, stage="tracking")
+
+            # 4. VISUALIZAÇÃO SOB DEMANDA
+            # Só entrega o material bruto ao stream se houver alguém assistindo;
+            # o desenho e o JPEG acontecem na thread do cliente (render_annotated_frame).
+            if lane.broadcaster.subscribers > 0:
+                lane.broadcaster.publish((frame, result, roi_clamped), capture_ts)
+
+            decision_start = time.perf_counter()
+            detections_this_frame = process_lane_result(lane, result, offset_x, lookup, now, capture_ts)
+            stage_seconds.observe(time.perf_counter() - decision_start, stage="decision")
+            lane.mark_processed(capture_ts, detections_this_frame)
+            frame_latency_seconds.observe(time.time() - capture_ts, camera=lane.camera_id)
+
+        # Atualiza métricas
         end_time = time.time()
-        avg_processing_time_ms = ((end_time - start_time) * 1000 + avg_processing_time_ms) / 2 # Média móvel simples
-
-        frames_processed += 1
-        with data_lock:
-            latest_detections = detections_this_frame
-            ret, buffer = cv2.imencode('.jpg', annotated_final_frame)
-            if ret:
-                latest_annotated_frame = buffer.tobytes()
-        
-        if frames_processed % 100 == 0:
-            print(f" [ia] ✓ {frames_processed} frames | Latência: {avg_processing_time_ms:.1f}ms")
-            
-    connection.close()
+        stage_seconds.observe(end_time - start_time, stage="total")
+        processing_ms = (end_time - start_time) * 1000
+        avg_processing_time_ms = processing_ms if not avg_processing_time_ms else 0.9 * avg_processing_time_ms + 0.1 * processing_ms
+        if not startup.ready:
+            startup.observe_frame(processing_ms)
+
+        ticks += 1
+        if ticks % 100 == 0:
+            per_camera = " | ".join(f"cam {lane.camera_id}: {lane.fps:.1f}fps, {lane.avg_latency_ms:.0f}ms, "
+                                    f"{lane.frames_dropped} descartados" for lane in lanes)
+            print(f" [ia] ✓ {ticks} rodadas | Latência: {avg_processing_time_ms:.1f}ms "
+                  f"(modelo {avg_inference_time_ms:.1f}ms) | {per_camera}")
 
 # --- THREAD 3: O SERVIDOR FLASK (Melhorado) ---
 app = Flask(__name__)
@@ -325,71 +802,178 @@ def create_placeholder_frame():
         return buffer.tobytes()
     return None
 
-def generate_annotated_frames():
+PLACEHOLDER_BYTES = create_placeholder_frame()
+
+def generate_annotated_frames(lane, max_fps=None, scale=1.0, quality=None):
     """Gera o stream de vídeo anotado para o frontend."""
-    print(" [web] Cliente conectado ao stream de vídeo anotado")
-    frame_count = 0
-    placeholder_bytes = create_placeholder_frame()
-    
-    while True:
-        with data_lock:
-            if latest_annotated_frame is None:
-                # Se ainda não houver frames, envia um placeholder
-                if placeholder_bytes:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + placeholder_bytes + b'\r\n')
-                time.sleep(0.1)
-                continue
-            frame_bytes = latest_annotated_frame
-            frame_count += 1
-            
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    print(f" [web] Cliente conectado ao stream anotado da câmera {lane.camera_id} "
+          f"(fps={max_fps or 'max'}, scale={scale}, quality={quality or 'padrão'})")
+    try:
+        yield from lane.broadcaster.stream(max_fps=max_fps, scale=scale, quality=quality,
+                                           placeholder=PLACEHOLDER_BYTES)
+    finally:
+        print(f" [web] Cliente desconectado do stream anotado da câmera {lane.camera_id}")
+
+# Modo multiprocesso: a API interna da inferência não serve o stream anotado
+STREAM_NOT_SERVED_HERE = "o stream anotado é servido pelo processo web (porta pública)"
 
 @app.route('/video_feed_annotated')
 def video_feed_annotated():
-    """Endpoint que serve o fluxo de vídeo anotado."""
+    """
+    Endpoint que serve o fluxo de vídeo anotado.
+    Parâmetros opcionais: ?camera=0&fps=5&scale=0.5&quality=60 (por cliente).
+    """
     print(" [web] Requisição recebida para /video_feed_annotated")
-    return Response(generate_annotated_frames(),
+    lane = lanes_by_id.get(request.args.get('camera', lanes[0].camera_id))
+    if lane is None:
+        return {"error": "câmera desconhecida", "cameras": list(lanes_by_id)}, 404
+    if not getattr(lane.broadcaster, "serves_clients", True):
+        return {"error": STREAM_NOT_SERVED_HERE}, 503
+    max_fps = request.args.get('fps', type=float)
+    scale = request.args.get('scale', default=1.0, type=float)
+    quality = request.args.get('quality', type=int)
+    return Response(generate_annotated_frames(lane, max_fps, scale, quality),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/health')
 def health():
     """Endpoint de health check para verificar status do serviço."""
-    with data_lock:
-        has_frames = latest_annotated_frame is not None
-        detections_count = len(latest_detections)
-    
-    with frame_lock:
-        has_raw_frames = latest_raw_frame is not None
-    
+    cameras = {lane.camera_id: lane.stats() for lane in lanes}
+
     status = {
         "status": "online",
-        "has_annotated_frames": has_frames,
-        "has_raw_frames": has_raw_frames,
-        "detections_count": detections_count,
+        "has_annotated_frames": any(lane.broadcaster.seq > 0 for lane in lanes),
+        "has_raw_frames": any(lane.frames.seq > 0 for lane in lanes),
+        "detections_count": sum(cam["detections_count"] for cam in cameras.values()),
+        "frames_read": sum(cam["frames_read"] for cam in cameras.values()),
+        "frames_processed": sum(cam["frames_processed"] for cam in cameras.values()),
+        "frames_dropped": sum(cam["frames_dropped"] for cam in cameras.values()),
+        "processing_time_ms": round(avg_processing_time_ms, 1),
+        "inference_time_ms": round(avg_inference_time_ms, 1),
+        "render_time_ms": round(avg_render_time_ms, 1),
         "video_stream_url": VIDEO_STREAM_URL,
-        "rabbitmq_host": RABBITMQ_HOST
+        "frame_transport": settings.FRAME_TRANSPORT,
+        "inference_backend": settings.INFERENCE_BACKEND,
+        "rabbitmq_host": RABBITMQ_HOST,
+        "detection_reporter": detection_reporter.stats(),
+        "decision_publisher": decision_publisher.stats(),
+        "camera_config": camera_config_watcher.stats(),
+        "clip_writer": clip_writer.stats() if clip_writer is not None else None,
+        "decision_latency": decision_log.stats(),
+        "startup": startup.stats(),
+        "cameras": cameras
     }
     return status, 200
 
+@app.route('/ready')
+def ready():
+    """
+    Prontidão (diferente do /health, que é só liveness): 200 quando o modelo
+    está aquecido e um frame real já passou dentro do orçamento de latência.
+    """
+    return startup.stats(), 200 if startup.ready else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Contadores e histogramas no formato texto do Prometheus."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Servidor asyncio (HTTP_SERVER=asyncio) ---
+def run_async_http(host, port, views=None):
+    """
+    Mesmas rotas do Flask num único event loop (ver shared/async_stream.py).
+    'views' troca as views de /health, /ready e /metrics (o processo web do
+    modo multiprocesso usa as próprias, que repassam as da inferência).
+    """
+    from aiohttp import web
+    from shared.async_stream import AsyncFanout, query_arg, run_async_app, serve_mjpeg, view_handler
+
+    fanouts = {}   # (câmera, escala, qualidade) -> AsyncFanout
+
+    def fanout_for(lane, scale, quality):
+        key = (lane.camera_id, scale, quality)
+        if key not in fanouts:
+            broadcaster = lane.broadcaster
+            fanouts[key] = AsyncFanout(
+                lambda last_seq, timeout: broadcaster.wait_encoded(last_seq, timeout, scale, quality),
+                name=f"cam{lane.camera_id}", initial_seq=lambda: broadcaster.seq)
+        return fanouts[key]
+
+    async def video_feed_annotated_async(request):
+        lane = lanes_by_id.get(request.query.get('camera', lanes[0].camera_id))
+        if lane is None:
+            return web.json_response({"error": "câmera desconhecida", "cameras": list(lanes_by_id)}, status=404)
+        if not getattr(lane.broadcaster, "serves_clients", True):
+            return web.json_response({"error": STREAM_NOT_SERVED_HERE}, status=503)
+        scale, quality = lane.broadcaster.normalize(query_arg(request, 'scale', float, 1.0),
+                                                    query_arg(request, 'quality', int))
+        broadcaster = lane.broadcaster
+
+        def on_sent(size):
+            broadcaster.bytes_sent += size
+
+        print(f" [web] Cliente conectado ao stream anotado da câmera {lane.camera_id} (asyncio)")
+        try:
+            return await serve_mjpeg(request, fanout_for(lane, scale, quality), query_arg(request, 'fps', float),
+                                     PLACEHOLDER_BYTES, broadcaster.attach, broadcaster.detach, on_sent)
+        finally:
+            print(f" [web] Cliente desconectado do stream anotado da câmera {lane.camera_id}")
+
+    async_app = web.Application()
+    async_app.router.add_get('/video_feed_annotated', video_feed_annotated_async)
+    views = views or {'/health': health, '/ready': ready, '/metrics': metrics_endpoint}
+    for path, view in views.items():
+        async_app.router.add_get(path, view_handler(view))
+    run_async_app(async_app, host, port)
+
 # --- PONTO DE ENTRADA (MODIFICADO) ---
-if __name__ == '__main__':
+def run_service(reader_loop=frame_reader_loop, host=settings.INFERENCE_API_HOST, port=settings.INFERENCE_API_PORT):
+    """Sobe todas as threads do serviço e a API Flask (bloqueia no thread principal)."""
+    # 0. Carregar e aquecer o modelo em paralelo com o stream e o broker (Thread)
+    threading.Thread(target=load_and_warm_model, daemon=True).start()
+    print(" [ia] Carregamento do modelo ATIVADO (em paralelo).")
+
     # 1. Iniciar o "Pulso de Vida" da IA (Thread)
     heartbeat_thread = threading.Thread(target=send_heartbeat, daemon=True)
     heartbeat_thread.start()
     print(" [web] Thread de pulso de vida da IA ATIVADO.")
 
-    # 2. Iniciar o "Leitor de Frames" (Novo Thread)
-    reader_thread = threading.Thread(target=frame_reader_loop, daemon=True)
-    reader_thread.start()
-    print(" [capture] Thread de leitura de frames ATIVADO.")
+    # 2. Iniciar o envio assíncrono de detecções para o NestJS (Thread)
+    detection_reporter.start()
+    print(" [web] Thread de envio de detecções ATIVADO.")
 
-    # 3. Iniciar o "Classificador e Publicador" de IA (Thread)
+    # 3. Iniciar o publicador de decisões no RabbitMQ (Thread)
+    decision_publisher.start()
+    print(" [mq] Thread do publicador de decisões ATIVADO.")
+
+    # 3b. Iniciar o gravador de clipes pré/pós-evento (Thread)
+    if clip_writer is not None:
+        clip_writer.start()
+        print(f" [clips] Thread de gravação de clipes ATIVADO ({settings.CLIP_DIR}, "
+              f"até {settings.CLIP_MAX_DISK_MB}MB).")
+
+    # 4. Iniciar um "Leitor de Frames" por câmera (Threads)
+    for lane in lanes:
+        reader_thread = threading.Thread(target=reader_loop, args=(lane,), daemon=True)
+        reader_thread.start()
+        print(f" [capture:{lane.camera_id}] Thread de leitura de frames ATIVADO ({lane.source_url}).")
+
+    # 5. Iniciar o "Classificador e Publicador" de IA (Thread)
     inference_thread = threading.Thread(target=inference_tracking_loop, daemon=True)
     inference_thread.start()
     print(" [ia] Loop de inferência e tracking ATIVADO.")
 
-    # 4. Iniciar a API Web de Monitoramento (no thread principal)
-    print(f" [web] Iniciando API Flask em http://{settings.INFERENCE_API_HOST}:{settings.INFERENCE_API_PORT}")
-    app.run(host=settings.INFERENCE_API_HOST, port=settings.INFERENCE_API_PORT, threaded=True)
\ No newline at end of file
+    # 6. Iniciar a API Web de Monitoramento (no thread principal)
+    if settings.HTTP_SERVER == "asyncio":
+        run_async_http(host, port)
+        return
+    print(f" [web] Iniciando API Flask em http://{host}:{port}")
+    app.run(host=host, port=port, threaded=True)
+
+if __name__ == '__main__':
+    if settings.INFERENCE_PROCESS_MODE == "processes":
+        # Decodificação, inferência e streaming em processos separados (ver workers.py)
+        from workers import supervise
+        supervise(sys.modules[__name__])
+    else:
+        run_service()
@@ -0,0 +1,265 @@
+# src/inference_service/replay.py
+"""
+Modo replay do inference_service: roda um clipe gravado (vídeo ou
+diretório de imagens) pelo MESMO caminho do serviço ao vivo
+(ROI -> modelo -> tracker -> zona de decisão -> publicação), sem câmera,
+RabbitMQ nem NestJS. O publicador e o reporter são trocados por
+stand-ins locais que só registram as mensagens.
+
+Gera um relatório de benchmark com p50/p95/p99 por etapa, FPS sustentado
+e decisões emitidas x gabarito, para pegar regressões antes do deploy.
+
+Exemplo (rodar a partir da pasta clawai/):
+    python src/inference_service/replay.py --clip gravacoes/esteira.mp4 \
+        --ground-truth gravacoes/esteira.json --output data/replay_report.json
+
+Gabarito (opcional): lista JSON com um item por objeto que cruza a linha,
+na ordem, p.ex. [{"frame": 120, "objeto_detectado": "circulo"}, ...]
+("frame" é opcional; sem ele só classe e ordem contam).
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Importar o serviço também coloca a raiz do projeto no sys.path
+import main as inference
+from config import settings
+from shared.clip_source import clip_fps, iter_clip_frames
+from shared.decision_log import DecisionLatencyLog
+
+STAGES = ("decode", "crop", "gate", "inference", "tracking", "annotate", "encode", "publish", "total")
+
+
+class ReplayRecorder:
+    """Stand-in do DetectionReporter e do DecisionPublisher: guarda tudo em memória."""
+
+    def __init__(self):
+        self.frame_index = 0
+        self.detections = []   # o que iria para o NestJS (todo objeto que cruzou a linha)
+        self.decisions = []    # o que iria para o RabbitMQ (só classes com ação de hardware)
+
+    # Interface do DetectionReporter
+    def submit(self, dto):
+        self.detections.append({"frame": self.frame_index, **dto})
+        return True
+
+    # Interface do DecisionPublisher
+    def publish(self, message, routing_key=None, origin_ts=None):
+        self.decisions.append({"frame": self.frame_index, "routing_key": routing_key, **message})
+        return True
+
+    def stats(self):
+        return {"detections": len(self.detections), "decisions": len(self.decisions)}
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    arr = np.asarray(values)
+    return {
+        "count": len(values),
+        "mean": round(float(arr.mean()), 2),
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p95": round(float(np.percentile(arr, 95)), 2),
+        "p99": round(float(np.percentile(arr, 99)), 2),
+        "max": round(float(arr.max()), 2),
+    }
+
+
+def compare_with_ground_truth(emitted, expected, frame_tolerance):
+    """
+    Casa cada item do gabarito com a primeira detecção ainda livre da mesma
+    classe (e, se o gabarito tiver 'frame', dentro da tolerância).
+    """
+    used = set()
+    matched = 0
+    missed = []
+    for item in expected:
+        for i, det in enumerate(emitted):
+            if i in used or det["type"] != item["objeto_detectado"]:
+                continue
+            if "frame" in item and abs(det["frame"] - item["frame"]) > frame_tolerance:
+                continue
+            used.add(i)
+            matched += 1
+            break
+        else:
+            missed.append(item)
+    extra = [det for i, det in enumerate(emitted) if i not in used]
+    return {
+        "expected": len(expected),
+        "emitted": len(emitted),
+        "matched": matched,
+        "missed": missed,
+        "extra": [{"frame": det["frame"], "objeto_detectado": det["type"]} for det in extra],
+        "precision": round(matched / len(emitted), 3) if emitted else 1.0,
+        "recall": round(matched / len(expected), 3) if expected else 1.0,
+    }
+
+
+def run_replay(args):
+    recorder = ReplayRecorder()
+    # O caminho de decisão (process_lane_result) usa estes globais do serviço
+    inference.detection_reporter = recorder
+    inference.decision_publisher = recorder
+    # Não mistura as peças do replay com o log de latência da produção
+    inference.decision_log = DecisionLatencyLog(args.decision_log or os.devnull)
+
+    lane = inference.create_lane(args.camera, args.clip)
+    if not args.motion_gate:
+        lane.motion_gate = None
+    tracker = inference.create_tracker()
+    model = inference.load_model(args.backend, inference.MODEL_PATH, args.int8)
+    lookup = inference.DecisionLookup(model.names, settings.DECISION_MAP)
+    fps = clip_fps(args.clip)
+
+    frames = iter_clip_frames(args.clip, args.frames)
+    first = next(frames, None)
+    if first is None:
+        raise SystemExit(f"Nenhum frame lido de '{args.clip}'")
+    # Aquecimento fora da medição (a primeira chamada aloca tudo)
+    for _ in range(args.warmup):
+        model.predict([lane.crop(first)[0]], conf=settings.CONFIDENCE_THRESHOLD, imgsz=args.imgsz, verbose=False)
+    frames = itertools.chain([first], frames)
+
+    timings = {stage: [] for stage in STAGES}
+    # Relógio simulado no ritmo do clipe: o TTL do registro de tracks
+    # se comporta como ao vivo mesmo rodando mais rápido/lento
+    clock_origin = time.time()
+    replay_start = time.perf_counter()
+
+    frame_index = 0
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        t1 = time.perf_counter()
+        crop, roi_clamped, offset_x = lane.crop(frame)
+        t2 = time.perf_counter()
+
+        now = clock_origin + frame_index / fps
+        if lane.motion_gate is not None and not lane.motion_gate.should_infer(crop, inference.tracker_is_active(tracker)):
+            recorder.frame_index = lane.frames_processed
+            inference.skip_lane_frame(lane, tracker, frame, time.time(), crop, roi_clamped, now)
+            t_gate = time.perf_counter()
+            timings["decode"].append((t1 - t0) * 1000)
+            timings["crop"].append((t2 - t1) * 1000)
+            timings["gate"].append((t_gate - t2) * 1000)
+            timings["total"].append((t_gate - t0) * 1000)
+            frame_index += 1
+            continue
+        t_gate = time.perf_counter()
+
+        result = model.predict([crop], conf=settings.CONFIDENCE_THRESHOLD, imgsz=args.imgsz, verbose=False)[0]
+        t3 = time.perf_counter()
+        result = inference.update_tracker(tracker, result)
+        t4 = time.perf_counter()
+
+        if args.annotate:
+            annotated = inference.render_annotated_frame((frame, result, roi_clamped))
+            t5 = time.perf_counter()
+            cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            t6 = time.perf_counter()
+        else:
+            t5 = t6 = t4
+
+        recorder.frame_index = lane.frames_processed
+        detections_this_frame = inference.process_lane_result(lane, result, offset_x, lookup, now)
+        lane.mark_processed(time.time() - (time.perf_counter() - t0), detections_this_frame)
+        t7 = time.perf_counter()
+
+        for stage, ms in zip(STAGES, ((t1 - t0), (t2 - t1), (t_gate - t2), (t3 - t_gate), (t4 - t3),
+                                      (t5 - t4), (t6 - t5), (t7 - t6), (t7 - t0))):
+            timings[stage].append(ms * 1000)
+
+        frame_index += 1
+        if frame_index % 100 == 0:
+            print(f" [replay] {frame_index} frames | {len(recorder.detections)} objetos cruzaram a linha")
+
+    elapsed = time.perf_counter() - replay_start
+
+    report = {
+        "clip": args.clip,
+        "clip_fps": round(fps, 1),
+        "camera": args.camera,
+        "roi": lane.roi,
+        "decision_x": lane.decision_x,
+        "backend": args.backend,
+        "int8": args.int8,
+        "imgsz": args.imgsz,
+        "annotate": args.annotate,
+        "frames": frame_index,
+        "sustained_fps": round(frame_index / elapsed, 1) if elapsed > 0 else 0.0,
+        "stages_ms": {stage: percentiles(values) for stage, values in timings.items()},
+        "tracks": lane.track_registry.stats(),
+        "motion_gate": lane.motion_gate.stats() if lane.motion_gate is not None else None,
+        "detections": recorder.detections,
+        "decisions": recorder.decisions,
+    }
+
+    if args.ground_truth:
+        with open(args.ground_truth, encoding="utf-8") as f:
+            expected = json.load(f)
+        report["ground_truth"] = compare_with_ground_truth(recorder.detections, expected, args.frame_tolerance)
+    return report
+
+
+def print_report(report):
+    print(f"\n [replay] {report['frames']} frames em {report['sustained_fps']} FPS sustentados "
+          f"(clipe a {report['clip_fps']} FPS, backend={report['backend']})")
+    print(f"\n{'etapa':<10} {'média':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}")
+    for stage, s in report["stages_ms"].items():
+        if s["count"]:
+            print(f"{stage:<10} {s['mean']:>8} {s['p50']:>8} {s['p95']:>8} {s['p99']:>8} {s['max']:>8}")
+
+    print(f"\n Objetos que cruzaram a linha: {len(report['detections'])} "
+          f"| decisões de hardware: {len(report['decisions'])}")
+    gate = report.get("motion_gate")
+    if gate:
+        print(f" Portão de movimento: {gate['frames_inferred']} frames inferidos, "
+              f"{gate['frames_gated']} pulados ({gate['gated_ratio']:.0%})")
+    gt = report.get("ground_truth")
+    if gt:
+        print(f" Gabarito: {gt['matched']}/{gt['expected']} casados | {len(gt['extra'])} extras "
+              f"| precisão {gt['precision']} | recall {gt['recall']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay offline + benchmark do pipeline de inferência")
+    parser.add_argument("--clip", required=True, help="Vídeo gravado ou diretório de imagens")
+    parser.add_argument("--camera", default="0", help="ID da câmera (ROI, linha de decisão e fila do settings)")
+    parser.add_argument("--ground-truth", default=None, help="JSON com os objetos esperados")
+    parser.add_argument("--frame-tolerance", type=int, default=15,
+                        help="Folga em frames ao casar com o gabarito")
+    parser.add_argument("--frames", type=int, default=None, help="Máximo de frames do clipe")
+    parser.add_argument("--backend", default=settings.INFERENCE_BACKEND)
+    parser.add_argument("--int8", action="store_true", default=settings.INFERENCE_INT8)
+    parser.add_argument("--imgsz", type=int, default=settings.INFERENCE_IMGSZ)
+    parser.add_argument("--warmup", type=int, default=3, help="Inferências de aquecimento (fora da medição)")
+    parser.add_argument("--no-annotate", dest="annotate", action="store_false",
+                        help="Mede sem desenho/JPEG (como ao vivo sem ninguém assistindo)")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false",
+                        help="Roda o modelo em todo frame (ignora MOTION_GATE_ENABLED)")
+    parser.add_argument("--output", default=None, help="Salva o relatório em JSON")
+    parser.add_argument("--decision-log", default=None,
+                        help="JSONL por peça (posição, velocidade, chegada prevista) no relógio do clipe")
+    args = parser.parse_args()
+
+    report = run_replay(args)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n [replay] Relatório salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+# src/inference_service/workers.py
+"""
+Layout multiprocesso opcional do inference_service (INFERENCE_PROCESS_MODE=processes).
+
+No modo padrão ("threads") leitura do stream, modelo, desenho/JPEG do stream
+anotado e Flask disputam o mesmo GIL, e a latência por frame oscila sempre
+que um dashboard conecta. Aqui cada papel roda num processo:
+
+    decode:<câmera>  lê o MJPEG do capture_service e escreve os frames BGR num
+                     ring de memória compartilhada (só com FRAME_TRANSPORT=mjpeg;
+                     com shm o ring do próprio capture_service já serve)
+    inference        o serviço de sempre (main.run_service), lendo dos rings;
+                     API interna em 127.0.0.1:INFERENCE_INTERNAL_PORT
+    web              /video_feed_annotated na porta pública: pega o frame no
+                     ring pelo capture_ts e desenha as caixas recebidas numa
+                     fila leve (só números, nunca o frame); /health e /metrics
+                     repassam os da inferência
+
+O supervisor (este processo) reinicia qualquer worker que morrer, com
+backoff exponencial. Os workers nascem por fork do supervisor, que ainda
+não iniciou nenhuma thread nem carregou o modelo.
+"""
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+import cv2
+import requests
+from flask import Flask, Response
+from flask_cors import CORS
+
+from config import settings
+from shared.frame_ring import SharedFrameRing
+from shared.metrics import MetricsRegistry
+from shared.mjpeg_broadcaster import MjpegBroadcaster
+from shared.mjpeg_reader import TimestampedCapture
+from shared.proc_stats import process_cpu_seconds
+from shared.track_postprocess import (CLS, CONF, EMPTY_TRACKS, TRACK_ID, X1, X2, Y1, Y2,
+                                      pack_tracks)
+
+# Um worker que ficou de pé por esse tempo volta ao backoff mínimo
+STABLE_AFTER_S = 60
+# Estatísticas do stream anotado (processo web -> inferência)
+SUBSCRIBERS, FRAMES_ENCODED, BYTES_SENT = range(3)
+CLASS_COLORS = [(255, 56, 56), (56, 56, 255), (56, 255, 56), (255, 157, 151), (0, 194, 255)]
+
+
+def decoded_ring_name(camera_id):
+    return f"{settings.DECODED_RING_PREFIX}_{camera_id}"
+
+
+def frame_ring_name(lane):
+    """Ring de onde a inferência e o processo web leem os frames da câmera."""
+    if settings.FRAME_TRANSPORT == "shm":
+        return lane.shm_ring_name
+    return decoded_ring_name(lane.camera_id)
+
+
+# --- Processo de decodificação (um por câmera) ---
+def decode_worker(camera_id, source_url):
+    """Lê o MJPEG da câmera e escreve cada frame decodificado no ring."""
+    tag = f" [decode:{camera_id}]"
+    ring = None
+    frames = 0
+    while True:
+        capture = TimestampedCapture(source_url)
+        if not capture.isOpened():
+            print(f"{tag} ✗ Falha ao conectar em {source_url}. Tentando novamente em 5s...")
+            time.sleep(5)
+            continue
+        print(f"{tag} ✓ Conectado a {source_url}")
+        while True:
+            success, frame, capture_ts = capture.read()
+            if not success:
+                print(f"{tag} ⚠ Perda de stream. Tentando reconectar...")
+                capture.release()
+                time.sleep(2)
+                break
+            if ring is None or ring.shape != frame.shape:
+                if ring is not None:
+                    ring.close()
+                ring = SharedFrameRing.create(decoded_ring_name(camera_id), frame.shape[1], frame.shape[0],
+                                              frame.shape[2], settings.DECODED_RING_SLOTS)
+                print(f"{tag} Ring '{ring.name}' criado: {ring.width}x{ring.height}, {ring.slots} slots")
+            ring.write(frame, capture_ts)
+            frames += 1
+            if frames % 100 == 0:
+                print(f"{tag} ✓ {frames} frames decodificados")
+
+
+# --- Processo de inferência ---
+class RemoteAnnotationSink:
+    """
+    Ocupa o lugar do MjpegBroadcaster da câmera no processo de inferência.
+    publish() manda só as caixas (N x 7 floats) para o processo web, sem
+    desenhar nem codificar nada aqui; as estatísticas do stream vêm do
+    processo web por um array compartilhado.
+
+    Quem serve o /video_feed_annotated é o processo web: a API interna da
+    inferência responde 503 nessa rota (serves_clients = False) e
+    attach/detach não fazem nada.
+    """
+
+    serves_clients = False
+
+    def __init__(self, camera_id, annotations, shared_stats):
+        self.camera_id = camera_id
+        self._annotations = annotations
+        self._shared = shared_stats
+        self.seq = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self):
+        return self._shared[SUBSCRIBERS]
+
+    @property
+    def frames_encoded(self):
+        return self._shared[FRAMES_ENCODED]
+
+    @property
+    def bytes_sent(self):
+        return self._shared[BYTES_SENT]
+
+    def attach(self):
+        pass
+
+    def detach(self):
+        pass
+
+    def publish(self, job, timestamp=None):
+        frame, result, roi = job
+        packed = pack_tracks(result) if result is not None else EMPTY_TRACKS
+        names = result.names if result is not None else None
+        try:
+            self._annotations.put_nowait((self.camera_id, timestamp, roi, packed, names))
+            self.seq += 1
+        except queue.Full:
+            # Processo web atrasado: perde um frame do dashboard, nunca trava a inferência
+            self.dropped += 1
+        return self.seq
+
+    def stats(self):
+        return {
+            "subscribers": self.subscribers,
+            "frames_published": self.seq,
+            "frames_encoded": self.frames_encoded,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+        }
+
+
+def inference_worker(service, annotations, shared_stats):
+    for lane in service.lanes:
+        lane.shm_ring_name = frame_ring_name(lane)
+        lane.broadcaster = RemoteAnnotationSink(lane.camera_id, annotations, shared_stats[lane.camera_id])
+    service.run_service(reader_loop=service.shm_reader_loop, host="127.0.0.1",
+                        port=settings.INFERENCE_INTERNAL_PORT)
+
+
+# --- Processo web ---
+def render_remote_annotations(job):
+    """Desenha as caixas recebidas da inferência sobre o frame lido do ring."""
+    frame, packed, roi, names = job
+    offset_x, offset_y = (roi[0], roi[1]) if roi else (0, 0)
+    for row in packed:
+        x1, y1 = int(row[X1]) + offset_x, int(row[Y1]) + offset_y
+        x2, y2 = int(row[X2]) + offset_x, int(row[Y2]) + offset_y
+        cls_id = int(row[CLS])
+        color = CLASS_COLORS[cls_id % len(CLASS_COLORS)]
+        label = f"id:{int(row[TRACK_ID])} {(names or {}).get(cls_id, cls_id)} {row[CONF]:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, label, (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    if roi:
+        cv2.rectangle(frame, (roi[0], roi[1]), (roi[2], roi[3]), (255, 255, 255), 1)
+    return frame
+
+
+class AnnotationPairer:
+    """Junta cada lote de caixas ao frame de mesmo capture_ts no ring da câmera."""
+
+    def __init__(self, lanes):
+        self._lanes = {lane.camera_id: lane for lane in lanes}
+        self._rings = {}
+        self.matched = {camera_id: 0 for camera_id in self._lanes}
+        self.stale = {camera_id: 0 for camera_id in self._lanes}
+        # Captura -> frame anotado entregue ao broadcaster (s), último lote por câmera
+        self.delay_s = {camera_id: 0.0 for camera_id in self._lanes}
+
+    def frame_for(self, camera_id, capture_ts):
+        ring = self._rings.get(camera_id)
+        try:
+            if ring is None:
+                ring = self._rings[camera_id] = SharedFrameRing.attach(frame_ring_name(self._lanes[camera_id]))
+            exact = ring.read_at(capture_ts)
+            if exact is not None:
+                self.matched[camera_id] += 1
+                return exact[2]
+            # O frame já saiu do anel (inferência mais lenta que o anel):
+            # desenha sobre o mais recente, com as caixas um pouco atrasadas
+            latest = ring.read_latest()
+            if latest is None:
+                return None
+            self.stale[camera_id] += 1
+            return latest[2]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Produtor reiniciou e recriou o segmento: reanexa na próxima
+            print(f" [web:{camera_id}] ⚠ Reanexando ao ring: {e}")
+            if ring is not None:
+                ring.close()
+            self._rings.pop(camera_id, None)
+            return None
+
+    def run(self, annotations):
+        while True:
+            camera_id, capture_ts, roi, packed, names = annotations.get()
+            lane = self._lanes.get(camera_id)
+            if lane is None or lane.broadcaster.subscribers == 0:
+                continue
+            frame = self.frame_for(camera_id, capture_ts)
+            if frame is not None:
+                lane.broadcaster.publish((frame, packed, roi, names), capture_ts)
+                if capture_ts is not None:
+                    self.delay_s[camera_id] = time.time() - capture_ts
+
+
+def sync_stream_stats(lanes, shared_stats):
+    while True:
+        for lane in lanes:
+            stats = shared_stats[lane.camera_id]
+            stats[SUBSCRIBERS] = lane.broadcaster.subscribers
+            stats[FRAMES_ENCODED] = lane.broadcaster.frames_encoded
+            stats[BYTES_SENT] = lane.broadcaster.bytes_sent
+        time.sleep(0.2)
+
+
+def worker_cpu_seconds(pid):
+    """CPU acumulada do worker; None se não der para ler (fora do Linux ou já morreu)."""
+    try:
+        return process_cpu_seconds(pid)[0]
+    except OSError:
+        return None
+
+
+def web_worker(service, annotations, shared_stats, worker_names, restarts, pids):
+    internal_url = f"http://127.0.0.1:{settings.INFERENCE_INTERNAL_PORT}"
+    for lane in service.lanes:
+        lane.broadcaster = MjpegBroadcaster(render=render_remote_annotations)
+    pairer = AnnotationPairer(service.lanes)
+    threading.Thread(target=pairer.run, args=(annotations,), daemon=True).start()
+    threading.Thread(target=sync_stream_stats, args=(service.lanes, shared_stats), daemon=True).start()
+
+    # pid -> (instante, CPU acumulada) da última leitura, para o % de CPU entre leituras
+    cpu_samples = {}
+
+    def workers_status():
+        status = {}
+        now = time.monotonic()
+        for i, name in enumerate(worker_names):
+            alive = False
+            if pids[i]:
+                try:
+                    os.kill(pids[i], 0)
+                    alive = True
+                except OSError:
+                    pass
+            cpu_s = worker_cpu_seconds(pids[i]) if alive else None
+            cpu_percent = None
+            previous = cpu_samples.get(pids[i])
+            if cpu_s is not None:
+                if previous is not None and now > previous[0]:
+                    cpu_percent = round(100 * (cpu_s - previous[1]) / (now - previous[0]), 1)
+                cpu_samples[pids[i]] = (now, cpu_s)
+            status[name] = {"pid": pids[i], "alive": alive, "restarts": restarts[i],
+                            "cpu_seconds": cpu_s, "cpu_percent": cpu_percent}
+        return status
+
+    web_metrics = MetricsRegistry()
+    web_metrics.collector("clawai_worker_up", "1 se o processo do worker está vivo",
+                          lambda: [({"worker": name}, int(s["alive"])) for name, s in workers_status().items()])
+    web_metrics.collector("clawai_worker_restarts_total", "Reinícios do worker pelo supervisor",
+                          lambda: [({"worker": name}, s["restarts"]) for name, s in workers_status().items()],
+                          "counter")
+    web_metrics.collector("clawai_worker_cpu_seconds_total", "CPU (usuário + sistema) consumida pelo worker",
+                          lambda: [({"worker": name}, s["cpu_seconds"]) for name, s in workers_status().items()
+                                   if s["cpu_seconds"] is not None], "counter")
+    web_metrics.collector("clawai_annotations_matched_total", "Caixas desenhadas sobre o frame exato",
+                          lambda: [({"camera": c}, n) for c, n in pairer.matched.items()], "counter")
+    web_metrics.collector("clawai_annotations_stale_total",
+                          "Caixas desenhadas sobre um frame mais novo (o exato já saiu do ring)",
+                          lambda: [({"camera": c}, n) for c, n in pairer.stale.items()], "counter")
+    web_metrics.collector("clawai_annotation_delay_seconds",
+                          "Captura -> frame anotado pronto no processo web (último lote da câmera)",
+                          lambda: [({"camera": c}, d) for c, d in pairer.delay_s.items()])
+
+    app = Flask(__name__)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    app.add_url_rule('/video_feed_annotated', view_func=service.video_feed_annotated)
+
+    @app.route('/health')
+    def health():
+        try:
+            status, code = requests.get(f"{internal_url}/health", timeout=2).json(), 200
+        except Exception as e:
+            status, code = {"status": "degraded", "error": f"worker de inferência indisponível: {e}"}, 503
+        status["process_mode"] = "processes"
+        status["workers"] = workers_status()
+        status["annotation_delay_ms"] = {c: round(d * 1000, 1) for c, d in pairer.delay_s.items()}
+        return status, code
+
+    @app.route('/ready')
+    def ready():
+        try:
+            response = requests.get(f"{internal_url}/ready", timeout=2)
+            return response.json(), response.status_code
+        except Exception as e:
+            return {"ready": False, "reason": f"worker de inferência indisponível: {e}"}, 503
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        try:
+            body = requests.get(f"{internal_url}/metrics", timeout=2).text
+        except Exception:
+            body = ""
+        return Response(body + web_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    print(f" [web] Processo web em http://{settings.INFERENCE_API_HOST}:{settings.INFERENCE_API_PORT} "
+          f"(inferência em {internal_url})")
+    if settings.HTTP_SERVER == "asyncio":
+        # Mesmo servidor aiohttp do modo threads, com o /health, /ready e /metrics deste processo
+        service.run_async_http(settings.INFERENCE_API_HOST, settings.INFERENCE_API_PORT,
+                               views={'/health': health, '/ready': ready, '/metrics': metrics_endpoint})
+        return
+    app.run(host=settings.INFERENCE_API_HOST, port=settings.INFERENCE_API_PORT, threaded=True)
+
+
+# --- Supervisor ---
+def _child_main(target, args):
+    # O supervisor cuida do SIGTERM/Ctrl+C; o worker só morre quando ele mandar
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(*args)
+
+
+class Worker:
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.restart_at = None
+
+    def start(self, ctx):
+        self.process = ctx.Process(target=_child_main, args=(self.target, self.args),
+                                   name=f"clawai-{self.name}", daemon=True)
+        self.process.start()
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        print(f" [sup] Worker '{self.name}' iniciado (pid {self.process.pid})")
+
+
+def supervise(service):
+    """Sobe os workers e os mantém vivos. 'service' é o módulo main já importado."""
+    # fork: os workers herdam o módulo main já montado (câmeras, métricas, app)
+    ctx = multiprocessing.get_context("fork")
+    annotations = ctx.Queue(maxsize=settings.ANNOTATION_QUEUE_MAX)
+    shared_stats = {lane.camera_id: ctx.Array('q', 3, lock=False) for lane in service.lanes}
+
+    workers = []
+    if settings.FRAME_TRANSPORT != "shm":
+        workers += [Worker(f"decode:{lane.camera_id}", decode_worker, (lane.camera_id, lane.source_url))
+                    for lane in service.lanes]
+    workers.append(Worker("inference", inference_worker, (service, annotations, shared_stats)))
+    restarts = ctx.Array('i', len(workers) + 1, lock=False)
+    pids = ctx.Array('i', len(workers) + 1, lock=False)
+    names = [worker.name for worker in workers] + ["web"]
+    workers.append(Worker("web", web_worker, (service, annotations, shared_stats, names, restarts, pids)))
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f" [sup] Modo multiprocesso: {', '.join(names)} (transporte de frames: {settings.FRAME_TRANSPORT})")
+    for i, worker in enumerate(workers):
+        worker.start(ctx)
+        pids[i] = worker.process.pid
+
+    while not stopping.wait(1.0):
+        now = time.monotonic()
+        for i, worker in enumerate(workers):
+            if worker.process.is_alive():
+                continue
+            if worker.restart_at is None:
+                uptime = now - worker.started_at
+                if uptime >= STABLE_AFTER_S:
+                    worker.restarts = 0
+                backoff = min(settings.WORKER_RESTART_MAX_BACKOFF_S, 2 ** worker.restarts)
+                worker.restart_at = now + backoff
+                print(f" [sup] ✗ Worker '{worker.name}' terminou (código {worker.process.exitcode}, "
+                      f"{uptime:.0f}s de vida). Reiniciando em {backoff}s...")
+                continue
+            if now >= worker.restart_at:
+                worker.restarts += 1
+                restarts[i] += 1
+                worker.start(ctx)
+                pids[i] = worker.process.pid
+
+    print(" [sup] Encerrando workers...")
+    for worker in workers:
+        if worker.process.is_alive():
+            worker.process.terminate()
+    for worker in workers:
+        worker.process.join(timeout=5)
@@ -0,0 +1,163 @@
+"""
+Compara latência e concordância dos backends de inferência no MESMO clipe.
+
+Cada frame do clipe é recortado pela ROI da câmera (como no
+inference_service) e passado por cada backend. O primeiro backend da lista
+é a referência: para os demais, mede-se a CONCORDÂNCIA com ele
+(precisão/recall das detecções contra as da referência, IoU >= 0.5 e mesma
+classe). Isso não é acurácia: o clipe não tem rótulos. Com --data (o
+data.yaml do dataset), cada backend também roda o model.val() e o
+relatório traz o mAP contra os rótulos, como no training/sweep.py.
+
+Exemplo (rodar a partir da pasta clawai/):
+    python training/benchmark_backends.py --clip gravacoes/esteira.mp4 \
+        --backends torch onnxruntime openvino --int8 --output data/bench_backends.json
+    # + mAP de cada backend na validação do dataset
+    python training/benchmark_backends.py --clip gravacoes/esteira.mp4 \
+        --data training/rock-paper-scissors-14/data.yaml
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+from config import settings
+from shared.clip_source import iter_clip_frames
+from shared.inference_backend import BACKENDS, load_model
+
+VAL_DIR = os.path.join("training_runs", "bench_backends")
+
+
+def crop_roi(frame, roi):
+    if not roi:
+        return frame
+    x1, y1, x2, y2 = roi
+    h, w = frame.shape[:2]
+    return frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+
+
+def box_iou(a, b):
+    """IoU entre todas as caixas de a (N,4) e b (M,4) em xyxy."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_count(pred, ref, iou_threshold=0.5):
+    """Quantas detecções de 'pred' casam (guloso por IoU, mesma classe) com 'ref'."""
+    if len(pred["boxes"]) == 0 or len(ref["boxes"]) == 0:
+        return 0
+    iou = box_iou(pred["boxes"], ref["boxes"])
+    iou[pred["cls"][:, None] != ref["cls"][None, :]] = 0
+    matched = 0
+    while True:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < iou_threshold:
+            return matched
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+
+
+def evaluate_accuracy(model, data_yaml, imgsz):
+    """mAP contra os rótulos do split de validação (batch=1: os artefatos exportados têm lote fixo)."""
+    metrics = model.val(data=data_yaml, imgsz=imgsz, batch=1, split="val",
+                        project=VAL_DIR, name="val", exist_ok=True, plots=False, verbose=False)
+    return {"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4)}
+
+
+def run_backend(backend, crops, int8, imgsz, data_yaml=None, warmup=5):
+    model = load_model(backend, settings.MODEL_PATH, int8 and backend != "torch")
+    for crop in crops[:warmup]:
+        model.predict(crop, conf=settings.CONFIDENCE_THRESHOLD, imgsz=imgsz, verbose=False)
+
+    latencies, detections = [], []
+    for crop in crops:
+        start = time.perf_counter()
+        result = model.predict(crop, conf=settings.CONFIDENCE_THRESHOLD, imgsz=imgsz, verbose=False)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        boxes = result.boxes.cpu().numpy()
+        detections.append({"boxes": boxes.xyxy.reshape(-1, 4), "cls": boxes.cls.astype(int)})
+    accuracy = evaluate_accuracy(model, data_yaml, imgsz) if data_yaml else {}
+    return np.array(latencies), detections, accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de inferência (latência x concordância)")
+    parser.add_argument("--clip", required=True, help="Vídeo gravado ou diretório de imagens")
+    parser.add_argument("--camera", default="0", help="ID da câmera cuja ROI será usada (CAMERA_ROIS)")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS,
+                        help="O primeiro é a referência da concordância")
+    parser.add_argument("--int8", action="store_true", help="Usa os artefatos INT8 nos backends exportados")
+    parser.add_argument("--frames", type=int, default=300, help="Máximo de frames do clipe")
+    parser.add_argument("--imgsz", type=int, default=settings.INFERENCE_IMGSZ)
+    parser.add_argument("--data", default=None,
+                        help="data.yaml do dataset: mede também o mAP de cada backend na validação")
+    parser.add_argument("--output", default=None, help="Salva o relatório em JSON")
+    args = parser.parse_args()
+
+    roi = settings.CAMERA_ROIS.get(args.camera)
+    # Decodifica tudo antes: o benchmark mede só a inferência
+    crops = [np.ascontiguousarray(crop_roi(f, roi)) for f in iter_clip_frames(args.clip, args.frames)]
+    if not crops:
+        raise SystemExit(f"Nenhum frame lido de '{args.clip}'")
+    print(f" [bench] {len(crops)} frames de '{args.clip}' (ROI {roi}, imgsz={args.imgsz})")
+
+    report = {"clip": args.clip, "frames": len(crops), "roi": roi, "imgsz": args.imgsz, "backends": {}}
+    reference = None
+    for backend in args.backends:
+        try:
+            latencies, detections, accuracy = run_backend(backend, crops, args.int8, args.imgsz, args.data)
+        except (FileNotFoundError, ImportError) as e:
+            print(f" [bench] {backend}: ignorado ({e})")
+            continue
+
+        entry = {
+            "int8": args.int8 and backend != "torch",
+            "latency_ms_mean": round(float(latencies.mean()), 2),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+            "fps": round(1000.0 / float(latencies.mean()), 1),
+            "detections": int(sum(len(d["boxes"]) for d in detections)),
+            **accuracy,
+        }
+        if reference is None:
+            reference = (backend, detections)
+        else:
+            matched = sum(match_count(p, r) for p, r in zip(detections, reference[1]))
+            n_pred = entry["detections"]
+            n_ref = sum(len(d["boxes"]) for d in reference[1])
+            entry["reference"] = reference[0]
+            # Concordância com a referência, não acurácia (o clipe não tem rótulos)
+            entry["agreement_precision_vs_ref"] = round(matched / n_pred, 3) if n_pred else 1.0
+            entry["agreement_recall_vs_ref"] = round(matched / n_ref, 3) if n_ref else 1.0
+        report["backends"][backend] = entry
+
+    if reference is None:
+        raise SystemExit("Nenhum backend disponível")
+    print(f"\nConcordância = detecções que casam com as do '{reference[0]}' (não é acurácia"
+          f"{'; o mAP vem dos rótulos do --data' if args.data else '; use --data para o mAP'})")
+    print(f"{'backend':<12} {'int8':<5} {'média':>8} {'p50':>8} {'p95':>8} {'fps':>7} "
+          f"{'conc.prec':>9} {'conc.rec':>8} {'mAP50':>7} {'mAP50-95':>8}")
+    for backend, e in report["backends"].items():
+        print(f"{backend:<12} {str(e['int8']):<5} {e['latency_ms_mean']:>8} {e['latency_ms_p50']:>8} "
+              f"{e['latency_ms_p95']:>8} {e['fps']:>7} {e.get('agreement_precision_vs_ref', '-'):>9} "
+              f"{e.get('agreement_recall_vs_ref', '-'):>8} {e.get('map50', '-'):>7} {e.get('map50_95', '-'):>8}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n [bench] Relatório salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Exporta o modelo treinado (models/best.pt) para os backends de inferência
+de CPU usados nas caixas de borda sem GPU.
+
+Exemplos (rodar a partir da pasta clawai/):
+    python training/export.py --formats onnxruntime openvino
+    python training/export.py --formats onnxruntime openvino --int8 --data training/rock-paper-scissors-14/data.yaml
+
+Os artefatos ficam ao lado do .pt com os nomes que o inference_service
+espera (ver shared/inference_backend.py). Depois basta definir
+INFERENCE_BACKEND=onnxruntime|openvino (e INFERENCE_INT8=1).
+"""
+import argparse
+import os
+import shutil
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+from config import settings
+from shared.inference_backend import model_artifact
+from ultralytics import YOLO
+
+
+def _move(produced, target):
+    produced, target = os.path.abspath(str(produced)), os.path.abspath(target)
+    if produced == target:
+        return target
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    shutil.move(produced, target)
+    return target
+
+
+def export_onnx(weights, imgsz, int8):
+    model = YOLO(weights)
+    # dynamic=True: o mesmo artefato aceita lotes com N câmeras
+    produced = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    target = _move(produced, model_artifact("onnxruntime", weights))
+    print(f" [export] ONNX: {target}")
+
+    if int8:
+        # Quantização dinâmica dos pesos (não precisa de dataset de calibração)
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_target = model_artifact("onnxruntime", weights, int8=True)
+        quantize_dynamic(target, int8_target, weight_type=QuantType.QUInt8)
+        print(f" [export] ONNX INT8: {int8_target}")
+
+
+def export_openvino(weights, imgsz, int8, data):
+    model = YOLO(weights)
+    kwargs = {"format": "openvino", "imgsz": imgsz, "dynamic": True}
+    if int8:
+        # INT8 no OpenVINO é estático: calibra com as imagens do dataset
+        if not data:
+            raise SystemExit("--int8 com openvino precisa de --data (data.yaml do dataset de calibração)")
+        kwargs.update(int8=True, data=data)
+    produced = model.export(**kwargs)
+    target = _move(produced, model_artifact("openvino", weights, int8=int8))
+    print(f" [export] OpenVINO{' INT8' if int8 else ''}: {target}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o modelo para ONNX Runtime / OpenVINO")
+    parser.add_argument("--weights", default=settings.MODEL_PATH, help="Pesos PyTorch (.pt)")
+    parser.add_argument("--formats", nargs="+", default=["onnxruntime"], choices=["onnxruntime", "openvino"])
+    parser.add_argument("--imgsz", type=int, default=settings.INFERENCE_IMGSZ,
+                        help="Tamanho de entrada (deve bater com INFERENCE_IMGSZ)")
+    parser.add_argument("--int8", action="store_true", help="Gera também a variante quantizada INT8")
+    parser.add_argument("--data", default=None, help="data.yaml para calibração INT8 (OpenVINO)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        raise SystemExit(f"Pesos não encontrados: {args.weights}")
+
+    for fmt in args.formats:
+        if fmt == "onnxruntime":
+            export_onnx(args.weights, args.imgsz, args.int8)
+        else:
+            export_openvino(args.weights, args.imgsz, args.int8, args.data)
+
+
+if __name__ == "__main__":
+    main()
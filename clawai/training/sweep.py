@@ -0,0 +1,297 @@
+"""
+Varredura de modelos com orçamento de latência: treina (ou ajusta) YOLOv8
+n/s/m em tamanhos de entrada compatíveis com a ROI da câmera, mede a
+latência em CPU e o mAP na validação de cada candidato e promove para
+models/best.pt o mais rápido que atinge o mAP mínimo.
+
+O inference_service só vê o recorte da ROI (~280x180 px): treinar e
+inferir em 640 px desperdiça a maior parte da conta. Por padrão o imgsz
+é o maior lado da ROI arredondado para múltiplo de 32.
+
+Destilação (--distill): o professor (m, ou --teacher) rotula recortes da
+ROI tirados de gravações da esteira (--unlabeled, vídeo ou diretório de
+imagens) e os alunos treinam com o dataset original + esses pseudo-rótulos.
+
+Exemplos (rodar a partir da pasta clawai/):
+    python training/sweep.py --data training/rock-paper-scissors-14/data.yaml --sizes n s m
+    python training/sweep.py --data training/rock-paper-scissors-14/data.yaml --sizes n s \
+        --distill --unlabeled gravacoes/esteira.mp4 --min-map 0.6 --epochs 30
+
+Funciona em máquinas só com CPU (--device cpu é o padrão sem CUDA).
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+import yaml
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+from config import settings
+from shared.camera_config import load_camera_config
+from shared.clip_source import IMAGE_EXTENSIONS, iter_clip_frames
+from ultralytics import YOLO
+
+from benchmark_backends import crop_roi
+
+SWEEP_DIR = os.path.join("training_runs", "sweep")
+
+
+def roi_imgsz(roi, stride=32):
+    """Maior lado da ROI arredondado para cima no múltiplo do stride do YOLO."""
+    if not roi:
+        return 640
+    return int(math.ceil(max(roi[2] - roi[0], roi[3] - roi[1]) / stride) * stride)
+
+
+# --- Dataset ---
+def load_data_yaml(path):
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def resolve_split(data_yaml, split):
+    """
+    Caminho absoluto de um split do data.yaml. Os exports do Roboflow usam
+    '../train/images' relativo ao yaml mesmo com as pastas ao lado dele.
+    """
+    data = load_data_yaml(data_yaml)
+    base = os.path.dirname(os.path.abspath(data_yaml))
+    root = os.path.join(base, data["path"]) if data.get("path") else base
+    entries = data[split] if isinstance(data[split], list) else [data[split]]
+    resolved = []
+    for entry in entries:
+        candidates = [entry, os.path.join(root, entry), os.path.join(root, entry.replace("../", "", 1))]
+        resolved.append(next((os.path.abspath(c) for c in candidates if os.path.exists(c)),
+                             os.path.abspath(os.path.join(root, entry))))
+    return resolved
+
+
+def list_images(directories, limit=None):
+    images = []
+    for directory in directories:
+        images += sorted(p for p in glob.glob(os.path.join(directory, "*"))
+                         if p.lower().endswith(IMAGE_EXTENSIONS))
+    return images[:limit] if limit else images
+
+
+def build_distill_dataset(teacher_weights, data_yaml, unlabeled, roi, imgsz, device, max_frames, conf):
+    """
+    Rotula recortes da ROI com o professor e monta um data.yaml com
+    treino = original + pseudo-rotulados, validação = original.
+    """
+    out_dir = os.path.abspath(os.path.join(SWEEP_DIR, "distill_data"))
+    images_dir, labels_dir = os.path.join(out_dir, "images"), os.path.join(out_dir, "labels")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(images_dir)
+    os.makedirs(labels_dir)
+
+    teacher = YOLO(teacher_weights)
+    labeled = boxes_total = 0
+    for index, frame in enumerate(iter_clip_frames(unlabeled, max_frames)):
+        crop = np.ascontiguousarray(crop_roi(frame, roi))
+        result = teacher.predict(crop, conf=conf, imgsz=imgsz, device=device, verbose=False)[0]
+        boxes = result.boxes.cpu().numpy()
+        name = f"distill_{index:06d}"
+        cv2.imwrite(os.path.join(images_dir, f"{name}.jpg"), crop)
+        # Recorte sem objetos também entra: ensina o fundo da esteira
+        with open(os.path.join(labels_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+            for cls_id, (cx, cy, w, h) in zip(boxes.cls.astype(int), boxes.xywhn):
+                f.write(f"{cls_id} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n")
+        labeled += 1
+        boxes_total += len(boxes)
+
+    if labeled == 0:
+        raise SystemExit(f"Nenhum frame lido de '{unlabeled}' para a destilação")
+    data = load_data_yaml(data_yaml)
+    data.pop("path", None)
+    data["train"] = resolve_split(data_yaml, "train") + [images_dir]
+    data["val"] = resolve_split(data_yaml, "val")
+    if "test" in data:
+        data["test"] = resolve_split(data_yaml, "test")
+    distill_yaml = os.path.join(out_dir, "data.yaml")
+    with open(distill_yaml, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+    print(f" [sweep] Destilação: {labeled} recortes pseudo-rotulados ({boxes_total} caixas) em {out_dir}")
+    return distill_yaml
+
+
+# --- Candidatos ---
+def train_candidate(size, imgsz, data_yaml, epochs, batch, device, tag=""):
+    name = f"yolov8{size}_{imgsz}{tag}"
+    model = YOLO(f"yolov8{size}.pt")
+    model.train(data=data_yaml, epochs=epochs, imgsz=imgsz, batch=batch, device=device,
+                project=SWEEP_DIR, name=name, exist_ok=True, verbose=False)
+    weights = os.path.join(SWEEP_DIR, name, "weights", "best.pt")
+    if not os.path.exists(weights):
+        raise FileNotFoundError(f"Treino de {name} não gerou {weights}")
+    return name, weights
+
+
+def evaluate_accuracy(weights, data_yaml, imgsz, device):
+    metrics = YOLO(weights).val(data=data_yaml, imgsz=imgsz, device=device, split="val",
+                                project=SWEEP_DIR, name="val", exist_ok=True, verbose=False)
+    return {"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4)}
+
+
+def measure_cpu_latency(weights, images, imgsz, warmup=5):
+    """Latência por imagem no backend torch em CPU, como numa caixa de borda sem GPU."""
+    model = YOLO(weights)
+    for image in images[:warmup]:
+        model.predict(image, imgsz=imgsz, device="cpu", conf=settings.CONFIDENCE_THRESHOLD, verbose=False)
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        model.predict(image, imgsz=imgsz, device="cpu", conf=settings.CONFIDENCE_THRESHOLD, verbose=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+    return {
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def pareto_front(candidates, metric):
+    """Candidatos que nenhum outro supera em latência E acurácia ao mesmo tempo."""
+    front = []
+    for c in candidates:
+        dominated = any(
+            o is not c
+            and o["latency_ms_p50"] <= c["latency_ms_p50"] and o[metric] >= c[metric]
+            and (o["latency_ms_p50"] < c["latency_ms_p50"] or o[metric] > c[metric])
+            for o in candidates
+        )
+        if not dominated:
+            front.append(c["name"])
+    return front
+
+
+def promote(candidate, target):
+    """Copia os pesos vencedores para models/best.pt (o anterior vira best.prev.pt)."""
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    if os.path.exists(target):
+        backup = os.path.splitext(target)[0] + ".prev.pt"
+        shutil.copy2(target, backup)
+        print(f" [sweep] Modelo anterior guardado em {backup}")
+    shutil.copy2(candidate["weights"], target)
+    with open(os.path.splitext(target)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump({k: candidate[k] for k in ("name", "size", "imgsz", "distilled", "map50", "map50_95",
+                                             "latency_ms_p50", "latency_ms_p95")}, f, indent=2)
+
+
+def camera_roi(camera_id):
+    """ROI calibrada pelo roiSetup.py (config/cameras.json), senão a do settings.py."""
+    try:
+        config = load_camera_config(settings.CAMERA_CONFIG_PATH) or {}
+    except (OSError, ValueError) as e:
+        print(f" [sweep] ⚠ {settings.CAMERA_CONFIG_PATH} inválido ({e}): usando CAMERA_ROIS")
+        config = {}
+    calibrated = config.get("cameras", {}).get(camera_id, {})
+    return calibrated.get("roi") or settings.CAMERA_ROIS.get(camera_id)
+
+
+def main():
+    cuda = torch.cuda.is_available()
+    parser = argparse.ArgumentParser(description="Varredura n/s/m x imgsz com orçamento de latência em CPU")
+    parser.add_argument("--data", required=True, help="data.yaml do dataset")
+    parser.add_argument("--sizes", nargs="+", default=["n", "s", "m"], choices=["n", "s", "m", "l", "x"])
+    parser.add_argument("--imgsz", type=int, nargs="+", default=None,
+                        help="Tamanhos de entrada (padrão: maior lado da ROI, múltiplo de 32)")
+    parser.add_argument("--camera", default="0", help="Câmera cuja ROI define o imgsz e os recortes")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=16 if cuda else 8)
+    parser.add_argument("--device", default="0" if cuda else "cpu", help="Dispositivo do treino/validação")
+    parser.add_argument("--distill", action="store_true", help="Alunos treinam também com pseudo-rótulos do professor")
+    parser.add_argument("--teacher", default=None, help="Pesos do professor (padrão: treina yolov8m na varredura)")
+    parser.add_argument("--unlabeled", default=None, help="Vídeo ou diretório de imagens da esteira para destilar")
+    parser.add_argument("--distill-frames", type=int, default=1000)
+    parser.add_argument("--distill-conf", type=float, default=0.5, help="Confiança mínima dos pseudo-rótulos")
+    parser.add_argument("--clip", default=None,
+                        help="Mede a latência em recortes da ROI deste clipe (padrão: imagens de validação)")
+    parser.add_argument("--latency-images", type=int, default=100)
+    parser.add_argument("--metric", default="map50_95", choices=["map50", "map50_95"])
+    parser.add_argument("--min-map", type=float, default=0.5, help="Acurácia mínima para promover um candidato")
+    parser.add_argument("--no-promote", action="store_true", help="Só gera o relatório")
+    args = parser.parse_args()
+
+    if args.distill and not args.unlabeled:
+        raise SystemExit("--distill precisa de --unlabeled (gravação da esteira para o professor rotular)")
+    roi = camera_roi(args.camera)
+    imgszs = args.imgsz or [roi_imgsz(roi)]
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    print(f" [sweep] Tamanhos {args.sizes} x imgsz {imgszs} | ROI {roi} | treino em '{args.device}', "
+          f"latência em CPU ({torch.get_num_threads()} threads)")
+
+    if args.clip:
+        latency_images = [np.ascontiguousarray(crop_roi(f, roi))
+                          for f in iter_clip_frames(args.clip, args.latency_images)]
+    else:
+        latency_images = list_images(resolve_split(args.data, "val"), args.latency_images)
+    if not latency_images:
+        raise SystemExit("Nenhuma imagem para medir a latência")
+
+    candidates = []
+
+    def evaluate(name, size, imgsz, weights, distilled):
+        entry = {"name": name, "size": size, "imgsz": imgsz, "distilled": distilled, "weights": weights}
+        entry.update(evaluate_accuracy(weights, args.data, imgsz, args.device))
+        entry.update(measure_cpu_latency(weights, latency_images, imgsz))
+        print(f" [sweep] {name}: mAP50 {entry['map50']} | mAP50-95 {entry['map50_95']} | "
+              f"CPU p50 {entry['latency_ms_p50']}ms p95 {entry['latency_ms_p95']}ms")
+        candidates.append(entry)
+
+    for imgsz in imgszs:
+        student_data = args.data
+        if args.distill:
+            teacher = args.teacher
+            if teacher is None:
+                name, teacher = train_candidate("m", imgsz, args.data, args.epochs, args.batch, args.device)
+                evaluate(name, "m", imgsz, teacher, False)
+            student_data = build_distill_dataset(teacher, args.data, args.unlabeled, roi, imgsz,
+                                                 args.device, args.distill_frames, args.distill_conf)
+        for size in args.sizes:
+            if args.distill and size == "m" and args.teacher is None:
+                continue  # o professor já é o candidato m
+            name, weights = train_candidate(size, imgsz, student_data, args.epochs, args.batch, args.device,
+                                            "_distill" if args.distill else "")
+            evaluate(name, size, imgsz, weights, args.distill)
+
+    front = pareto_front(candidates, args.metric)
+    eligible = sorted((c for c in candidates if c[args.metric] >= args.min_map), key=lambda c: c["latency_ms_p50"])
+    winner = eligible[0] if eligible else None
+    report = {
+        "data": args.data, "roi": roi, "metric": args.metric, "min_map": args.min_map,
+        "candidates": sorted(candidates, key=lambda c: c["latency_ms_p50"]),
+        "pareto_front": front, "winner": winner["name"] if winner else None,
+    }
+    report_path = os.path.join(SWEEP_DIR, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'candidato':<24} {'mAP50':>7} {'mAP50-95':>9} {'p50 ms':>8} {'p95 ms':>8}  pareto")
+    for c in report["candidates"]:
+        print(f"{c['name']:<24} {c['map50']:>7} {c['map50_95']:>9} {c['latency_ms_p50']:>8} "
+              f"{c['latency_ms_p95']:>8}  {'*' if c['name'] in front else ''}")
+    print(f"\n [sweep] Relatório salvo em {report_path}")
+
+    if winner is None:
+        print(f" [sweep] Nenhum candidato atingiu {args.metric} >= {args.min_map}: {settings.MODEL_PATH} mantido.")
+        return
+    print(f" [sweep] Vencedor: {winner['name']} (mais rápido com {args.metric} >= {args.min_map})")
+    if args.no_promote:
+        return
+    promote(winner, settings.MODEL_PATH)
+    print(f" [sweep] Promovido para {settings.MODEL_PATH}. Use INFERENCE_IMGSZ={winner['imgsz']} no "
+          f"inference_service (e reexporte com training/export.py --imgsz {winner['imgsz']}).")
+
+
+if __name__ == "__main__":
+    main()
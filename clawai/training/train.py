@@ -1,3 +1,4 @@
+import torch
 from ultralytics import YOLO
 from multiprocessing import freeze_support
 
@@ -6,7 +7,8 @@ def start_training():
     model = YOLO("yolov8m.pt")
 
     results = model.train(
-        device = '0',
+        # Sem GPU treina em CPU (mais lento, mas funciona)
+        device = '0' if torch.cuda.is_available() else 'cpu',
         data = 'ClawAi/training/rock-paper-scissors-14/data.yaml',
 
         epochs = 50,
@@ -1,60 +1,159 @@
-import cv2
+import argparse
+import os
 import sys
 
-# Simula a leitura da stream. Pode ser adaptado para usar shared.camera_stream se necessário.
-def main():
-    if len(sys.argv) < 2:
-        print("Uso: python setup_roi.py <video_source_ou_indice_camera>")
-        print("Exemplo: python setup_roi.py 0")
-        print("Exemplo: python setup_roi.py rtsp://192.168.1.10:554/stream")
-        return
+import cv2
+import numpy as np
+
+# Usa o mesmo módulo de configuração do inference_service
+CLAWAI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clawai')
+sys.path.append(CLAWAI_DIR)
+from shared.camera_config import load_camera_config, save_camera_config
 
-    source = sys.argv[1]
-    
+DEFAULT_CONFIG_PATH = os.path.join(CLAWAI_DIR, 'config', 'cameras.json')
+
+
+def open_source(source):
     # Tenta converter para int se for índice de webcam
     try:
         source = int(source)
     except ValueError:
         pass
-
     cap = cv2.VideoCapture(source)
-
     if not cap.isOpened():
         print(f"Erro: Não foi possível abrir a fonte {source}")
-        return
+        return None
+    return cap
+
 
+def select_interactive(cap, current_x):
+    """Desenha a ROI com o mouse e depois clica na linha de decisão."""
     print("--- INSTRUÇÕES ---")
     print("1. O frame será aberto.")
     print("2. Use o MOUSE para desenhar um retângulo na área de interesse.")
     print("3. Pressione ESPAÇO ou ENTER para confirmar.")
     print("4. Pressione 'c' para cancelar a seleção.")
+    print("5. Em seguida, CLIQUE na linha de decisão e pressione ENTER (ESC mantém a atual).")
     print("------------------")
 
     ret, frame = cap.read()
     if not ret:
         print("Erro: Não foi possível ler o primeiro frame.")
-        return
+        return None, None
 
     # Função nativa do OpenCV para seleção de ROI
     # Retorna uma tupla (x, y, w, h)
     roi = cv2.selectROI("Selecione a Area de Deteccao (ROI)", frame, fromCenter=False, showCrosshair=True)
-    
-    # Fecha a janela
     cv2.destroyAllWindows()
-    cap.release()
-
-    # Verifica se algo foi selecionado (w e h > 0)
-    if roi[2] > 0 and roi[3] > 0:
-        x, y, w, h = roi
-        # Convertendo para formato (x1, y1, x2, y2) que é mais seguro para slicing numpy
-        x1, y1 = int(x), int(y)
-        x2, y2 = int(x + w), int(y + h)
-
-        print("\n\n>>> COPIE A LINHA ABAIXO PARA O SEU config/settings.py <<<")
-        print(f"'{source}': [{x1}, {y1}, {x2}, {y2}],  # ROI: x1, y1, x2, y2")
-        print(">>> --------------------------------------------------- <<<")
-    else:
+    if roi[2] <= 0 or roi[3] <= 0:
+        return None, None
+    x, y, w, h = (int(v) for v in roi)
+    # Convertendo para formato (x1, y1, x2, y2) que é mais seguro para slicing numpy
+    roi = [x, y, x + w, y + h]
+
+    decision = {"x": current_x if current_x is not None else x + w // 2}
+    window = "Clique na Linha de Decisao"
+
+    def on_click(event, click_x, click_y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            decision["x"] = click_x
+
+    cv2.namedWindow(window)
+    cv2.setMouseCallback(window, on_click)
+    while True:
+        preview = frame.copy()
+        cv2.rectangle(preview, (roi[0], roi[1]), (roi[2], roi[3]), (255, 255, 255), 1)
+        cv2.line(preview, (decision["x"], 0), (decision["x"], preview.shape[0]), (0, 0, 255), 2)
+        cv2.imshow(window, preview)
+        key = cv2.waitKey(30) & 0xFF
+        if key in (13, 32):
+            break
+        if key == 27:
+            decision["x"] = current_x
+            break
+    cv2.destroyAllWindows()
+    return roi, decision["x"]
+
+
+def propose_from_motion(cap, frames, pixel_threshold=25, min_fraction=0.02, margin=10):
+    """
+    Modo headless: acumula onde houve movimento ao longo de N frames (a esteira
+    rodando com peças) e propõe a ROI como o retângulo dessa região.
+    """
+    ret, frame = cap.read()
+    if not ret:
+        print("Erro: Não foi possível ler o primeiro frame.")
+        return None, None
+    prev = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    heat = np.zeros(prev.shape, dtype=np.uint32)
+    used = 0
+    for _ in range(frames):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        heat += cv2.absdiff(gray, prev) > pixel_threshold
+        prev = gray
+        used += 1
+
+    if used == 0:
+        return None, None
+    # Pixels que mudaram em pelo menos min_fraction dos frames (ignora ruído isolado)
+    mask = (heat >= max(1, used * min_fraction)).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+    points = cv2.findNonZero(mask)
+    if points is None:
+        print(f"Nenhum movimento detectado em {used} frames. A esteira está rodando com peças?")
+        return None, None
+    x, y, w, h = cv2.boundingRect(points)
+    height, width = mask.shape
+    roi = [max(0, x - margin), max(0, y - margin), min(width, x + w + margin), min(height, y + h + margin)]
+    print(f"Movimento acumulado em {used} frames: {int(mask.sum())} pixels ativos.")
+    return roi, (roi[0] + roi[2]) // 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra a ROI e a linha de decisão de uma câmera")
+    parser.add_argument("source", help="Índice da câmera, arquivo de vídeo ou URL (ex.: 0, rtsp://...)")
+    parser.add_argument("--camera", default="0", help="ID da câmera no inference_service (padrão: 0)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="Arquivo de configuração das câmeras")
+    parser.add_argument("--auto", action="store_true",
+                        help="Headless: propõe a ROI a partir do movimento da esteira")
+    parser.add_argument("--frames", type=int, default=300, help="Frames analisados no modo --auto")
+    parser.add_argument("--decision-x", type=int, default=None, help="Força a posição da linha de decisão")
+    parser.add_argument("--actuator-x", type=int, default=None,
+                        help="Posição X do atuador (px da imagem, pode passar da largura) para prever a chegada")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra a proposta, sem gravar")
+    args = parser.parse_args()
+
+    cap = open_source(args.source)
+    if cap is None:
+        return
+
+    current = (load_camera_config(args.config) or {}).get("cameras", {}).get(args.camera, {})
+    try:
+        if args.auto:
+            roi, decision_x = propose_from_motion(cap, args.frames)
+        else:
+            roi, decision_x = select_interactive(cap, current.get("decision_x"))
+    finally:
+        cap.release()
+
+    if roi is None:
         print("\nSeleção cancelada ou inválida.")
+        return
+    if args.decision_x is not None:
+        decision_x = args.decision_x
+
+    print(f"\nCâmera {args.camera}: ROI {roi} (x1, y1, x2, y2) | linha de decisão X={decision_x}")
+    print(f"Anterior: ROI {current.get('roi')} | linha de decisão X={current.get('decision_x')}")
+    if args.dry_run:
+        return
+
+    config = save_camera_config(args.config, args.camera, roi, decision_x, args.actuator_x)
+    print(f">>> Gravado em {args.config} (revisão {config['revision']}). "
+          f"O inference_service aplica sem reiniciar. <<<")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()